@@ -14,23 +14,31 @@ fi
 
 MUSIC_DIR="$HOME/Music/Music"
 SEARCH_TERM="$1"
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 # Check if music directory exists
 if [ ! -d "$MUSIC_DIR" ]; then
   echo -e "${RED}Error: Music directory not found: $MUSIC_DIR${NC}"
   exit 1
 fi
 
-# Search for m4a files and store in array
+# Query the media file index (refreshed by directory mtime, ranked best
+# first); fall back to walking the whole folder if the index can't be used
+search_files() {
+  python3 "$SCRIPT_DIR/media_index.py" --music-dir "$MUSIC_DIR" query "$SEARCH_TERM" 2>/dev/null ||
+    find "$MUSIC_DIR" -type f -name "*.m4a" \( -iname "*$(printf "%q" "$SEARCH_TERM")*" \) 2>/dev/null
+}
+
+# Search for media files and store in array
 echo "Searching in: $MUSIC_DIR"
 echo "Looking for files matching: $SEARCH_TERM"
 results=()
 while IFS= read -r line; do
   results+=("$line")
-done < <(find "$MUSIC_DIR" -type f -name "*.m4a" \( -iname "*$(printf "%q" "$SEARCH_TERM")*" \) 2>/dev/null)
+done < <(search_files)
 
 # Check if any files were found
 if [ ${#results[@]} -eq 0 ]; then
-  echo -e "${RED}No m4a files found matching: $SEARCH_TERM${NC}"
+  echo -e "${RED}No media files found matching: $SEARCH_TERM${NC}"
   exit 1
 fi
 
@@ -0,0 +1,55 @@
+"""
+Adding many tracks to an Apple Music playlist with one osascript launch.
+
+add_music.sh starts a find over the music folder and an osascript process
+per song; here every track of a batch is handed to add_tracks_to_playlist.scpt
+in a single invocation, which reports success or failure per track.
+"""
+
+import os
+import subprocess
+
+from timing import count
+
+BATCH_ADD_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "add_tracks_to_playlist.scpt"
+)
+
+# Tracks per osascript launch, keeping the argument list well below ARG_MAX
+BATCH_SIZE = 500
+
+
+def add_tracks_to_playlist(playlist_name, tracks, runner=subprocess.run):
+    """
+    Add tracks to a playlist in as few scripting calls as possible.
+
+    Args:
+        playlist_name (str): Apple Music playlist to add to
+        tracks (list): Persistent IDs of library tracks or POSIX paths of media files
+        runner: subprocess.run-compatible callable used to launch osascript
+
+    Returns:
+        dict: {track: (True, None) or (False, error message)}
+    """
+    results = {}
+    tracks = list(tracks)
+    for start in range(0, len(tracks), BATCH_SIZE):
+        batch = tracks[start:start + BATCH_SIZE]
+        count("osascript launches")
+        completed = runner(
+            ["osascript", BATCH_ADD_SCRIPT, playlist_name, *batch],
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            # The script failed as a whole, e.g. Music isn't running
+            error = (completed.stderr or "").strip() or "osascript failed"
+            results.update((track, (False, error)) for track in batch)
+            continue
+
+        for line in completed.stdout.splitlines():
+            status, track, *message = line.split("\t")
+            results[track] = (status == "ok", message[0] if message else None)
+        for track in batch:
+            results.setdefault(track, (False, "no result reported"))
+    return results
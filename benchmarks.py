@@ -0,0 +1,420 @@
+"""
+Benchmarks of the sync's hot paths on generated libraries.
+
+Every scenario runs against a FakeMusicBackend.synthetic library and a
+FakeSpotifyClient in a scratch cache directory, so no Music app, network or
+personal state is involved and runs on the same machine are comparable:
+
+    normalize         normalize_string and strings_match over the library's
+                      metadata, starting from an empty cache
+    library snapshot  catalog refresh of an unchanged library and the
+                      LibraryIndex build
+    song_exists       SONG_QUERIES lookups of exact, near and missing songs
+    library scoring   find_library_matches for SCORED_TRACKS playlist tracks
+    playlist diff     load_playlist_diff for a playlist of a tenth of the
+                      library, Spotify playlist cached as in a repeat sync
+    parse_selection   a selection naming every track of that playlist
+
+Startup is measured too: each of STARTUP_MODULES is imported in a fresh
+interpreter under `python -X importtime`, which reports how long the import
+took and which of the modules it loaded took longest themselves.
+
+The best of --repeat runs of each scenario is written to a JSON file. With a
+baseline from an earlier run, a scenario more than its threshold times
+slower than the baseline fails the run.
+
+Usage:
+    python3 benchmarks.py [--sizes N ...] [--repeat N] [--output FILE]
+        [--baseline FILE] [--threshold RATIO] [--save-baseline]
+        [--imports [MODULE ...]]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import paths
+import update_playlist
+from library_index import LIBRARY_PROPERTIES
+from matching import configure_normalize_cache, normalize_string, strings_match
+from music_backend import FakeMusicBackend
+from playlist_removal import read_playlist
+from selection import parse_selection
+from spotify_session import FakeSpotifySession, set_spotify_session
+from spotify_source import FakeSpotifyClient, spotify_track
+from timing import StageTimer
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 3
+RESULTS_VERSION = 1
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+
+# A scenario fails when it takes more than this many times its baseline
+DEFAULT_THRESHOLD = 1.5
+# Scenarios that go through threads and disk caches vary more between runs
+THRESHOLDS = {"library snapshot": 2.0, "playlist diff": 2.0}
+# Slowdowns of less than this many seconds are timer noise
+NOISE_FLOOR = 0.005
+
+# Entry points whose import time is reported, and the pure matching logic
+STARTUP_MODULES = ("sync_plan", "update_playlist", "matching")
+# Import time an entry point should start within, in seconds
+STARTUP_BUDGET = 0.050
+# Imports listed under each startup module
+SLOWEST_IMPORTS = 5
+
+SONG_QUERIES = 500
+SCORED_TRACKS = 500
+PLAYLIST_NAME = "Playlist 1"
+PLAYLIST_URI = "spotify:playlist:benchmark"
+
+# update_playlist's per-process state, swapped out while benchmarking
+_SYNC_STATE = (
+    "_music_backend",
+    "_library_catalog",
+    "_library_index",
+    "_rebuild_catalog",
+    "_library_columns",
+    "_library_columns_source",
+    "_spotify_track_cache",
+    "_spotify_listing_cache",
+    "_match_cache",
+    "_media_index",
+)
+
+
+@contextlib.contextmanager
+def isolated_sync_state(backend, spotify, cache_dir):
+    """
+    Point update_playlist at fake services and a scratch cache directory.
+
+    Its output is swallowed, and everything is restored on exit.
+    """
+    saved = {name: getattr(update_playlist, name) for name in _SYNC_STATE}
+    saved_cache_dir = paths.CACHE_DIR
+    saved_session = set_spotify_session(FakeSpotifySession(spotify))
+    paths.CACHE_DIR = cache_dir
+    for name in _SYNC_STATE:
+        setattr(update_playlist, name, None)
+    update_playlist.set_music_backend(backend)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        for store in (update_playlist._library_catalog, update_playlist._match_cache):
+            if store is not None:
+                store.close()
+        for name, value in saved.items():
+            setattr(update_playlist, name, value)
+        paths.CACHE_DIR = saved_cache_dir
+        set_spotify_session(saved_session)
+
+
+def spotify_playlist(backend, rng):
+    """
+    The Spotify side of the benchmark playlist: the Apple playlist with a
+    twentieth of its tracks dropped and as many other library tracks added.
+    """
+    by_id = {track["persistent_id"]: track for track in backend.tracks}
+    apple_ids = backend.playlists[PLAYLIST_NAME]
+    changes = len(apple_ids) // 20
+    kept = rng.sample(apple_ids, len(apple_ids) - changes)
+    in_playlist = set(apple_ids)
+    others = [pid for pid in by_id if pid not in in_playlist]
+    added = rng.sample(others, min(changes, len(others)))
+    return [spotify_track(by_id[pid]) for pid in kept + added]
+
+
+def song_queries(tracks, count, rng):
+    """(title, artist) lookups: mostly exact, some near misses, some absent"""
+    queries = []
+    for i in range(count):
+        track = rng.choice(tracks)
+        kind = i % 5
+        if kind < 3:
+            queries.append((track["name"], track["artist"]))
+        elif kind == 3:
+            queries.append((f"{track['name'].lower()} (Live)", track["artist"].upper()))
+        else:
+            queries.append((f"Qqx Unknown Song {i}", "Nobody"))
+    return queries
+
+
+def selection_string(count):
+    """A parse_selection input naming 1..count as a mix of ranges and numbers"""
+    parts = []
+    number = 1
+    while number <= count:
+        if number % 7 == 0 and number + 4 <= count:
+            parts.append(f"{number}-{number + 4}")
+            number += 5
+        else:
+            parts.append(str(number))
+            number += 1
+    return ",".join(parts)
+
+
+def build_scenarios(backend, rng):
+    """
+    Return {scenario: callable} for a library, after warming the state the
+    scenarios share (catalog, library columns, Spotify playlist cache).
+    """
+    update_playlist.get_library_index()
+    update_playlist.get_library_columns()
+    update_playlist.load_playlist_diff(PLAYLIST_NAME, PLAYLIST_URI, StageTimer())
+
+    strings = [
+        track[prop] for track in backend.tracks for prop in ("name", "artist", "album")
+    ]
+    pairs = list(zip(strings[::3], strings[3::3]))
+    queries = song_queries(backend.tracks, SONG_QUERIES, rng)
+    playlist_tracks = read_playlist(backend, PLAYLIST_NAME, ("persistent_id",) + LIBRARY_PROPERTIES)
+    scored = rng.sample(playlist_tracks, min(SCORED_TRACKS, len(playlist_tracks)))
+    selection = selection_string(len(playlist_tracks))
+
+    def normalize():
+        configure_normalize_cache()
+        for s in strings:
+            normalize_string(s)
+        for a, b in pairs:
+            strings_match(a, b)
+
+    def library_snapshot():
+        update_playlist.invalidate_library_index()
+        update_playlist.get_library_index()
+
+    def lookups():
+        for title, artist in queries:
+            update_playlist.song_exists(title, artist)
+
+    return {
+        "normalize": normalize,
+        "library snapshot": library_snapshot,
+        "song_exists": lookups,
+        "library scoring": lambda: update_playlist.find_library_matches(scored),
+        "playlist diff": lambda: update_playlist.load_playlist_diff(
+            PLAYLIST_NAME, PLAYLIST_URI, StageTimer()
+        ),
+        "parse_selection": lambda: parse_selection(selection, len(playlist_tracks)),
+    }
+
+
+def run_benchmarks(sizes=SIZES, repeat=REPEAT, seed=0):
+    """
+    Run every scenario on a generated library of each size.
+
+    Returns:
+        dict: {"scenario@size": {"scenario", "size", "seconds" (best run),
+        "runs" (every run)}}
+    """
+    results = {}
+    for size in sizes:
+        rng = random.Random(seed)
+        backend = FakeMusicBackend.synthetic(
+            size, playlist_count=1, playlist_size=max(1, size // 10), seed=seed
+        )
+        spotify = FakeSpotifyClient(
+            {PLAYLIST_URI: {"name": PLAYLIST_NAME, "tracks": spotify_playlist(backend, rng)}}
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with isolated_sync_state(backend, spotify, cache_dir):
+                scenarios = build_scenarios(backend, rng)
+                for scenario, run in scenarios.items():
+                    runs = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        run()
+                        runs.append(time.perf_counter() - start)
+                    results[f"{scenario}@{size}"] = {
+                        "scenario": scenario,
+                        "size": size,
+                        "seconds": min(runs),
+                        "runs": runs,
+                    }
+    return results
+
+
+def parse_import_times(output, module):
+    """
+    Read `python -X importtime` output for `import module`.
+
+    Returns:
+        tuple: (seconds the import took, [(name, seconds)] of the module and
+        the modules it imported, by the time each took itself, slowest first)
+    """
+    imported = []
+    for line in output.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        try:
+            own = int(fields[0].rpartition(":")[2]) / 1_000_000
+            cumulative = int(fields[1]) / 1_000_000
+        except ValueError:
+            # The header line
+            continue
+        name = fields[2].strip()
+        imported.append((name, own))
+        # Modules a top-level import pulled in are listed before it,
+        # indented by two spaces per level
+        if fields[2][1:].startswith(" "):
+            continue
+        if name == module:
+            return cumulative, sorted(imported, key=lambda entry: -entry[1])
+        imported = []
+    raise ValueError(f"No import time reported for {module}")
+
+
+def run_import_benchmarks(modules=STARTUP_MODULES, repeat=REPEAT):
+    """
+    Import each module in a fresh interpreter under -X importtime.
+
+    Returns:
+        dict: {"import module": {"scenario", "module", "seconds" (best
+        run), "runs", "slowest" ([name, seconds] of the best run)}}
+    """
+    results = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        runs = []
+        for _ in range(repeat):
+            process = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                cwd=here,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(parse_import_times(process.stderr, module))
+        seconds, slowest = min(runs)
+        results[f"import {module}"] = {
+            "scenario": "import",
+            "module": module,
+            "seconds": seconds,
+            "runs": [run[0] for run in runs],
+            "slowest": [list(entry) for entry in slowest[:SLOWEST_IMPORTS]],
+        }
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find the scenarios that got slower than their baseline allows.
+
+    A scenario regresses when it is more than its threshold (THRESHOLDS,
+    else threshold) times slower and at least NOISE_FLOOR seconds slower.
+    Scenarios missing from either side are not compared.
+
+    Returns:
+        list: {"key", "baseline", "seconds", "ratio", "threshold"} per
+        regression
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        limit = THRESHOLDS.get(result["scenario"], threshold)
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        if ratio > limit and result["seconds"] - before["seconds"] >= NOISE_FLOOR:
+            regressions.append({
+                "key": key,
+                "baseline": before["seconds"],
+                "seconds": result["seconds"],
+                "ratio": ratio,
+                "threshold": limit,
+            })
+    return regressions
+
+
+def save_results(results, path):
+    data = {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def load_results(path):
+    """Return the results saved at path, or None if there are none of this version"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != RESULTS_VERSION:
+        return None
+    return data["results"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sync on generated libraries")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=list(SIZES), help="library sizes to generate"
+    )
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per scenario")
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_FILE} in the cache)")
+    parser.add_argument("--baseline", help=f"baseline file (default: {BASELINE_FILE} in the cache)")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help="slowdown ratio at which a scenario fails",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="make these results the new baseline",
+    )
+    parser.add_argument(
+        "--imports", nargs="*", default=list(STARTUP_MODULES),
+        help="modules whose import time is measured (none to skip)",
+    )
+    args = parser.parse_args(argv)
+    output = args.output or paths.cache_path(RESULTS_FILE)
+    baseline_path = args.baseline or paths.cache_path(BASELINE_FILE)
+
+    results = run_benchmarks(args.sizes, args.repeat)
+    results.update(run_import_benchmarks(args.imports, args.repeat))
+    save_results(results, output)
+    baseline = load_results(baseline_path)
+
+    width = max(len(key) for key in results)
+    for key, result in results.items():
+        line = f"{key:<{width}}  {result['seconds'] * 1000:10.1f} ms"
+        if baseline and key in baseline:
+            before = baseline[key]["seconds"]
+            line += f"  (baseline {before * 1000:.1f} ms, {result['seconds'] / before:.2f}x)"
+        if result["scenario"] == "import" and result["seconds"] > STARTUP_BUDGET:
+            line += f"  over the {STARTUP_BUDGET * 1000:.0f} ms budget"
+        print(line)
+        for name, seconds in result.get("slowest", []):
+            print(f"    {name:<{width - 4}}  {seconds * 1000:10.1f} ms")
+    print(f"\nResults written to {output}")
+
+    regressions = compare(results, baseline or {}, args.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['key']}: {regression['seconds'] * 1000:.1f} ms, "
+            f"{regression['ratio']:.2f}x the baseline {regression['baseline'] * 1000:.1f} ms "
+            f"(threshold {regression['threshold']}x)",
+            file=sys.stderr,
+        )
+    if args.save_baseline or baseline is None:
+        save_results(results, baseline_path)
+        print(f"Baseline saved to {baseline_path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+Terminal colors, with colorama imported on first use.
+
+colorama takes several milliseconds to import, which is most of the start
+time of a command that only reads a plan file. Fore stands in for
+colorama.Fore until a color is actually printed.
+"""
+
+
+class _LazyFore:
+    def __getattr__(self, name):
+        from colorama import Fore as fore
+
+        value = getattr(fore, name)
+        # Later lookups find the plain attribute
+        setattr(self, name, value)
+        return value
+
+
+Fore = _LazyFore()
+
+
+def init():
+    """Set up colored output (a no-op outside Windows consoles)"""
+    import colorama
+
+    colorama.init()
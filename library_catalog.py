@@ -0,0 +1,190 @@
+"""
+Persistent SQLite catalog of the Apple Music library.
+
+The catalog keeps one row per library track so a new process (or a new run
+of the sync loop) doesn't have to read the whole library from the Music app
+again. A refresh fetches only the persistent ID and modification date
+columns, then re-reads properties just for tracks that are new or changed.
+The normalized and core titles, artist and album are stored with each row,
+so loading an unchanged library into an index computes none of them again.
+"""
+
+import sqlite3
+
+from library_index import LIBRARY_PROPERTIES
+from matching import core_title, normalize_string
+from music_backend import load_track_records
+from paths import cache_path
+from track_store import LibraryTrack, bulk_allocation
+
+CATALOG_FILE = "library.sqlite3"
+SCHEMA_VERSION = 2
+
+# Above this share of changed tracks a filtered fetch costs about as much as
+# reading the whole library, so the refresh just reads everything
+FULL_FETCH_RATIO = 0.5
+
+TEXT_PROPERTIES = ("name", "artist", "album")
+
+
+def _date_key(value):
+    """Serialize a modification date for storage and comparison"""
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _clean(prop, value):
+    # appscript returns k.missing_value for unset properties
+    if prop in TEXT_PROPERTIES:
+        return value if isinstance(value, str) else ""
+    return value if isinstance(value, (int, float)) else 0
+
+
+class LibraryCatalog:
+    """On-disk copy of the library's track metadata, refreshed incrementally"""
+
+    def __init__(self, path=None):
+        self.path = path or cache_path(CATALOG_FILE)
+        # The sync loop may touch the catalog from worker threads
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS tracks")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tracks (
+                persistent_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                album TEXT NOT NULL,
+                duration REAL,
+                track_number INTEGER,
+                disc_number INTEGER,
+                modification_date TEXT,
+                norm_name TEXT NOT NULL,
+                norm_artist TEXT NOT NULL,
+                norm_album TEXT NOT NULL,
+                core_name TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS tracks_norm ON tracks (norm_name, norm_artist)"
+        )
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def clear(self):
+        """Forget every catalogued track"""
+        self.conn.execute("DELETE FROM tracks")
+        self.conn.commit()
+
+    def refresh(self, backend, rebuild=False):
+        """
+        Bring the catalog in line with the library.
+
+        Args:
+            backend: Music backend to read the library from
+            rebuild (bool): If True, discard the catalog and read every track
+
+        Returns:
+            dict: Counts of 'added', 'updated' and 'removed' tracks
+        """
+        if rebuild:
+            self.clear()
+
+        columns = backend.get_track_columns(("persistent_id", "modification_date"))
+        current = dict(zip(columns["persistent_id"], columns["modification_date"]))
+        stored = {
+            row["persistent_id"]: row["modification_date"]
+            for row in self.conn.execute(
+                "SELECT persistent_id, modification_date FROM tracks"
+            )
+        }
+
+        removed = [pid for pid in stored if pid not in current]
+        changed = {
+            pid for pid, date in current.items()
+            if pid not in stored or stored[pid] != _date_key(date)
+        }
+
+        if changed:
+            dates = [current[pid] for pid in changed]
+            if len(changed) > len(current) * FULL_FETCH_RATIO or None in dates:
+                since = None
+            else:
+                since = min(dates)
+            properties = ("persistent_id", "modification_date") + LIBRARY_PROPERTIES
+            records = load_track_records(
+                backend.get_track_columns(properties, modified_since=since)
+            )
+            self._upsert([r for r in records if r["persistent_id"] in changed])
+
+        if removed:
+            self.conn.executemany(
+                "DELETE FROM tracks WHERE persistent_id = ?",
+                [(pid,) for pid in removed],
+            )
+        self.conn.commit()
+
+        added = sum(1 for pid in changed if pid not in stored)
+        return {
+            "added": added,
+            "updated": len(changed) - added,
+            "removed": len(removed),
+        }
+
+    def _upsert(self, records):
+        rows = []
+        for record in records:
+            values = {prop: _clean(prop, record[prop]) for prop in LIBRARY_PROPERTIES}
+            rows.append((
+                record["persistent_id"],
+                *(values[prop] for prop in LIBRARY_PROPERTIES),
+                _date_key(record["modification_date"]),
+                normalize_string(values["name"]),
+                normalize_string(values["artist"]),
+                normalize_string(values["album"]),
+                core_title(values["name"]),
+            ))
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO tracks (
+                persistent_id, name, artist, album, duration, track_number,
+                disc_number, modification_date, norm_name, norm_artist,
+                norm_album, core_name
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+    def records(self):
+        """Return every catalogued track as a LibraryTrack, normalized keys included"""
+        cursor = self.conn.cursor()
+        # Plain tuples unpack faster than sqlite3.Row
+        cursor.row_factory = None
+        cursor.execute(
+            """
+            SELECT persistent_id, name, artist, album, duration, track_number,
+                   disc_number, norm_name, norm_artist, norm_album, core_name
+            FROM tracks
+            """
+        )
+        with bulk_allocation():
+            return [LibraryTrack(*row) for row in cursor]
+
+    def delete(self, persistent_id):
+        """Drop a track that was deleted from the library"""
+        self.conn.execute("DELETE FROM tracks WHERE persistent_id = ?", (persistent_id,))
+        self.conn.commit()
@@ -0,0 +1,320 @@
+import heapq
+from collections import Counter
+from itertools import count
+
+from matching import (
+    artist_similarity,
+    core_title,
+    normalize_string,
+    primary_artist,
+    similarity,
+    title_numbers,
+)
+from music_backend import load_track_records
+from track_store import LibraryTrack, bulk_allocation
+
+
+# Track properties captured for every library track in a snapshot
+LIBRARY_PROPERTIES = (
+    "name",
+    "artist",
+    "album",
+    "duration",
+    "track_number",
+    "disc_number",
+)
+
+# Title words shared by more tracks than this ("the", "love") only add to the
+# hit counts of candidates that rarer words already selected
+COMMON_TOKEN_LIMIT = 1000
+
+# Candidates with the most matching title and artist words that get scored
+MAX_CANDIDATES = 50
+
+# Fuzzy matches score below this, so exact matches always rank first
+FUZZY_SCORE_CAP = 0.99
+
+# Share of a fuzzy score that comes from the title when an artist is given
+TITLE_WEIGHT = 0.7
+
+# Durations this many seconds apart still count as the same recording
+DURATION_TOLERANCE = 1
+
+
+def _seconds(duration):
+    # appscript returns k.missing_value for unset properties
+    return round(duration) if isinstance(duration, (int, float)) else None
+
+
+class LibraryIndex:
+    """
+    Snapshot of the Apple Music library keyed by normalized title and artist.
+
+    Each track is read from the Music app once when the snapshot is built;
+    lookups afterwards are dictionary probes instead of library scans.
+    Records are LibraryTracks (or dicts) holding the track's
+    'persistent_id' plus the properties in LIBRARY_PROPERTIES.
+
+    Words of each track's core title (see matching.core_title) and artist
+    are also indexed, so search() can find near matches by scoring a few
+    candidates that share words with the query.
+
+    Secondary indexes by (title, duration in whole seconds) and by (album,
+    disc number, track number) tell apart tracks that share a title, see
+    resolve_duplicates().
+    """
+
+    def __init__(self, records=()):
+        self._records = []
+        self._by_id = {}
+        self._by_title = {}
+        self._by_title_artist = {}
+        self._by_title_token = {}
+        self._by_artist_token = {}
+        self._by_title_duration = {}
+        self._by_album_position = {}
+        # id(record) -> (insertion position, record), to keep library order
+        self._entries = {}
+        self._next_position = count()
+        with bulk_allocation():
+            for record in records:
+                self.add(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def add(self, record):
+        """Add a track record to the index, normalizing its title, artist and album once"""
+        self._records.append(record)
+        self._entries[id(record)] = (next(self._next_position), record)
+        self._by_id[record.get("persistent_id")] = record
+        # The keys of _keys(), inlined as this runs for every track of a snapshot
+        norm_name, norm_artist, norm_album, core_name = self._normalized(record)
+        self._by_title.setdefault(norm_name, []).append(record)
+        self._by_title_artist.setdefault((norm_name, norm_artist), []).append(record)
+        self._by_title_duration.setdefault(
+            (norm_name, _seconds(record["duration"])), []
+        ).append(record)
+        self._by_album_position.setdefault(
+            (norm_album, record["disc_number"], record["track_number"]), []
+        ).append(record)
+        by_token = self._by_title_token
+        for token in set(core_name.split()):
+            by_token.setdefault(token, []).append(record)
+        by_token = self._by_artist_token
+        for token in set(norm_artist.split()):
+            by_token.setdefault(token, []).append(record)
+
+    def _keys(self, record):
+        """The (index, key) pairs a record is filed under"""
+        norm_name, norm_artist, norm_album, core_name = self._normalized(record)
+        yield self._by_title, norm_name
+        yield self._by_title_artist, (norm_name, norm_artist)
+        yield self._by_title_duration, (norm_name, _seconds(record["duration"]))
+        yield self._by_album_position, (norm_album, record["disc_number"], record["track_number"])
+        for token in set(core_name.split()):
+            yield self._by_title_token, token
+        for token in set(norm_artist.split()):
+            yield self._by_artist_token, token
+
+    def _normalized(self, record):
+        """A record's normalized title, artist and album and its core title, set once"""
+        try:
+            # Records loaded from the library catalog already carry them
+            return record["norm_name"], record["norm_artist"], record["norm_album"], record["core_name"]
+        except KeyError:
+            pass
+        if "norm_name" not in record:
+            record["norm_name"] = normalize_string(record["name"])
+            record["norm_artist"] = normalize_string(record["artist"])
+        if "norm_album" not in record:
+            album = record["album"]
+            record["norm_album"] = normalize_string(album if isinstance(album, str) else "")
+        if "core_name" not in record:
+            core_name = core_title(record["name"])
+            # Usually the same text as the normalized title; keep one copy
+            record["core_name"] = record["norm_name"] if core_name == record["norm_name"] else core_name
+        return record["norm_name"], record["norm_artist"], record["norm_album"], record["core_name"]
+
+    def remove(self, record):
+        """Drop a record from the index, e.g. after the track was deleted"""
+        for bucket, key in self._keys(record):
+            records = bucket.get(key, [])
+            _discard(records, record)
+            if not records:
+                bucket.pop(key, None)
+        _discard(self._records, record)
+        self._entries.pop(id(record), None)
+        if self._by_id.get(record.get("persistent_id")) is record:
+            del self._by_id[record.get("persistent_id")]
+
+    def get(self, persistent_id):
+        """Return the record for a persistent ID, or None if it isn't indexed"""
+        return self._by_id.get(persistent_id)
+
+    def lookup(self, title, artist=None):
+        """
+        Find tracks whose title (and artist, if given) match after normalization.
+
+        If no track has exactly this artist credit, tracks whose credit has
+        the same primary artist match: Spotify credits every artist of
+        "Get Lucky" where the library names only "Daft Punk".
+
+        Returns:
+            list: Matching records, in library order
+        """
+        norm_title = normalize_string(title)
+        if artist is None:
+            return list(self._by_title.get(norm_title, []))
+        key = (norm_title, normalize_string(artist))
+        if key in self._by_title_artist:
+            return list(self._by_title_artist[key])
+        artist = primary_artist(artist)
+        return [
+            record for record in self._by_title.get(norm_title, ())
+            if isinstance(record["artist"], str) and primary_artist(record["artist"]) == artist
+        ]
+
+    def lookup_duration(self, title, duration, tolerance=DURATION_TOLERANCE):
+        """
+        Find tracks with this normalized title whose duration is within tolerance.
+
+        Durations are bucketed by whole second; the buckets either side of
+        the duration's are probed too, so this costs a few dict lookups.
+
+        Returns:
+            list: Matching records, in library order
+        """
+        seconds = _seconds(duration)
+        if seconds is None:
+            return []
+        norm_title = normalize_string(title)
+        found = []
+        for bucket in range(seconds - tolerance - 1, seconds + tolerance + 2):
+            for record in self._by_title_duration.get((norm_title, bucket), ()):
+                if abs(record["duration"] - duration) <= tolerance:
+                    found.append(record)
+        found.sort(key=lambda record: self._entries[id(record)][0])
+        return found
+
+    def lookup_album_track(self, album, disc_number, track_number):
+        """Find the tracks at this disc and track number of an album (normalized)"""
+        key = (normalize_string(album), disc_number, track_number)
+        return list(self._by_album_position.get(key, []))
+
+    def resolve_duplicates(self, track, candidates):
+        """
+        Narrow down library tracks that all match a track's title.
+
+        Candidates outside the track's duration tolerance are dropped, then
+        those at another album position, as long as something is left.
+        Each step is a few dict lookups, whatever the number of candidates.
+
+        Args:
+            track (dict): Track with 'name', 'duration', 'album',
+                'disc_number' and 'track_number'
+            candidates (list): Library records to choose from
+
+        Returns:
+            list: The candidates that are still tied, in their given order
+        """
+        for found in (
+            self.lookup_duration(track["name"], track["duration"]),
+            self.lookup_album_track(
+                track["album"] if isinstance(track["album"], str) else "",
+                track["disc_number"],
+                track["track_number"],
+            ),
+        ):
+            keys = {id(record) for record in found}
+            narrowed = [record for record in candidates if id(record) in keys]
+            if narrowed:
+                candidates = narrowed
+        return candidates
+
+    def search(self, title, artist=None, limit=5, min_score=0.0):
+        """
+        Find the tracks that best match a title (and artist, if given).
+
+        Exact matches, as returned by lookup(), score 1.0. Other tracks are
+        scored by the similarity of their core titles and artists, capped
+        at FUZZY_SCORE_CAP, so "Song (Remastered 2011)" still finds "Song".
+        Only tracks sharing a title word with the query are scored, and
+        only if their titles are numbered alike: "Nocturne No. 1" is not a
+        near match for "Nocturne No. 2", nor "Part I" for "Part II".
+
+        Returns:
+            list: (score, record) pairs, best first, ties in library order
+        """
+        exact = self.lookup(title, artist)
+        results = [(1.0, record) for record in exact]
+        if len(results) >= limit:
+            return results[:limit]
+
+        query_title = core_title(title)
+        query_artist = normalize_string(artist) if artist is not None else None
+        query_numbers = title_numbers(query_title)
+        exact_ids = {id(record) for record in exact}
+        fuzzy = []
+        for record in self._candidates(query_title, query_artist):
+            if id(record) in exact_ids or title_numbers(record["core_name"]) != query_numbers:
+                continue
+            score = similarity(query_title, record["core_name"])
+            if query_artist is not None:
+                score = TITLE_WEIGHT * score + (1 - TITLE_WEIGHT) * artist_similarity(
+                    query_artist, record["norm_artist"]
+                )
+            score = min(score, FUZZY_SCORE_CAP)
+            if score >= min_score:
+                fuzzy.append((score, record))
+        fuzzy.sort(key=lambda item: item[0], reverse=True)
+        return results + fuzzy[:limit - len(results)]
+
+    def _candidates(self, query_title, query_artist):
+        """Records sharing the most title (then artist) words with the query"""
+        postings = sorted(
+            (self._by_title_token.get(token, []) for token in set(query_title.split())),
+            key=len,
+        )
+        hits = Counter()
+        for posting in postings:
+            if hits and len(posting) > COMMON_TOKEN_LIMIT:
+                break
+            hits.update(map(id, posting))
+        if query_artist is not None:
+            # Artist words only rank the title candidates, they add none
+            for token in set(query_artist.split()):
+                posting = self._by_artist_token.get(token, [])
+                if len(posting) > COMMON_TOKEN_LIMIT:
+                    continue
+                for key in map(id, posting):
+                    if key in hits:
+                        hits[key] += 1
+        best = heapq.nlargest(MAX_CANDIDATES, hits.items(), key=lambda item: item[1])
+        # Back in library order, so equal scores keep it
+        entries = sorted(self._entries[key] for key, _ in best)
+        return [record for _, record in entries]
+
+
+def _discard(records, record):
+    # Record dicts compare by value, so compare by identity instead
+    for i, existing in enumerate(records):
+        if existing is record:
+            del records[i]
+            return
+
+
+def build_library_index(backend):
+    """
+    Read the library from the Music backend and index it.
+
+    Each property is fetched as a single column for the whole library, so a
+    snapshot costs one Apple Event per property regardless of library size.
+    """
+    columns = backend.get_track_columns(("persistent_id",) + LIBRARY_PROPERTIES)
+    return LibraryIndex(
+        LibraryTrack.from_record(record) for record in load_track_records(columns)
+    )
@@ -0,0 +1,180 @@
+"""
+Persistent store of Spotify tracks matched to Apple Music library tracks.
+
+Once a Spotify track URI has been matched to a library track, the pair is
+kept with its match confidence and the time it was made, so later runs
+don't search the library for it again. A stored pair is only trusted while
+its persistent ID is still in the library; pairs whose track disappeared
+are dropped.
+"""
+
+import sqlite3
+import threading
+import time
+
+from paths import cache_path
+
+MATCH_CACHE_FILE = "matches.sqlite3"
+# 2: near matches are only stored once added; version 1 stores may hold
+# near matches the user declined, so they are dropped
+SCHEMA_VERSION = 2
+
+
+class MatchCache:
+    """SQLite-backed Spotify URI -> Apple persistent ID mapping with hit counters"""
+
+    def __init__(self, path=None):
+        self.path = path or cache_path(MATCH_CACHE_FILE)
+        # Lookups and writes come from the planning threads and the apply
+        # writer of a sync; the lock keeps each statement and its commit,
+        # and the counters, to one thread at a time
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._create_schema()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _create_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS matches")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS matches (
+                spotify_uri TEXT PRIMARY KEY,
+                persistent_id TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                matched_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS matches_persistent_id ON matches (persistent_id)"
+        )
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def get(self, spotify_uri, library):
+        """
+        Return the stored match for a Spotify track if it is still valid.
+
+        Args:
+            spotify_uri (str): Spotify track URI
+            library: Anything with get(persistent_id) returning None for
+                tracks that are gone, e.g. a LibraryIndex
+
+        Returns:
+            dict: 'persistent_id', 'confidence' and 'matched_at', or None
+        """
+        return self.get_many([spotify_uri], library).get(spotify_uri)
+
+    def get_many(self, spotify_uris, library):
+        """Return {uri: match} for the URIs with a valid stored match, see get()"""
+        spotify_uris = list(dict.fromkeys(spotify_uris))
+        rows = {}
+        with self._lock:
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(spotify_uris), 500):
+                chunk = spotify_uris[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT * FROM matches WHERE spotify_uri IN ({placeholders})", chunk
+                ):
+                    rows[row["spotify_uri"]] = row
+
+        found = {}
+        stale = []
+        for uri in spotify_uris:
+            row = rows.get(uri)
+            if row is not None and library.get(row["persistent_id"]) is None:
+                stale.append(uri)
+                row = None
+            if row is None:
+                continue
+            found[uri] = {
+                "persistent_id": row["persistent_id"],
+                "confidence": row["confidence"],
+                "matched_at": row["matched_at"],
+            }
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(spotify_uris) - len(found)
+            if stale:
+                self.evictions += len(stale)
+                self.conn.executemany(
+                    "DELETE FROM matches WHERE spotify_uri = ?", [(uri,) for uri in stale]
+                )
+                self.conn.commit()
+        return found
+
+    def put(self, spotify_uri, persistent_id, confidence=1.0):
+        """Remember that a Spotify track is the library track with this persistent ID"""
+        self.put_many([(spotify_uri, persistent_id, confidence)])
+
+    def put_many(self, matches):
+        """Remember (spotify_uri, persistent_id, confidence) matches"""
+        now = time.time()
+        rows = [(uri, pid, confidence, now) for uri, pid, confidence in matches]
+        with self._lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO matches (spotify_uri, persistent_id, confidence, matched_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self.conn.commit()
+
+    def evict_track(self, persistent_id):
+        """Forget every match to a library track, e.g. after it was deleted"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM matches WHERE persistent_id = ?", (persistent_id,)
+            )
+            self.conn.commit()
+            self.evictions += cursor.rowcount
+
+    def prune(self, library):
+        """
+        Drop the matches whose library track no longer exists.
+
+        Returns:
+            int: Number of matches dropped
+        """
+        with self._lock:
+            stale = [
+                (row["spotify_uri"],)
+                for row in self.conn.execute("SELECT spotify_uri, persistent_id FROM matches")
+                if library.get(row["persistent_id"]) is None
+            ]
+            self.conn.executemany("DELETE FROM matches WHERE spotify_uri = ?", stale)
+            self.conn.commit()
+            self.evictions += len(stale)
+        return len(stale)
+
+    def stats(self):
+        """Return this process's hit/miss/eviction counts, hit rate and stored matches"""
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": evictions,
+            "entries": len(self),
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,181 @@
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+# Number of distinct strings normalize_string remembers; library titles,
+# artists and albums repeat across every scan, so most calls are cache hits
+NORMALIZE_CACHE_SIZE = int(os.environ.get("MUSIC_ARCHIVER_NORMALIZE_CACHE", 65536))
+
+# Anything that isn't alphanumeric or whitespace is dropped
+_SPECIAL_CHARS = re.compile(r"[^\w\s]")
+
+# For ASCII-only strings lowercasing is all the Unicode handling needed, and
+# one translate() call removes the special characters
+_ASCII_SPECIAL_CHARS = str.maketrans(
+    "",
+    "",
+    "".join(
+        c for c in map(chr, range(128))
+        if not (c.isalnum() or c == "_" or c.isspace())
+    ),
+)
+
+# Annotations that Spotify and the Music app attach to the same recording in
+# different ways: "Song (Remastered 2011)", "Song - 2011 Remaster",
+# "Song [feat. Someone]". Live, remix and edit versions are different
+# recordings and keep their annotations.
+_ANNOTATION_WORDS = (
+    r"(?:remaster(?:ed)?|feat\.?|ft\.?|featuring|with|mono|stereo|explicit|clean"
+    r"|deluxe|bonus|from|(?:single|album|radio) (?:version|edit))"
+)
+_BRACKETED_ANNOTATION = re.compile(
+    rf"\s*[(\[][^)\]]*\b{_ANNOTATION_WORDS}(?![\w])[^)\]]*[)\]]", re.IGNORECASE
+)
+_DASH_ANNOTATION = re.compile(rf"\s+-\s+.*\b{_ANNOTATION_WORDS}(?![\w]).*$", re.IGNORECASE)
+_FEAT_CREDIT = re.compile(r"\s+(?:feat\.?|ft\.|featuring)\s+.*$", re.IGNORECASE)
+
+# Separators between the artists of a credit: "A, B", "A & B", "A feat. B"
+_ARTIST_SEPARATOR = re.compile(
+    r"\s*(?:,|&|;|\s/\s|\s(?:feat\.?|ft\.|featuring)\s)\s*", re.IGNORECASE
+)
+
+
+# Helper functions for improved string matching
+def _normalize(s):
+    # Convert to lowercase
+    s = s.lower()
+    if s.isascii():
+        s = s.translate(_ASCII_SPECIAL_CHARS)
+    else:
+        # Normalize Unicode characters (NFKD decomposition)
+        s = unicodedata.normalize("NFKD", s)
+        # Remove diacritics (accents)
+        s = "".join(c for c in s if not unicodedata.combining(c))
+        # Remove special characters, keep only alphanumeric and spaces
+        s = _SPECIAL_CHARS.sub("", s)
+    # Remove extra whitespace
+    return " ".join(s.split())
+
+
+_normalize_cached = lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize)
+
+
+def normalize_string(s):
+    """
+    Normalize a string by:
+    1. Converting to lowercase
+    2. Removing diacritics (accents)
+    3. Removing special characters except alphanumeric and spaces
+
+    Results are memoized in a bounded LRU cache, see configure_normalize_cache.
+    """
+    return _normalize_cached(s)
+
+
+def configure_normalize_cache(maxsize=NORMALIZE_CACHE_SIZE):
+    """Replace the normalize_string cache with an empty one holding up to maxsize strings"""
+    global _normalize_cached
+    _normalize_cached = lru_cache(maxsize=maxsize)(_normalize)
+
+
+def normalize_cache_info():
+    """Return hit/miss counters and size of the normalize_string cache"""
+    return _normalize_cached.cache_info()
+
+
+def strings_match(str1, str2, strict=False):
+    """
+    Compare two strings with improved matching for special characters.
+
+    Parameters:
+        str1, str2: The strings to compare
+        strict: If True, only normalize case, otherwise do full normalization
+
+    Returns:
+        True if strings match according to the comparison method
+    """
+    if strict:
+        # Case-insensitive comparison only
+        return str1.lower() == str2.lower()
+    else:
+        # Full normalization for more lenient comparison
+        return normalize_string(str1) == normalize_string(str2)
+
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def core_title(title):
+    """
+    Normalize a title with its version and featured-artist annotations removed,
+    so "Song (Remastered 2011)" and "Song - feat. Someone" both become "song".
+    """
+    stripped = _BRACKETED_ANNOTATION.sub("", title)
+    stripped = _DASH_ANNOTATION.sub("", stripped)
+    stripped = _FEAT_CREDIT.sub("", stripped)
+    # A title that is nothing but an annotation is kept as it is
+    return normalize_string(stripped) or normalize_string(title)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def primary_artist(artist):
+    """Normalize the first artist of a credit ("Daft Punk & Pharrell" gives "daft punk")"""
+    return normalize_string(_ARTIST_SEPARATOR.split(artist, 1)[0]) or normalize_string(artist)
+
+
+def split_search_term(search_term):
+    """
+    Split a 'track_name - artist_name' search term.
+
+    A suffix that is a version annotation ("Song - Remastered 2009") belongs
+    to the title, so the whole term is returned as the title.
+
+    Returns:
+        tuple: (title, artist), artist is None if the term has none
+    """
+    if " - " not in search_term:
+        return search_term, None
+    title, artist = search_term.split(" - ", 1)
+    if _DASH_ANNOTATION.search(search_term) and core_title(search_term) == core_title(title):
+        return search_term, None
+    return title, artist
+
+
+# Title words that number a piece or a part: digits, and roman numerals from
+# ii up ("i" is far more often the pronoun)
+_NUMBER_TOKEN = re.compile(r"\d+|(?=[ivx]{2}|v|x)x{0,3}(?:ix|iv|v?i{0,3})")
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def title_numbers(title):
+    """
+    The numbering words of a normalized title, e.g. {"2"} for "nocturne no 2"
+    and {"ii"} for "symphony part ii".
+
+    Two titles with different numbering are different pieces however
+    similar the rest of them is.
+    """
+    return frozenset(token for token in title.split() if _NUMBER_TOKEN.fullmatch(token))
+
+
+def similarity(a, b):
+    """Similarity between 0 and 1 of two normalized strings"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def artist_similarity(a, b):
+    """
+    Similarity of two normalized artist names.
+
+    Credits listing several artists ("jungle" and "jungle someone") count as
+    a full match when all words of one are part of the other.
+    """
+    a_tokens, b_tokens = set(a.split()), set(b.split())
+    if a_tokens and b_tokens and (a_tokens <= b_tokens or b_tokens <= a_tokens):
+        return 1.0
+    return similarity(a, b)
@@ -0,0 +1,262 @@
+"""
+Index of the media files in the Music folder.
+
+Maps the normalized tokens of each file's title, album and artist (the same
+normalize_string rules the library lookups use) to its path, so a search is
+a few dictionary probes instead of a find over the whole tree. The index is
+saved to the cache directory and refreshed by directory mtime: folders whose
+mtime hasn't changed are not listed again.
+
+Usage:
+    python3 media_index.py build [--music-dir DIR]
+    python3 media_index.py query [--music-dir DIR] [--limit N] "search term"
+"""
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sys
+from bisect import bisect_left
+from collections import Counter
+
+from matching import normalize_string
+from paths import cache_path
+
+MUSIC_DIR = os.path.join(os.path.expanduser("~"), "Music", "Music")
+INDEX_FILE = "media_index.json"
+INDEX_VERSION = 2
+
+MEDIA_EXTENSIONS = (".m4a", ".mp3", ".aac", ".aif", ".aiff", ".wav")
+
+# Search tokens found in more files than this only narrow down candidates
+# that rarer tokens already selected
+CANDIDATE_LIMIT = 2000
+
+# Track number prefixes the Music app puts on file names ("01 ", "1-01 ")
+_TRACK_NUMBER = re.compile(r"^\d+(-\d+)?\s+")
+
+
+def _title_tokens(filename):
+    title = _TRACK_NUMBER.sub("", os.path.splitext(filename)[0])
+    return " ".join(dict.fromkeys(normalize_string(title).split()))
+
+
+class MediaIndex:
+    """Token index over the media files below a music folder"""
+
+    def __init__(self, music_dir=MUSIC_DIR, path=None):
+        self.music_dir = os.path.abspath(music_dir)
+        self.path = path or cache_path(INDEX_FILE)
+        # {relative dir: {"mtime": float, "subdirs": [names],
+        #                 "files": [[name, normalized title tokens]]}}
+        self.dirs = {}
+        # Derived from dirs: [[relative dir, name, title token count]] and
+        # {token: ascending file positions}; rebuilt when a directory changes
+        self._files = None
+        self._postings = None
+
+    def load(self):
+        """Read the saved index; returns False if there is none for this folder"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("music_dir") != self.music_dir:
+            return False
+        self.dirs = data["dirs"]
+        self._files = data["files"]
+        self._postings = data["postings"]
+        return True
+
+    def save(self):
+        if self._postings is None:
+            self._build_postings()
+        # The postings are saved too, so a fresh process can query right away
+        data = {
+            "version": INDEX_VERSION,
+            "music_dir": self.music_dir,
+            "dirs": self.dirs,
+            "files": self._files,
+            "postings": self._postings,
+        }
+        # Write to a temporary file first so a crash can't leave half an index
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return sum(len(entry["files"]) for entry in self.dirs.values())
+
+    def refresh(self):
+        """
+        Bring the index in line with the folder.
+
+        Only directories whose mtime changed are listed again; unchanged
+        ones cost a single stat.
+
+        Returns:
+            int: Number of directories that were (re)listed or dropped
+        """
+        old_dirs = self.dirs
+        new_dirs = {}
+        changed = 0
+        pending = [""]
+        while pending:
+            rel = pending.pop()
+            full = os.path.join(self.music_dir, rel)
+            try:
+                mtime = os.stat(full).st_mtime
+            except OSError:
+                continue
+            entry = old_dirs.get(rel)
+            if entry is None or entry["mtime"] != mtime:
+                entry = self._scan_dir(full, mtime)
+                if entry is None:
+                    continue
+                changed += 1
+            new_dirs[rel] = entry
+            pending.extend(os.path.join(rel, name) for name in entry["subdirs"])
+
+        changed += len(old_dirs.keys() - new_dirs.keys())
+        self.dirs = new_dirs
+        if changed:
+            self._postings = None
+        return changed
+
+    def _scan_dir(self, full, mtime):
+        entry = {"mtime": mtime, "subdirs": [], "files": []}
+        try:
+            with os.scandir(full) as items:
+                for item in items:
+                    if item.is_dir(follow_symlinks=False):
+                        entry["subdirs"].append(item.name)
+                    elif item.name.lower().endswith(MEDIA_EXTENSIONS):
+                        entry["files"].append([item.name, _title_tokens(item.name)])
+        except OSError:
+            return None
+        return entry
+
+    def _build_postings(self):
+        files = self._files = []
+        postings = self._postings = {}
+        for rel, entry in self.dirs.items():
+            if not entry["files"]:
+                continue
+            # Music keeps files as Artist/Album/Title, so folder names add
+            # the artist and album tokens
+            folder_tokens = normalize_string(rel.replace(os.sep, " ")).split()
+            for name, title in entry["files"]:
+                title_tokens = title.split()
+                file_id = len(files)
+                files.append([rel, name, max(len(title_tokens), 1)])
+                for token in set(folder_tokens + title_tokens):
+                    if token in postings:
+                        postings[token].append(file_id)
+                    else:
+                        postings[token] = [file_id]
+
+    def in_folder_of(self, path, text):
+        """
+        Whether one of the folders holding path is named after text, e.g.
+        whether a file is filed under an artist's folder.
+
+        A folder counts if its name holds every word of text after
+        normalization, so "The Weeknd" is not found in "The xx".
+        """
+        tokens = set(normalize_string(text).split())
+        if not tokens:
+            return False
+        rel = os.path.relpath(os.path.dirname(path), self.music_dir)
+        return any(
+            tokens <= set(normalize_string(folder).split())
+            for folder in rel.split(os.sep)
+        )
+
+    def query(self, text, limit=10):
+        """
+        Find the files that best match a search term.
+
+        Candidates come from the postings of the rarest search tokens, so a
+        query touches a small part of the index. Each candidate is scored by
+        the share of the search tokens it contains, averaged with the share
+        of its title tokens the search covers.
+
+        Returns:
+            list: (absolute path, score between 0 and 1), best first
+        """
+        if self._postings is None:
+            self._build_postings()
+        tokens = set(normalize_string(text).split())
+        if not tokens:
+            return []
+
+        postings = [self._postings.get(token, []) for token in tokens]
+        postings.sort(key=len)
+
+        # Rare tokens select the candidates, counting matches as they go
+        hits = Counter()
+        common = []
+        for posting in postings:
+            if hits and len(posting) > CANDIDATE_LIMIT:
+                common.append(posting)
+            else:
+                hits.update(posting)
+
+        files = self._files
+        query_size = len(tokens)
+        scored = []
+        for file_id, matched in hits.items():
+            # Common tokens are checked by binary search in their postings
+            for posting in common:
+                i = bisect_left(posting, file_id)
+                if i < len(posting) and posting[i] == file_id:
+                    matched += 1
+            title_size = files[file_id][2]
+            score = (matched / query_size + min(1.0, matched / title_size)) / 2
+            scored.append((score, -file_id))
+        # Ties go to the file indexed first, keeping results stable
+        best = heapq.nlargest(limit, scored)
+        return [
+            (os.path.join(self.music_dir, files[-file_id][0], files[-file_id][1]), score)
+            for score, file_id in best
+        ]
+
+
+def open_media_index(music_dir=MUSIC_DIR, path=None):
+    """Load the saved index for a folder, refresh it and save it if anything changed"""
+    index = MediaIndex(music_dir, path=path)
+    loaded = index.load()
+    if index.refresh() or not loaded:
+        index.save()
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search media files in the Music folder")
+    parser.add_argument("--music-dir", default=MUSIC_DIR, help="folder to index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="build or refresh the index")
+    query = subparsers.add_parser("query", help="print matching files, best first")
+    query.add_argument("term", help="search term, e.g. a song title and artist")
+    query.add_argument("--limit", type=int, default=10, help="maximum number of results")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.music_dir):
+        print(f"Music directory not found: {args.music_dir}", file=sys.stderr)
+        return 1
+
+    index = open_media_index(args.music_dir)
+    if args.command == "build":
+        print(f"Indexed {len(index)} media files in {args.music_dir}")
+    else:
+        for path, _ in index.query(args.term, limit=args.limit):
+            print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
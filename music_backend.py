@@ -0,0 +1,415 @@
+"""
+Access to the Apple Music library.
+
+Track data is read a whole property column at a time: one Apple Event returns
+a property for every track, instead of one event per track and property.
+Tracks are identified by persistent ID so later deletes don't depend on
+holding live object references.
+
+FakeMusicBackend stands in for the Music app off macOS: it can generate a
+synthetic library of any size and delay each Apple Event it simulates, so
+the sync code can be tested and benchmarked anywhere.
+"""
+
+import os
+import random
+import subprocess
+import time
+from collections import Counter
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from batch_add import BATCH_SIZE, add_tracks_to_playlist
+
+# Record keys mapped to the Music app's scripting property names
+APPLESCRIPT_PROPERTIES = {
+    "persistent_id": "persistent_ID",
+    "name": "name",
+    "artist": "artist",
+    "album": "album",
+    "duration": "duration",
+    "track_number": "track_number",
+    "disc_number": "disc_number",
+    "modification_date": "modification_date",
+}
+
+# Tracks removed from a playlist per Apple Event
+REMOVE_CHUNK_SIZE = 100
+
+
+class MusicBackend:
+    """
+    Interface to the Music app used by the library index and sync code.
+
+    Every call that would be an Apple Event on macOS increments event_count,
+    so tests and benchmarks can measure how chatty a code path is; calls
+    counts the calls of each method.
+    """
+
+    def __init__(self):
+        self.event_count = 0
+        self.calls = Counter()
+
+    def _count(self, method, events=1):
+        self.calls[method] += 1
+        self.event_count += events
+
+    def reset_counts(self):
+        """Zero event_count and calls, returning what they held"""
+        counts = {"events": self.event_count, "calls": dict(self.calls)}
+        self.event_count = 0
+        self.calls.clear()
+        return counts
+
+    def get_track_columns(self, properties, modified_since=None):
+        """
+        Return {property: [value per library track]} for the given record keys.
+
+        If modified_since is given, only tracks modified at or after that
+        date are included.
+        """
+        raise NotImplementedError
+
+    def get_playlist_track_columns(self, playlist_name, properties):
+        """Return {property: [value per playlist track]} for a user playlist"""
+        raise NotImplementedError
+
+    def get_playlist_names(self):
+        """Return the names of all user playlists"""
+        raise NotImplementedError
+
+    def delete_track(self, persistent_id):
+        """Delete a track from the library"""
+        raise NotImplementedError
+
+    def add_playlist_tracks(self, playlist_name, tracks):
+        """
+        Add tracks to a playlist.
+
+        Args:
+            playlist_name (str): Playlist to add to
+            tracks (list): Persistent IDs of library tracks or POSIX paths
+                of media files, which are imported into the library first
+
+        Returns:
+            dict: {track: (True, None) or (False, error message)}
+        """
+        raise NotImplementedError
+
+    def remove_playlist_tracks(self, playlist_name, persistent_ids):
+        """
+        Remove several tracks from a playlist, leaving them in the library.
+
+        Returns:
+            dict: {persistent ID: None if removed, else an error message}
+        """
+        raise NotImplementedError
+
+    def remove_playlist_entries(self, playlist_name, entries):
+        """
+        Remove single playlist entries by position, for tracks the playlist
+        holds more than once.
+
+        Args:
+            playlist_name (str): Playlist to remove from
+            entries (list): (1-based playlist index, persistent ID) pairs;
+                an entry is only removed if it still holds that track
+
+        Returns:
+            dict: {index: None if removed, else an error message}
+        """
+        raise NotImplementedError
+
+
+class AppscriptMusicBackend(MusicBackend):
+    """Music backend talking to the Music app through appscript"""
+
+    def __init__(self, music=None, runner=subprocess.run):
+        super().__init__()
+        if music is None:
+            from appscript import app
+
+            music = app("Music")
+        self.music = music
+        # Launches osascript for playlist additions, see batch_add
+        self.runner = runner
+
+    def _get_columns(self, reference, properties, method):
+        self._count(method, len(properties))
+        return {
+            prop: getattr(reference, APPLESCRIPT_PROPERTIES[prop]).get()
+            for prop in properties
+        }
+
+    def get_track_columns(self, properties, modified_since=None):
+        tracks = self.music.tracks
+        if modified_since is not None:
+            from appscript import its
+
+            tracks = tracks[its.modification_date >= modified_since]
+        return self._get_columns(tracks, properties, "get_track_columns")
+
+    def get_playlist_track_columns(self, playlist_name, properties):
+        return self._get_columns(
+            self.music.playlists[playlist_name].tracks, properties, "get_playlist_track_columns"
+        )
+
+    def get_playlist_names(self):
+        self._count("get_playlist_names")
+        return self.music.user_playlists.name.get()
+
+    def delete_track(self, persistent_id):
+        from appscript import its
+
+        self._count("delete_track")
+        self.music.tracks[its.persistent_ID == persistent_id].delete()
+
+    def add_playlist_tracks(self, playlist_name, tracks):
+        tracks = list(tracks)
+        # One osascript launch per batch
+        self._count("add_playlist_tracks", -(-len(tracks) // BATCH_SIZE))
+        return add_tracks_to_playlist(playlist_name, tracks, runner=self.runner)
+
+    def remove_playlist_tracks(self, playlist_name, persistent_ids):
+        from appscript import its
+
+        playlist = self.music.playlists[playlist_name]
+        persistent_ids = list(dict.fromkeys(persistent_ids))
+        self._count("remove_playlist_tracks", -(-len(persistent_ids) // REMOVE_CHUNK_SIZE))
+        results = {}
+        # One Apple Event per chunk, deleting every track the whose-clause
+        # matches; chunks keep the clause to a size the Music app handles well
+        for start in range(0, len(persistent_ids), REMOVE_CHUNK_SIZE):
+            chunk = persistent_ids[start:start + REMOVE_CHUNK_SIZE]
+            tests = [its.persistent_ID == pid for pid in chunk]
+            test = tests[0].OR(*tests[1:]) if len(tests) > 1 else tests[0]
+            try:
+                playlist.tracks[test].delete()
+                error = None
+            except Exception as e:
+                error = str(e)
+            results.update((pid, error) for pid in chunk)
+        return results
+
+    def remove_playlist_entries(self, playlist_name, entries):
+        tracks = self.music.playlists[playlist_name].tracks
+        results = {}
+        # Highest index first, so each removal leaves the lower indexes valid
+        for index, persistent_id in sorted(entries, reverse=True):
+            self._count("remove_playlist_entries", 2)
+            try:
+                if tracks[index].persistent_ID.get() != persistent_id:
+                    results[index] = "playlist changed since it was read"
+                    continue
+                tracks[index].delete()
+                results[index] = None
+            except Exception as e:
+                results[index] = str(e)
+        return results
+
+
+# Syllables the synthetic library's words are made of
+_SYLLABLES = ("ka", "lo", "mi", "ra", "ne", "so", "tu", "vi", "da", "pe", "ri", "zo", "la", "me", "no", "sa")
+
+# Titles that recur across artists, as they do in real libraries
+_COMMON_TITLES = ("Intro", "Home", "Outro", "Interlude", "Stay", "Forever")
+
+_TITLE_SUFFIXES = (" (Remastered)", " - Live", " (Radio Edit)", " (feat. Kari Sone)")
+
+
+class FakeMusicBackend(MusicBackend):
+    """
+    In-process stand-in for the Music app.
+
+    Tracks are dicts keyed like library records (persistent_id, name, artist,
+    ...); playlists map a name to a list of persistent IDs. Each simulated
+    Apple Event sleeps for latency seconds.
+    """
+
+    def __init__(self, tracks=(), playlists=None, latency=0.0):
+        super().__init__()
+        self.tracks = [dict(track) for track in tracks]
+        self.playlists = {
+            name: list(ids) for name, ids in (playlists or {}).items()
+        }
+        self.latency = latency
+        # Persistent IDs of the media files imported by add_playlist_tracks
+        self.imported = {}
+
+    @classmethod
+    def synthetic(cls, size, playlist_count=0, playlist_size=100, seed=0, latency=0.0):
+        """
+        Return a backend holding a generated library.
+
+        The library has size tracks by roughly size / 10 artists, with
+        skewed word frequencies, recurring titles, version suffixes, and
+        duplicate tracks on compilations. The same arguments always give the
+        same library. There are playlist_count playlists named "Playlist 1",
+        "Playlist 2"... of playlist_size random library tracks each.
+        """
+        tracks, playlists = synthetic_library(size, playlist_count, playlist_size, seed)
+        return cls(tracks, playlists, latency=latency)
+
+    def _count(self, method, events=1):
+        super()._count(method, events)
+        if self.latency:
+            time.sleep(self.latency * events)
+
+    def _columns(self, tracks, properties, method):
+        self._count(method, len(properties))
+        return {prop: [track.get(prop) for track in tracks] for prop in properties}
+
+    def get_track_columns(self, properties, modified_since=None):
+        tracks = self.tracks
+        if modified_since is not None:
+            tracks = [t for t in tracks if t["modification_date"] >= modified_since]
+        return self._columns(tracks, properties, "get_track_columns")
+
+    def get_playlist_track_columns(self, playlist_name, properties):
+        if playlist_name not in self.playlists:
+            self._count("get_playlist_track_columns")
+            raise KeyError(f"Playlist '{playlist_name}' does not exist")
+        by_id = {track["persistent_id"]: track for track in self.tracks}
+        tracks = [by_id[pid] for pid in self.playlists[playlist_name] if pid in by_id]
+        return self._columns(tracks, properties, "get_playlist_track_columns")
+
+    def get_playlist_names(self):
+        self._count("get_playlist_names")
+        return list(self.playlists)
+
+    def delete_track(self, persistent_id):
+        self._count("delete_track")
+        self.tracks = [t for t in self.tracks if t["persistent_id"] != persistent_id]
+        for ids in self.playlists.values():
+            while persistent_id in ids:
+                ids.remove(persistent_id)
+
+    def add_playlist_tracks(self, playlist_name, tracks):
+        tracks = list(tracks)
+        self._count("add_playlist_tracks", -(-len(tracks) // BATCH_SIZE))
+        if playlist_name not in self.playlists:
+            return {track: (False, f"Playlist '{playlist_name}' does not exist") for track in tracks}
+        ids = {track["persistent_id"] for track in self.tracks}
+        results = {}
+        for track in tracks:
+            if os.path.isabs(track):
+                persistent_id = self._import(track)
+            elif track in ids:
+                persistent_id = track
+            else:
+                results[track] = (False, "Can't get track")
+                continue
+            self.playlists[playlist_name].append(persistent_id)
+            results[track] = (True, None)
+        return results
+
+    def _import(self, path):
+        """Add a media file to the library once, named after its Artist/Album/Title path"""
+        if path not in self.imported:
+            album_dir, filename = os.path.split(path)
+            artist_dir, album = os.path.split(album_dir)
+            persistent_id = f"{0xF000000000000000 + len(self.imported):016X}"
+            self.tracks.append({
+                "persistent_id": persistent_id,
+                "name": os.path.splitext(filename)[0],
+                "artist": os.path.basename(artist_dir),
+                "album": album,
+                "duration": 0.0,
+                "track_number": 0,
+                "disc_number": 0,
+                "modification_date": datetime.now(),
+            })
+            self.imported[path] = persistent_id
+        return self.imported[path]
+
+    def remove_playlist_tracks(self, playlist_name, persistent_ids):
+        persistent_ids = list(dict.fromkeys(persistent_ids))
+        self._count("remove_playlist_tracks", -(-len(persistent_ids) // REMOVE_CHUNK_SIZE))
+        removing = set(persistent_ids)
+        ids = self.playlists[playlist_name]
+        ids[:] = [pid for pid in ids if pid not in removing]
+        return {pid: None for pid in persistent_ids}
+
+    def remove_playlist_entries(self, playlist_name, entries):
+        ids = self.playlists[playlist_name]
+        results = {}
+        for index, persistent_id in sorted(entries, reverse=True):
+            self._count("remove_playlist_entries", 2)
+            if not 0 < index <= len(ids) or ids[index - 1] != persistent_id:
+                results[index] = "playlist changed since it was read"
+                continue
+            del ids[index - 1]
+            results[index] = None
+        return results
+
+
+def synthetic_library(size, playlist_count=0, playlist_size=100, seed=0):
+    """
+    Generate library tracks and playlists, see FakeMusicBackend.synthetic.
+
+    Returns:
+        tuple: (track records, {playlist name: [persistent IDs]})
+    """
+    rng = random.Random(seed)
+    words = [a + b for a in _SYLLABLES for b in _SYLLABLES]
+    words += [a + b + c for a in _SYLLABLES[:8] for b in _SYLLABLES for c in _SYLLABLES[:8]]
+    rng.shuffle(words)
+    # Zipf-like word frequencies: a few words are in many titles
+    weights = list(accumulate(rank ** -0.7 for rank in range(1, len(words) + 1)))
+
+    def phrase(low, high):
+        count = rng.randint(low, high)
+        return " ".join(rng.choices(words, cum_weights=weights, k=count)).title()
+
+    artists = [phrase(1, 2) for _ in range(max(1, size // 10))]
+    base_date = datetime(2020, 1, 1)
+    tracks = []
+    albums = {}
+    while len(tracks) < size:
+        artist = rng.choice(artists)
+        album = albums.setdefault(artist, phrase(1, 3))
+        if rng.random() < 0.2:
+            # Start the artist's next album
+            album = albums[artist] = phrase(1, 3)
+        if rng.random() < 0.05:
+            name = rng.choice(_COMMON_TITLES)
+        else:
+            name = phrase(1, 4)
+        if rng.random() < 0.1:
+            name += rng.choice(_TITLE_SUFFIXES)
+        track = {
+            "persistent_id": f"{rng.getrandbits(64):016X}",
+            "name": name,
+            "artist": artist,
+            "album": album,
+            "duration": round(rng.uniform(90, 420), 3),
+            "track_number": rng.randint(1, 14),
+            "disc_number": 2 if rng.random() < 0.1 else 1,
+            "modification_date": base_date + timedelta(seconds=rng.randint(0, 10**8)),
+        }
+        tracks.append(track)
+        if rng.random() < 0.03 and len(tracks) < size:
+            # The same recording again on a compilation
+            tracks.append({
+                **track,
+                "persistent_id": f"{rng.getrandbits(64):016X}",
+                "album": "Greatest Hits",
+                "track_number": rng.randint(1, 20),
+            })
+
+    ids = [track["persistent_id"] for track in tracks]
+    playlists = {
+        f"Playlist {n}": rng.sample(ids, min(playlist_size, len(ids)))
+        for n in range(1, playlist_count + 1)
+    }
+    return tracks, playlists
+
+
+def load_track_records(columns):
+    """Zip property columns into one record dict per track"""
+    keys = list(columns)
+    lengths = {len(columns[key]) for key in keys}
+    if len(lengths) > 1:
+        # The library changed between two column fetches
+        raise RuntimeError("Track property columns have mismatched lengths")
+    return [dict(zip(keys, values)) for values in zip(*(columns[key] for key in keys))]
@@ -0,0 +1,14 @@
+import os
+
+# Local state (library catalog, API caches) lives here; override with
+# MUSIC_ARCHIVER_CACHE_DIR, e.g. to keep separate state per machine
+CACHE_DIR = os.environ.get(
+    "MUSIC_ARCHIVER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "music_archiver"),
+)
+
+
+def cache_path(name):
+    """Return the path of a file in the cache directory, creating the directory"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
@@ -0,0 +1,206 @@
+"""
+Diffing a Spotify playlist against its Apple Music copy by track identity.
+
+Tracks are paired by hashed identity keys rather than by name: the core
+title, primary artist and duration rounded to the second, or the ISRC where
+both sides have one. Each key is a dict probe, so a diff is linear in the
+size of the two playlists, and duplicate titles are paired one to one
+instead of collapsing into a single name.
+
+Pairs already established in an earlier sync (Spotify URI to Apple
+persistent ID) are honoured first, so they skip matching entirely.
+"""
+
+from collections import namedtuple
+
+from matching import artist_similarity, core_title, primary_artist
+
+# Durations this many seconds apart still count as the same recording
+DURATION_TOLERANCE = 1
+
+# Lowest artist_similarity at which tracks of the same title whose artists
+# are credited differently ("The Beatles", "Beatles") are still paired
+ARTIST_MATCH_THRESHOLD = 0.8
+
+PlaylistDiff = namedtuple(
+    "PlaylistDiff", ["matched", "added", "removed", "ambiguous", "similar"]
+)
+PlaylistDiff.__doc__ = """
+Result of diff_playlists.
+
+matched: (spotify track, apple track) pairs present on both sides
+added: Spotify tracks with no Apple counterpart
+removed: Apple tracks with no Spotify counterpart
+ambiguous: (spotify track, [apple candidates]) where several Apple tracks
+    fit equally well; neither side is added or removed
+similar: the pairs of matched that rest only on a similar artist credit,
+    too uncertain to remember as established pairs
+"""
+
+
+def _text(value):
+    # appscript returns k.missing_value for unset properties
+    return value if isinstance(value, str) else ""
+
+
+def _seconds(value):
+    if isinstance(value, (int, float)) and value > 0:
+        return round(value)
+    return None
+
+
+def identity(track):
+    """
+    Return the (core title, primary artist, duration in seconds) of a track.
+
+    The duration is None if the track has none.
+    """
+    return (
+        core_title(_text(track.get("name"))),
+        primary_artist(_text(track.get("artist"))),
+        _seconds(track.get("duration")),
+    )
+
+
+class _AppleSide:
+    """Apple tracks by identity key; each track can be paired once"""
+
+    def __init__(self, tracks):
+        self.keys = [identity(track) for track in tracks]
+        self.unmatched = set(range(len(tracks)))
+        self.by_pid = {}
+        self.by_isrc = {}
+        self.by_key = {}
+        self.by_title_artist = {}
+        self.by_title = {}
+        for position, track in enumerate(tracks):
+            title, artist, seconds = self.keys[position]
+            self.by_pid.setdefault(track.get("persistent_id"), []).append(position)
+            if track.get("isrc"):
+                self.by_isrc.setdefault(track["isrc"], []).append(position)
+            self.by_key.setdefault((title, artist, seconds), []).append(position)
+            self.by_title_artist.setdefault((title, artist), []).append(position)
+            self.by_title.setdefault(title, []).append(position)
+
+    def first(self, bucket, key):
+        """First unpaired track in a bucket, in playlist order"""
+        for position in bucket.get(key, ()):
+            if position in self.unmatched:
+                return position
+        return None
+
+    def all(self, bucket, key):
+        return [p for p in bucket.get(key, ()) if p in self.unmatched]
+
+
+def diff_playlists(spotify_tracks, apple_tracks, known=None):
+    """
+    Pair the tracks of a Spotify playlist with those of an Apple playlist.
+
+    Spotify tracks are dicts with 'uri', 'name', 'artist', 'duration' (in
+    seconds) and optionally 'isrc' (see spotify_source.track_summary);
+    Apple tracks are records with 'persistent_id', 'name', 'artist' and
+    'duration'. Pairing goes from the most to the least certain evidence:
+
+    1. a known URI to persistent ID pair from an earlier sync
+    2. the same ISRC
+    3. the same title, artist and duration
+    4. the same title and artist with a duration within DURATION_TOLERANCE,
+       or with no duration on either side
+    5. if no Apple track has the same title and artist, the same title and
+       a similar artist (ARTIST_MATCH_THRESHOLD), with the duration
+       tolerance of step 4
+
+    A Spotify track with several distinct candidates at step 4 or 5 is
+    ambiguous.
+    Duplicates of one identity (the same song twice on both sides) pair up
+    in playlist order.
+
+    Args:
+        spotify_tracks (list): Tracks of the Spotify playlist
+        apple_tracks (list): Tracks of the Apple Music playlist
+        known (dict): Spotify URI -> Apple persistent ID of established pairs
+
+    Returns:
+        PlaylistDiff
+    """
+    known = known or {}
+    apple = _AppleSide(apple_tracks)
+    pairs = {}
+    similar = set()
+    ambiguous = []
+
+    def pair(spotify_position, apple_position):
+        pairs[spotify_position] = apple_position
+        apple.unmatched.discard(apple_position)
+
+    keys = [identity(track) for track in spotify_tracks]
+    # Each pass only looks at the Spotify tracks earlier passes left unpaired,
+    # so weaker evidence can't take a track a stronger match needs
+    for position, track in enumerate(spotify_tracks):
+        persistent_id = known.get(track["uri"])
+        found = apple.first(apple.by_pid, persistent_id) if persistent_id else None
+        if found is not None:
+            pair(position, found)
+    for position, track in enumerate(spotify_tracks):
+        if position not in pairs and track.get("isrc"):
+            found = apple.first(apple.by_isrc, track["isrc"])
+            if found is not None:
+                pair(position, found)
+    for position, key in enumerate(keys):
+        if position not in pairs and key[2] is not None:
+            found = apple.first(apple.by_key, key)
+            if found is not None:
+                pair(position, found)
+    for position, (title, artist, seconds) in enumerate(keys):
+        if position in pairs:
+            continue
+
+        def close(p):
+            return (
+                seconds is None
+                or apple.keys[p][2] is None
+                or abs(apple.keys[p][2] - seconds) <= DURATION_TOLERANCE
+            )
+
+        same_artist = apple.all(apple.by_title_artist, (title, artist))
+        candidates = [p for p in same_artist if close(p)]
+        loose = not same_artist
+        if loose:
+            # The artist is credited differently on the Apple side; a
+            # same-artist track of another length is a different recording
+            candidates = [
+                p for p in apple.all(apple.by_title, title)
+                if close(p)
+                and artist_similarity(artist, apple.keys[p][1]) >= ARTIST_MATCH_THRESHOLD
+            ]
+        if len({apple.keys[p] for p in candidates}) == 1:
+            pair(position, candidates[0])
+            if loose:
+                similar.add(position)
+        elif candidates:
+            ambiguous.append((position, candidates))
+
+    # Neither side of an ambiguous match is added or removed
+    undecided = {s for s, _ in ambiguous}
+    held = {p for _, candidates in ambiguous for p in candidates}
+    return PlaylistDiff(
+        matched=[
+            (spotify_tracks[s], apple_tracks[a]) for s, a in sorted(pairs.items())
+        ],
+        added=[
+            track for position, track in enumerate(spotify_tracks)
+            if position not in pairs and position not in undecided
+        ],
+        removed=[
+            track for position, track in enumerate(apple_tracks)
+            if position in apple.unmatched and position not in held
+        ],
+        ambiguous=[
+            (spotify_tracks[s], [apple_tracks[p] for p in candidates])
+            for s, candidates in ambiguous
+        ],
+        similar=[
+            (spotify_tracks[s], apple_tracks[pairs[s]]) for s in sorted(similar)
+        ],
+    )
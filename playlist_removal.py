@@ -0,0 +1,108 @@
+"""
+Removing many tracks from an Apple Music playlist at once.
+
+The playlist is read once, every target is resolved to one playlist entry
+in a single pass, and the removals go to the Music app in bulk by
+persistent ID. Removing any number of tracks costs one playlist
+read and one delete per REMOVE_CHUNK_SIZE tracks, and duplicate titles
+can't remove the wrong track. A track the playlist holds more than once,
+with only some of its entries targeted, is removed entry by entry instead,
+since deleting by persistent ID would take every copy.
+"""
+
+from collections import Counter
+
+from matching import normalize_string
+from music_backend import load_track_records
+
+
+def read_playlist(backend, playlist_name, properties=("persistent_id", "name")):
+    """Read a playlist once, as records with the given properties"""
+    return load_track_records(backend.get_playlist_track_columns(playlist_name, properties))
+
+
+def claim_entries(targets, snapshot):
+    """
+    Match removal targets to playlist entries.
+
+    Args:
+        targets (list): Track names, or records with a 'persistent_id'
+        snapshot (list): Playlist records with 'persistent_id' and 'name'
+
+    Returns:
+        list: The snapshot position of the entry for each target, or None
+        if it isn't in the playlist. Each playlist entry is used for one
+        target at most, names matching case-insensitively before matching
+        after normalization.
+    """
+    # Unclaimed entries by persistent ID, by lowercased and by normalized name
+    by_id, by_lower, by_norm = {}, {}, {}
+    for position, track in enumerate(snapshot):
+        by_id.setdefault(track["persistent_id"], []).append(position)
+        name = track["name"] if isinstance(track["name"], str) else ""
+        by_lower.setdefault(name.lower(), []).append(position)
+        by_norm.setdefault(normalize_string(name), []).append(position)
+
+    claimed = set()
+
+    def claim(bucket, key):
+        for position in bucket.get(key, ()):
+            if position not in claimed:
+                claimed.add(position)
+                return position
+        return None
+
+    positions = []
+    for target in targets:
+        if isinstance(target, dict):
+            position = claim(by_id, target["persistent_id"])
+        else:
+            position = claim(by_lower, target.lower())
+            if position is None:
+                position = claim(by_norm, normalize_string(target))
+        positions.append(position)
+    return positions
+
+
+def remove_playlist_tracks(backend, playlist_name, targets, snapshot=None):
+    """
+    Remove tracks from a playlist in bulk.
+
+    Args:
+        backend: Music backend
+        playlist_name (str): Playlist to remove the tracks from
+        targets (list): Track names, or records with a 'persistent_id'
+        snapshot (list): Records already read with read_playlist(); read
+            here if not given
+
+    Returns:
+        list: (True if removed, message) for each target, in order
+    """
+    if snapshot is None:
+        snapshot = read_playlist(backend, playlist_name)
+    positions = claim_entries(targets, snapshot)
+    entries = Counter(track["persistent_id"] for track in snapshot)
+    claimed = Counter(
+        snapshot[position]["persistent_id"] for position in positions if position is not None
+    )
+    # Tracks removed entirely go by persistent ID; partly removed duplicates
+    # by playlist index, before the bulk delete shifts the indexes
+    partial = {pid for pid, count in claimed.items() if count < entries[pid]}
+    entry_errors = backend.remove_playlist_entries(playlist_name, [
+        (position + 1, snapshot[position]["persistent_id"])
+        for position in positions
+        if position is not None and snapshot[position]["persistent_id"] in partial
+    ]) if partial else {}
+    errors = backend.remove_playlist_tracks(
+        playlist_name, [pid for pid in claimed if pid not in partial]
+    ) if len(claimed) > len(partial) else {}
+
+    results = []
+    for position in positions:
+        if position is None:
+            results.append((False, "not in the playlist"))
+            continue
+        pid = snapshot[position]["persistent_id"]
+        error = entry_errors.get(position + 1) if pid in partial else errors.get(pid)
+        results.append((False, error) if error else (True, "removed"))
+    return results
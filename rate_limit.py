@@ -0,0 +1,179 @@
+"""
+Pacing requests to a rate-limited API.
+
+Spotify answers too many requests with HTTP 429 and a Retry-After header.
+AdaptiveLimiter keeps a client under that limit three ways: a token bucket
+caps the request rate, a Retry-After pauses every request (not just the one
+that got the 429) until it has passed, and the number of requests in flight
+grows by one while responses come back clean and halves when the API
+throttles (additive increase, multiplicative decrease).
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Sustained requests per second and how many may go out back to back
+REQUEST_RATE = 20.0
+BURST = 10
+
+# Requests in flight at the start, and the most ever allowed
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+
+# Pause after a 429 without a usable Retry-After header, in seconds
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def retry_after_seconds(value, now=None):
+    """
+    Parse a Retry-After header: a number of seconds or an HTTP date.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """Hands out rate tokens per second, up to burst at once"""
+
+    def __init__(self, rate=REQUEST_RATE, burst=BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token, possibly one that hasn't been earned yet.
+
+        Returns:
+            float: Seconds until the token is earned and may be used
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self):
+        """Wait for a token; returns the seconds waited"""
+        delay = self.reserve()
+        if delay:
+            self.sleep(delay)
+        return delay
+
+
+class AdaptiveLimiter:
+    """
+    Gate for outgoing requests: call acquire() before sending one and
+    release() with its status once the response is in.
+    """
+
+    def __init__(
+        self,
+        rate=REQUEST_RATE,
+        burst=BURST,
+        initial=INITIAL_CONCURRENCY,
+        maximum=MAX_CONCURRENCY,
+        clock=time.monotonic,
+    ):
+        self.bucket = TokenBucket(rate, burst, clock=clock)
+        self.clock = clock
+        self.limit = initial
+        self.maximum = maximum
+        self.in_flight = 0
+        # No request goes out before this time (set by Retry-After)
+        self.resume_at = 0.0
+        self._clean = 0
+        self._cond = threading.Condition()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._cond:
+            self.requests = 0
+            self.throttled = 0
+            self.wait_seconds = 0.0
+            self.first_request = None
+            self.last_response = None
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        start = self.clock()
+        with self._cond:
+            while True:
+                now = self.clock()
+                if now < self.resume_at:
+                    self._cond.wait(self.resume_at - now)
+                elif self.in_flight < self.limit:
+                    self.in_flight += 1
+                    break
+                else:
+                    self._cond.wait()
+        self.bucket.acquire()
+        with self._cond:
+            now = self.clock()
+            self.wait_seconds += now - start
+            if self.first_request is None:
+                self.first_request = now
+
+    def release(self, status, retry_after=None):
+        """
+        Record the outcome of a request sent after acquire().
+
+        Args:
+            status (int): HTTP status, or None if the request failed
+                without a response
+            retry_after (float): Seconds the server asked to wait, if any
+        """
+        with self._cond:
+            now = self.clock()
+            self.in_flight -= 1
+            self.requests += 1
+            self.last_response = now
+            if status == 429:
+                self.throttled += 1
+                # Requests already in flight may be throttled too; the
+                # limit is only cut once per pause
+                if now >= self.resume_at:
+                    self.limit = max(1, self.limit // 2)
+                pause = DEFAULT_RETRY_AFTER if retry_after is None else retry_after
+                self.resume_at = max(self.resume_at, now + pause)
+                self._clean = 0
+            elif status is not None and status < 500:
+                self._clean += 1
+                if self._clean >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._clean = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return request and throttle counts, time spent waiting and throughput"""
+        with self._cond:
+            elapsed = (
+                self.last_response - self.first_request
+                if self.first_request is not None and self.last_response is not None
+                else 0.0
+            )
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "wait_seconds": self.wait_seconds,
+                "concurrency": self.limit,
+                "requests_per_second": self.requests / elapsed if elapsed > 0 else 0.0,
+            }
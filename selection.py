@@ -0,0 +1,58 @@
+"""
+Parsing the track selections typed at the sync prompts ("1-3,5").
+
+Kept apart from update_playlist so it can be used and benchmarked without
+loading the sync stack.
+"""
+
+from console import Fore
+
+
+def parse_selection(selection_str, max_value):
+    """
+    Parse user selection string with support for ranges and comma-separated values.
+    Returns a sorted list of unique selected indices.
+
+    Examples:
+    - "1,3,5" returns [1, 3, 5]
+    - "1-3,5" returns [1, 2, 3, 5]
+    """
+    selected = set()
+
+    # Split by comma
+    parts = selection_str.split(",")
+
+    for part in parts:
+        part = part.strip()
+
+        # Handle range (e.g., "1-3")
+        if "-" in part:
+            try:
+                start, end = map(int, part.split("-"))
+                if 1 <= start <= end <= max_value:
+                    selected.update(range(start, end + 1))
+                else:
+                    print(
+                        Fore.RED
+                        + f"Range {start}-{end} is out of bounds. Please use numbers between 1 and {max_value}."
+                    )
+            except ValueError:
+                print(
+                    Fore.RED + f"Invalid range format: {part}. Use 'start-end' format."
+                )
+
+            # Handle individual number
+        else:
+            try:
+                num = int(part)
+                if 1 <= num <= max_value:
+                    selected.add(num)
+                else:
+                    print(
+                        Fore.RED
+                        + f"Number {num} is out of bounds. Please use numbers between 1 and {max_value}."
+                    )
+            except ValueError:
+                print(Fore.RED + f"Invalid number: {part}")
+
+    return sorted(list(selected))
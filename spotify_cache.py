@@ -0,0 +1,195 @@
+"""
+On-disk caches of Spotify data.
+
+Playlist items are keyed by playlist and snapshot_id: Spotify changes a
+playlist's snapshot_id whenever its contents change, so a cached copy fetched
+under the same snapshot_id is still current. The user's playlist listing has
+no such marker and is kept for LISTING_TTL seconds.
+
+Usage:
+    python spotify_cache.py stats
+    python spotify_cache.py clear [playlist_uri]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from paths import cache_path
+
+CACHE_SUBDIR = "spotify_playlists"
+LISTING_FILE = "spotify_playlist_listing.json"
+
+# Seconds a cached playlist listing is used before it is fetched again
+LISTING_TTL = int(os.environ.get("MUSIC_ARCHIVER_LISTING_TTL", 3600))
+
+
+def _write_json(path, data):
+    # Write to a temporary file first so a crash can't leave half an entry
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class PlaylistTrackCache:
+    """Playlist items stored as one JSON file per playlist"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or cache_path(CACHE_SUBDIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, playlist_id):
+        digest = hashlib.sha1(playlist_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, playlist_id, snapshot_id, fields):
+        """
+        Return the cached items for a playlist snapshot, or None on a miss.
+
+        Entries fetched with a different field selection count as misses, so
+        a change to the requested fields can't serve items missing data.
+        """
+        try:
+            with open(self._path(playlist_id), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if (
+            entry
+            and entry.get("snapshot_id") == snapshot_id
+            and entry.get("fields") == fields
+        ):
+            self.hits += 1
+            return entry["items"]
+        self.misses += 1
+        return None
+
+    def put(self, playlist_id, snapshot_id, fields, items):
+        entry = {
+            "playlist_id": playlist_id,
+            "snapshot_id": snapshot_id,
+            "fields": fields,
+            "items": items,
+        }
+        _write_json(self._path(playlist_id), entry)
+
+    def invalidate(self, playlist_id=None):
+        """
+        Drop the cached items of one playlist, or of every playlist.
+
+        Returns:
+            int: Number of entries removed
+        """
+        if playlist_id is not None:
+            paths = [self._path(playlist_id)]
+        else:
+            paths = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".json")
+            ]
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def stats(self):
+        """Return hit/miss counters for this process plus what is on disk"""
+        files = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(files),
+            "bytes": sum(os.path.getsize(path) for path in files),
+        }
+
+
+class PlaylistListingCache:
+    """The user's playlist listing, kept in memory and on disk for ttl seconds"""
+
+    def __init__(self, path=None, ttl=LISTING_TTL):
+        self.path = path or cache_path(LISTING_FILE)
+        self.ttl = ttl
+        self._entry = None
+
+    def _load(self):
+        if self._entry is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return self._entry
+
+    def age(self):
+        """Seconds since the listing was fetched, or None if nothing is cached"""
+        entry = self._load()
+        return time.time() - entry["fetched_at"] if entry else None
+
+    def get(self):
+        """Return the cached playlists, or None if missing or older than the TTL"""
+        age = self.age()
+        if age is None or age > self.ttl:
+            return None
+        return self._entry["playlists"]
+
+    def put(self, playlists):
+        self._entry = {"fetched_at": time.time(), "playlists": playlists}
+        _write_json(self.path, self._entry)
+
+    def invalidate(self):
+        """Drop the cached listing; returns True if there was one"""
+        self._entry = None
+        try:
+            os.remove(self.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the Spotify playlist cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="show cached playlists and their size on disk")
+    clear = subparsers.add_parser(
+        "clear", help="drop cached playlist items and the playlist listing"
+    )
+    clear.add_argument("playlist", nargs="?", help="playlist URI to drop (default: all)")
+    args = parser.parse_args(argv)
+
+    cache = PlaylistTrackCache()
+    listing = PlaylistListingCache()
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"{stats['entries']} cached playlists, {stats['bytes'] / 1024:.1f} KiB")
+        age = listing.age()
+        if age is None:
+            print("No cached playlist listing")
+        else:
+            state = "fresh" if age <= listing.ttl else "stale"
+            print(f"Playlist listing fetched {age / 60:.0f} minutes ago ({state})")
+    else:
+        removed = cache.invalidate(args.playlist)
+        print(f"Removed {removed} cached playlist{'s' if removed != 1 else ''}")
+        if args.playlist is None and listing.invalidate():
+            print("Removed cached playlist listing")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+One Spotify client per process.
+
+The client shares a pooled requests.Session, so API calls reuse kept-alive
+connections instead of opening a new TLS connection per client. The OAuth
+token is held in memory (and still written to spotipy's cache file) and is
+refreshed shortly before it expires rather than after a call has failed.
+Every request goes through an AdaptiveLimiter, which paces requests, waits
+out 429 responses for as long as Retry-After asks, and adapts how many
+requests are in flight.
+"""
+
+import threading
+import time
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheFileHandler, CacheHandler
+from spotipy.oauth2 import SpotifyOAuth
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from rate_limit import MAX_CONCURRENCY, AdaptiveLimiter, retry_after_seconds
+
+SCOPE = "playlist-modify-public playlist-modify-private playlist-read-private"
+
+# Refresh the access token when it has less than this many seconds left
+TOKEN_REFRESH_MARGIN = 300
+
+# Times a throttled request is sent again before its 429 is returned
+MAX_THROTTLE_RETRIES = 5
+
+
+class ConnectionStats:
+    """Thread-safe counters of HTTP requests sent and connections opened"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def count_request(self, response, *args, **kwargs):
+        with self._lock:
+            self.requests += 1
+
+    def snapshot(self):
+        """Return the counters without zeroing them"""
+        with self._lock:
+            return {"connections": self.connections, "requests": self.requests}
+
+    def reset(self):
+        """Zero the counters and return what they held"""
+        with self._lock:
+            counts = {"connections": self.connections, "requests": self.requests}
+            self.connections = 0
+            self.requests = 0
+        return counts
+
+
+def _counting_pool(pool_class, stats):
+    class CountingConnectionPool(pool_class):
+        def _new_conn(self):
+            stats.count_connection()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report every new connection"""
+
+    def __init__(self, stats, **kwargs):
+        # HTTPAdapter.__init__ builds the pool manager, which needs stats
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+
+class RateLimitedHTTPAdapter(CountingHTTPAdapter):
+    """CountingHTTPAdapter that sends every request through an AdaptiveLimiter"""
+
+    def __init__(self, stats, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(stats, **kwargs)
+
+    def send(self, request, **kwargs):
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                response = super().send(request, **kwargs)
+            except Exception:
+                self.limiter.release(None)
+                raise
+            self.limiter.release(
+                response.status_code, retry_after_seconds(response.headers.get("Retry-After"))
+            )
+            if response.status_code != 429 or attempt == MAX_THROTTLE_RETRIES:
+                return response
+            # The limiter holds this and every other request until the
+            # Retry-After has passed
+            response.close()
+
+
+class MemoryTokenCache(CacheHandler):
+    """Keeps the token in memory so API calls don't re-read the cache file"""
+
+    def __init__(self, file_cache=None):
+        self.file_cache = file_cache or CacheFileHandler()
+        self.token_info = None
+
+    def get_cached_token(self):
+        if self.token_info is None:
+            self.token_info = self.file_cache.get_cached_token()
+        return self.token_info
+
+    def save_token_to_cache(self, token_info):
+        self.token_info = token_info
+        self.file_cache.save_token_to_cache(token_info)
+
+
+def build_http_session(stats, limiter=None, pool_size=MAX_CONCURRENCY):
+    """
+    Return a keep-alive requests.Session with the retry policy spotipy uses.
+
+    Server errors are retried by urllib3; 429 responses are left to the
+    limiter, which pauses every request for the Retry-After instead of
+    only the one that was throttled.
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        # urllib3 would otherwise retry a 429 itself, on this thread only
+        respect_retry_after_header=False,
+    )
+    # Enough pooled connections for every request the limiter lets through
+    # at once to keep its own
+    adapter = RateLimitedHTTPAdapter(
+        stats, limiter or AdaptiveLimiter(), pool_maxsize=pool_size, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(stats.count_request)
+    return session
+
+
+class SpotifySession:
+    """A Spotify client, its HTTP session and OAuth manager, shared per process"""
+
+    def __init__(self, auth_manager=None, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.stats = ConnectionStats()
+        self.limiter = AdaptiveLimiter()
+        self.http = build_http_session(self.stats, self.limiter)
+        self.auth_manager = auth_manager or SpotifyOAuth(
+            scope=SCOPE,
+            cache_handler=MemoryTokenCache(),
+            requests_session=self.http,
+        )
+        self.refresh_margin = refresh_margin
+        self.client = spotipy.Spotify(
+            auth_manager=self.auth_manager, requests_session=self.http
+        )
+        self._lock = threading.Lock()
+
+    def ensure_fresh_token(self):
+        """Refresh the access token if it expires within the refresh margin"""
+        with self._lock:
+            token_info = self.auth_manager.cache_handler.get_cached_token()
+            if token_info is None:
+                # No token yet; spotipy runs the authorization flow on first call
+                return
+            if token_info["expires_at"] - time.time() < self.refresh_margin:
+                self.auth_manager.refresh_access_token(token_info["refresh_token"])
+
+    def get_client(self):
+        """Return the shared client with a token that is good for a while"""
+        self.ensure_fresh_token()
+        return self.client
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_spotify_session():
+    """Return the process-wide SpotifySession, creating it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = SpotifySession()
+    return _session
+
+
+def set_spotify_session(session):
+    """
+    Replace the process-wide session, e.g. with a FakeSpotifySession.
+
+    Returns:
+        The session it replaced, or None
+    """
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+    return previous
+
+
+class FakeSpotifySession:
+    """Session serving a FakeSpotifyClient without authentication or HTTP"""
+
+    def __init__(self, client):
+        self.client = client
+        self.stats = ConnectionStats()
+        self.limiter = AdaptiveLimiter()
+
+    def get_client(self):
+        return self.client
@@ -0,0 +1,196 @@
+"""
+Fetching playlist data from the Spotify Web API.
+
+Only the fields the sync needs are requested, and once the first page has
+reported the total, the remaining pages are fetched concurrently. With a
+PlaylistTrackCache, playlists whose snapshot_id hasn't changed are served
+from disk after a single metadata call; the user's playlist listing is kept
+in a PlaylistListingCache for a while.
+"""
+
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Largest pages the playlist items and playlist listing endpoints return
+PAGE_SIZE = 100
+PLAYLIST_PAGE_SIZE = 50
+MAX_PAGE_WORKERS = 8
+
+# Skip album art, markets and the other parts of the full track object; the
+# artists, duration and ISRC identify the track when diffing playlists
+TRACK_FIELDS = "total,items(track(name,uri,duration_ms,artists(name),external_ids(isrc)))"
+
+
+def fetch_pages(fetch_page, page_size, max_workers=MAX_PAGE_WORKERS):
+    """
+    Fetch every page of a paged endpoint.
+
+    Args:
+        fetch_page: Called with an offset, returns a page with 'total' and 'items'
+        page_size (int): Items per page
+        max_workers (int): Upper bound on pages fetched at the same time
+
+    Returns:
+        list: Items of all pages, in order
+    """
+    first_page = fetch_page(0)
+    pages = [first_page]
+    offsets = range(page_size, first_page["total"], page_size)
+    if offsets:
+        workers = max(1, min(max_workers, len(offsets)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields results in offset order, whatever order they finish in
+            pages.extend(pool.map(fetch_page, offsets))
+    return [item for page in pages for item in page["items"]]
+
+
+def fetch_playlist_tracks(sp, playlist_id, max_workers=MAX_PAGE_WORKERS):
+    """
+    Fetch every item of a Spotify playlist.
+
+    Args:
+        sp: spotipy.Spotify client (or anything with the same playlist_items call)
+        playlist_id (str): Playlist ID, URI or URL
+        max_workers (int): Upper bound on pages fetched at the same time
+
+    Returns:
+        list: Playlist items in playlist order, each with a 'track' dict
+    """
+
+    def fetch_page(offset):
+        return sp.playlist_items(
+            playlist_id, fields=TRACK_FIELDS, limit=PAGE_SIZE, offset=offset
+        )
+
+    items = fetch_pages(fetch_page, PAGE_SIZE, max_workers)
+    # Tracks that are no longer available come back with track set to null
+    return [item for item in items if item.get("track")]
+
+
+def fetch_playlist_tracks_cached(sp, playlist_id, cache, max_workers=MAX_PAGE_WORKERS):
+    """
+    Fetch playlist items, reusing the cached copy if the playlist is unchanged.
+
+    Returns:
+        tuple: (items, True if they came from the cache)
+    """
+    snapshot_id = sp.playlist(playlist_id, fields="snapshot_id")["snapshot_id"]
+    items = cache.get(playlist_id, snapshot_id, TRACK_FIELDS)
+    if items is not None:
+        return items, True
+
+    items = fetch_playlist_tracks(sp, playlist_id, max_workers=max_workers)
+    cache.put(playlist_id, snapshot_id, TRACK_FIELDS, items)
+    return items, False
+
+
+def track_summary(track):
+    """
+    Flatten a Spotify track object fetched with TRACK_FIELDS.
+
+    Returns:
+        dict: 'uri', 'name', 'artist' (all artists, comma separated),
+        'duration' in seconds (None if unknown) and 'isrc' (None if unknown)
+    """
+    duration_ms = track.get("duration_ms")
+    return {
+        "uri": track["uri"],
+        "name": track["name"],
+        "artist": ", ".join(artist["name"] for artist in track.get("artists") or ()),
+        "duration": duration_ms / 1000 if duration_ms else None,
+        "isrc": (track.get("external_ids") or {}).get("isrc"),
+    }
+
+
+def fetch_user_playlists(sp, max_workers=MAX_PAGE_WORKERS):
+    """
+    Fetch every playlist the current user owns or follows.
+
+    Returns:
+        list: Dicts with the 'name', 'uri' and 'snapshot_id' of each playlist
+    """
+
+    def fetch_page(offset):
+        return sp.current_user_playlists(limit=PLAYLIST_PAGE_SIZE, offset=offset)
+
+    return [
+        {
+            "name": playlist["name"],
+            "uri": playlist["uri"],
+            "snapshot_id": playlist.get("snapshot_id"),
+        }
+        for playlist in fetch_pages(fetch_page, PLAYLIST_PAGE_SIZE, max_workers)
+        if playlist
+    ]
+
+
+def fetch_user_playlists_cached(sp, cache, refresh=False, max_workers=MAX_PAGE_WORKERS):
+    """
+    Return the user's playlists from the listing cache, fetching them if stale.
+
+    Returns:
+        tuple: (playlists, True if they came from the cache)
+    """
+    if not refresh:
+        playlists = cache.get()
+        if playlists is not None:
+            return playlists, True
+
+    playlists = fetch_user_playlists(sp, max_workers=max_workers)
+    cache.put(playlists)
+    return playlists, False
+
+
+class FakeSpotifyClient:
+    """
+    In-process stand-in for the spotipy.Spotify calls used here.
+
+    playlists maps a playlist URI to {'name': str, 'tracks': [track
+    objects]}; track objects are shaped like the TRACK_FIELDS response.
+    calls counts the API calls of each method.
+    """
+
+    def __init__(self, playlists=None):
+        self.playlists = playlists or {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def playlist(self, playlist_id, fields=None):
+        self._count("playlist")
+        tracks = self.playlists[playlist_id]["tracks"]
+        # Any edit of the fake playlist changes its length or its last track
+        last = tracks[-1]["uri"] if tracks else ""
+        return {"snapshot_id": f"{len(tracks)}:{last}"}
+
+    def playlist_items(self, playlist_id, fields=None, limit=PAGE_SIZE, offset=0):
+        self._count("playlist_items")
+        tracks = self.playlists[playlist_id]["tracks"]
+        return {
+            "total": len(tracks),
+            "items": [{"track": track} for track in tracks[offset:offset + limit]],
+        }
+
+    def current_user_playlists(self, limit=PLAYLIST_PAGE_SIZE, offset=0):
+        self._count("current_user_playlists")
+        listing = [
+            {"name": playlist["name"], "uri": uri, "snapshot_id": None}
+            for uri, playlist in self.playlists.items()
+        ]
+        return {"total": len(listing), "items": listing[offset:offset + limit]}
+
+
+def spotify_track(record, uri=None):
+    """Return a Spotify track object for a library record, e.g. for FakeSpotifyClient"""
+    duration = record.get("duration")
+    return {
+        "name": record["name"],
+        "uri": uri or f"spotify:track:{record['persistent_id']}",
+        "duration_ms": int(duration * 1000) if duration else None,
+        "artists": [{"name": name.strip()} for name in record["artist"].split(",")],
+        "external_ids": {},
+    }
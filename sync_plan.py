@@ -0,0 +1,555 @@
+"""
+Unattended playlist sync through a JSON plan file.
+
+`plan` does the expensive part of a sync without changing anything: it loads
+each selected playlist pair and the library, pairs their tracks and searches
+the library and Music folder for the songs the Apple playlist lacks. What it
+would change is written to a plan file. `apply` carries a plan out with a
+handful of Apple Events per playlist; it checks each playlist and the
+library first, so applying the same plan twice changes nothing the second
+time. `run` plans and applies in one go: playlists are planned several at a
+time against one library snapshot, and each is applied by a single writer
+as soon as its plan is ready (see sync_scheduler). Both end with a summary
+table per playlist, which `show` prints for a saved plan without touching
+either service.
+
+Options come from flags or a JSON config file with the same names
+({"playlists": [...], "removal_policy": "playlist", ...}); flags win.
+
+Usage:
+    python3 sync_plan.py plan [--playlist NAME]... [--config FILE]
+        [--removal-policy keep|playlist|library] [--auto-add-threshold SCORE]
+        [--output PLAN] [--workers N]
+    python3 sync_plan.py apply PLAN [--dry-run]
+    python3 sync_plan.py show PLAN
+    python3 sync_plan.py run [plan options] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from console import Fore
+
+# The sync stack (update_playlist and the modules below it) is imported in
+# the functions that plan or apply, so `show` starts without it
+
+PLAN_VERSION = 1
+PLAN_FILE = "sync_plan.json"
+
+# keep: leave tracks removed from Spotify alone
+# playlist: remove them from the Apple playlist
+# library: also delete them from the library when exactly one library
+#     track matches; ties are left for review
+REMOVAL_POLICIES = ("keep", "playlist", "library")
+
+DEFAULT_OPTIONS = {
+    "playlists": [],
+    "removal_policy": "keep",
+    # Library matches below this score are planned as skipped; exact and
+    # previously confirmed matches score 1.0. Music-folder files are always
+    # skipped, since importing one is never undone by a later sync
+    "auto_add_threshold": 1.0,
+    "dry_run": False,
+}
+
+
+def load_options(config_path=None, **overrides):
+    """
+    Merge DEFAULT_OPTIONS, a JSON config file and explicit overrides.
+
+    Overrides that are None are ignored, so unset flags don't mask the
+    config file.
+    """
+    options = dict(DEFAULT_OPTIONS)
+    if config_path:
+        with open(config_path, encoding="utf-8") as f:
+            config = json.load(f)
+        unknown = set(config) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options in {config_path}: {', '.join(sorted(unknown))}")
+        options.update(config)
+    options.update((key, value) for key, value in overrides.items() if value is not None)
+    if options["removal_policy"] not in REMOVAL_POLICIES:
+        raise ValueError(f"Unknown removal policy: {options['removal_policy']}")
+    return options
+
+
+def _summary(track):
+    return {"name": track["name"], "artist": track["artist"]}
+
+
+def plan_playlist(name, spotify_uri, options, timer):
+    """Return the plan entry of one playlist pair; nothing is changed"""
+    import update_playlist
+    from library_index import LIBRARY_PROPERTIES
+    from playlist_removal import read_playlist
+
+    diff, known_matches = update_playlist.load_playlist_diff(name, spotify_uri, timer)
+    found, missing = update_playlist.locate_tracks(diff.added, known_matches, timer)
+
+    entry = {
+        "name": name,
+        "spotify_uri": spotify_uri,
+        "add": [],
+        "skipped": [],
+        "remove": [],
+        "delete_from_library": [],
+        "needs_review": [],
+        "ambiguous": [
+            {
+                "spotify_uri": track["uri"],
+                **_summary(track),
+                "candidates": [candidate["persistent_id"] for candidate in candidates],
+            }
+            for track, candidates in diff.ambiguous
+        ],
+    }
+    for track, ref, score in found.values():
+        item = {
+            "spotify_uri": track["uri"],
+            **_summary(track),
+            "duration": track["duration"],
+            "track": ref,
+            "score": score,
+        }
+        if os.path.isabs(ref):
+            # A file name scoring 1.0 still only says its words match
+            entry["skipped"].append({**item, "reason": "Music folder file, needs review"})
+        elif score >= options["auto_add_threshold"]:
+            entry["add"].append(item)
+        else:
+            entry["skipped"].append({**item, "reason": "below the auto-add threshold"})
+    for track in missing.values():
+        entry["skipped"].append(
+            {"spotify_uri": track["uri"], **_summary(track), "reason": "not found"}
+        )
+
+    policy = options["removal_policy"]
+    if policy == "keep" or not diff.removed:
+        return entry
+    entry["remove"] = [
+        {"persistent_id": track["persistent_id"], **_summary(track)} for track in diff.removed
+    ]
+    if policy != "library":
+        return entry
+
+    with timer.stage("library matches"):
+        # The playlist copies carry the album and numbering the scoring needs
+        snapshot = read_playlist(
+            update_playlist.get_music_backend(), name, ("persistent_id",) + LIBRARY_PROPERTIES
+        )
+        by_id = {track["persistent_id"]: track for track in snapshot}
+        playlist_tracks = [by_id[t["persistent_id"]] for t in diff.removed if t["persistent_id"] in by_id]
+        matches = update_playlist.find_library_matches(playlist_tracks)
+        for playlist_track, library_matches in zip(playlist_tracks, matches):
+            library_matches = update_playlist.narrow_library_matches(playlist_track, library_matches)
+            if len(library_matches) == 1:
+                match = library_matches[0]
+                entry["delete_from_library"].append(
+                    {"persistent_id": match["persistent_id"], **_summary(match), "score": match["score"]}
+                )
+            elif library_matches:
+                entry["needs_review"].append({
+                    "persistent_id": playlist_track["persistent_id"],
+                    **_summary(playlist_track),
+                    "candidates": [match["persistent_id"] for match in library_matches],
+                })
+    return entry
+
+
+def new_plan(options):
+    return {
+        "version": PLAN_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "options": {key: options[key] for key in ("removal_policy", "auto_add_threshold")},
+        "playlists": [],
+    }
+
+
+def sync_playlists(
+    options,
+    timer,
+    apply=False,
+    dry_run=False,
+    workers=None,
+    refresh_playlists=False,
+    backend=None,
+):
+    """
+    Plan, and optionally apply, the configured playlists, or every playlist
+    found in both services if none are configured.
+
+    The library snapshot is loaded once for all of them. Playlists are
+    planned `workers` at a time (default: sync_scheduler.PLAN_WORKERS)
+    and applied one at a time on a single writer thread as their plans
+    complete, see sync_scheduler.
+
+    Returns:
+        tuple: (plan, {playlist name: ScheduledRun})
+    """
+    import update_playlist
+    from sync_scheduler import PLAN_WORKERS, schedule
+    from timing import StageTimer, run_concurrently
+
+    # Connect before the listing and the snapshot both need the connection
+    backend = backend or update_playlist.get_music_backend()
+    listings = run_concurrently(timer, {
+        "playlist listings": lambda: update_playlist.get_matching_playlists(
+            refresh=refresh_playlists, timer=timer
+        ),
+        "library snapshot": update_playlist.get_library_index,
+    })
+    matching = listings["playlist listings"]
+    library = listings["library snapshot"]
+    # Shared state the planning threads would otherwise race to create
+    update_playlist.get_spotify_track_cache()
+    update_playlist.get_match_cache()
+    if os.path.isdir(update_playlist.MUSIC_DIR):
+        with timer.stage("media index"):
+            update_playlist.get_media_index()
+    if options["removal_policy"] == "library":
+        with timer.stage("library columns"):
+            update_playlist.get_library_columns()
+    library_ids = {record["persistent_id"] for record in library}
+
+    names = options["playlists"] or sorted(matching)
+    for name in names:
+        if name not in matching:
+            print(Fore.RED + f"Playlist '{name}' is not in both Spotify and Apple Music" + Fore.RESET)
+
+    def plan_one(name):
+        print(Fore.CYAN + f"\nPlanning '{name}'" + Fore.RESET)
+        return plan_playlist(name, matching[name], options, StageTimer())
+
+    def apply_one(name, entry):
+        return apply_playlist(backend, entry, library_ids, dry_run=dry_run)
+
+    with timer.stage("plan and apply" if apply else "plan"):
+        runs = schedule(
+            [name for name in names if name in matching],
+            plan_one,
+            apply_one if apply else None,
+            workers=workers or PLAN_WORKERS,
+        )
+
+    plan = new_plan(options)
+    for name in names:
+        if name not in matching:
+            plan["playlists"].append({"name": name, "error": "not in both services"})
+        elif runs[name].plan is not None:
+            plan["playlists"].append(runs[name].plan)
+        else:
+            plan["playlists"].append({"name": name, "error": runs[name].error})
+    return plan, runs
+
+
+def save_plan(plan, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+
+
+def load_plan(path):
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version in {path}: {plan.get('version')}")
+    return plan
+
+
+def pending_adds(adds, playlist_tracks):
+    """
+    Return the planned additions that aren't in the playlist yet.
+
+    Additions are paired with the playlist like a Spotify playlist would be
+    (see playlist_diff), their planned library track standing in as a known
+    match, so a song added by an earlier apply isn't added again.
+    """
+    from playlist_diff import diff_playlists
+
+    known = {add["spotify_uri"]: add["track"] for add in adds}
+    tracks = [{"uri": add["spotify_uri"], **add} for add in adds]
+    added = {id(track) for track in diff_playlists(tracks, playlist_tracks, known).added}
+    return [add for add, track in zip(adds, tracks) if id(track) in added]
+
+
+def apply_playlist(backend, entry, library_ids, dry_run=False):
+    """
+    Apply one playlist's plan entry.
+
+    Args:
+        backend: Music backend
+        entry (dict): Playlist entry of a plan
+        library_ids (set): Persistent IDs of the library tracks; deletions
+            are removed from it
+        dry_run (bool): Report what would change without changing it
+
+    Returns:
+        list: (action, item name, outcome) where outcome is "done",
+        "already done", "would do" or an error message
+    """
+    import update_playlist
+    from playlist_removal import read_playlist, remove_playlist_tracks
+
+    name = entry["name"]
+    results = []
+    snapshot = read_playlist(backend, name, ("persistent_id", "name", "artist", "duration"))
+
+    adds = pending_adds(entry["add"], snapshot)
+    pending = {id(add) for add in adds}
+    results.extend(
+        ("add", f"{add['name']} - {add['artist']}", "already done")
+        for add in entry["add"] if id(add) not in pending
+    )
+    # Library tracks deleted since the plan was made, e.g. by an earlier
+    # playlist of the same run; media files are given by absolute path
+    gone = [
+        add for add in adds
+        if not os.path.isabs(add["track"]) and add["track"] not in library_ids
+    ]
+    results.extend(
+        ("add", f"{add['name']} - {add['artist']}", "library track is gone") for add in gone
+    )
+    gone = {id(add) for add in gone}
+    adds = [add for add in adds if id(add) not in gone]
+    if adds and dry_run:
+        results.extend(("add", f"{add['name']} - {add['artist']}", "would do") for add in adds)
+    elif adds:
+        outcomes = backend.add_playlist_tracks(name, [add["track"] for add in adds])
+        confirmed = []
+        for add in adds:
+            success, error = outcomes.get(add["track"], (False, "no result"))
+            results.append(("add", f"{add['name']} - {add['artist']}", "done" if success else error))
+            if success and add["track"] in library_ids:
+                confirmed.append((add["spotify_uri"], add["track"], add["score"]))
+        update_playlist.get_match_cache().put_many(confirmed)
+
+    present = {track["persistent_id"] for track in snapshot}
+    removes = [item for item in entry["remove"] if item["persistent_id"] in present]
+    results.extend(
+        ("remove", f"{item['name']} - {item['artist']}", "already done")
+        for item in entry["remove"] if item["persistent_id"] not in present
+    )
+    if removes and dry_run:
+        results.extend(("remove", f"{item['name']} - {item['artist']}", "would do") for item in removes)
+    elif removes:
+        outcomes = remove_playlist_tracks(backend, name, removes, snapshot=snapshot)
+        results.extend(
+            ("remove", f"{item['name']} - {item['artist']}", "done" if success else message)
+            for item, (success, message) in zip(removes, outcomes)
+        )
+
+    for item in entry["delete_from_library"]:
+        label = f"{item['name']} - {item['artist']}"
+        pid = item["persistent_id"]
+        if pid not in library_ids:
+            results.append(("delete", label, "already done"))
+        elif dry_run:
+            results.append(("delete", label, "would do"))
+        else:
+            try:
+                backend.delete_track(pid)
+            except Exception as e:
+                results.append(("delete", label, str(e)))
+                continue
+            library_ids.discard(pid)
+            update_playlist.get_library_catalog().delete(pid)
+            update_playlist.get_match_cache().evict_track(pid)
+            results.append(("delete", label, "done"))
+    return results
+
+
+def apply_plan(plan, dry_run=False, backend=None):
+    """
+    Apply a plan, playlist by playlist.
+
+    The library's persistent IDs are read once for the whole plan.
+
+    Returns:
+        dict: {playlist name: apply_playlist results}
+    """
+    import update_playlist
+
+    backend = backend or update_playlist.get_music_backend()
+    library_ids = None
+    report = {}
+    for entry in plan["playlists"]:
+        if "error" in entry:
+            continue
+        if library_ids is None:
+            library_ids = set(backend.get_track_columns(("persistent_id",))["persistent_id"])
+        try:
+            report[entry["name"]] = apply_playlist(
+                backend, entry, library_ids, dry_run=dry_run
+            )
+        except Exception as e:
+            report[entry["name"]] = [("playlist", entry["name"], str(e))]
+    return report
+
+
+# Outcomes of apply_playlist that aren't failures
+OK_OUTCOMES = ("done", "already done", "would do")
+
+
+def print_report(report):
+    """Print apply results; returns the number of failures"""
+    failures = 0
+    colors = dict(zip(OK_OUTCOMES, (Fore.GREEN, Fore.RESET, Fore.YELLOW)))
+    for playlist, results in report.items():
+        print(Fore.CYAN + f"\n{playlist}" + Fore.RESET)
+        for action, item, outcome in results:
+            if outcome not in colors:
+                failures += 1
+            print(colors.get(outcome, Fore.RED) + f"  {action} {item}: {outcome}" + Fore.RESET)
+    return failures
+
+
+def summary_rows(plan, report=None, runs=None):
+    """
+    Return the per-playlist summary table as rows of strings, header first.
+
+    Counts are what the plan holds; 'failed' counts the apply results that
+    aren't OK_OUTCOMES, and the timings come from a scheduled run.
+    """
+    rows = [["playlist", "add", "remove", "delete", "skipped", "review", "failed", "plan s", "apply s"]]
+    for entry in plan["playlists"]:
+        run = (runs or {}).get(entry["name"])
+        timings = [f"{run.plan_seconds:.1f}", f"{run.apply_seconds:.1f}"] if run else ["", ""]
+        if "error" in entry:
+            rows.append([entry["name"], f"error: {entry['error']}", "", "", "", "", "", *timings])
+            continue
+        results = (report or {}).get(entry["name"], [])
+        rows.append([
+            entry["name"],
+            str(len(entry["add"])),
+            str(len(entry["remove"])),
+            str(len(entry["delete_from_library"])),
+            str(len(entry["skipped"])),
+            str(len(entry["needs_review"]) + len(entry["ambiguous"])),
+            str(sum(outcome not in OK_OUTCOMES for _, _, outcome in results)),
+            *timings,
+        ])
+    return rows
+
+
+def print_summary(plan, report=None, runs=None):
+    rows = summary_rows(plan, report, runs)
+    # An error message spans the count columns, so it doesn't set their width
+    widths = [
+        max(len(row[column]) for row in rows if not row[1].startswith("error"))
+        for column in range(len(rows[0]))
+    ]
+    print()
+    for row in rows:
+        if row[1].startswith("error"):
+            print(Fore.RED + f"{row[0]:<{widths[0]}}  {row[1]}" + Fore.RESET)
+            continue
+        print("  ".join(
+            cell.ljust(width) if column == 0 else cell.rjust(width)
+            for column, (cell, width) in enumerate(zip(row, widths))
+        ))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sync Spotify playlists to Apple Music without prompts"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    planning = argparse.ArgumentParser(add_help=False)
+    planning.add_argument(
+        "--playlist", dest="playlists", action="append",
+        help="playlist to sync (repeatable); default: every playlist in both services",
+    )
+    planning.add_argument("--config", help="JSON file with default options")
+    planning.add_argument("--removal-policy", choices=REMOVAL_POLICIES)
+    planning.add_argument(
+        "--auto-add-threshold", type=float,
+        help="lowest library match score added without review (default: 1.0, exact "
+        "matches only); Music folder files always need review",
+    )
+    planning.add_argument("--output", default=PLAN_FILE, help="where to write the plan")
+    planning.add_argument(
+        "--workers", type=int,
+        help="playlists planned at the same time (default: 4)",
+    )
+    planning.add_argument(
+        "--profile", action="store_true",
+        help="write a cProfile dump and a JSON metrics summary to the cache directory",
+    )
+    planning.add_argument(
+        "--rebuild-catalog", action="store_true",
+        help="re-read the whole Apple Music library instead of refreshing the local catalog",
+    )
+    planning.add_argument(
+        "--refresh-playlists", action="store_true",
+        help="fetch the Spotify playlist listing even if the cached copy is fresh",
+    )
+
+    subparsers.add_parser("plan", parents=[planning], help="write a plan without changing anything")
+    run = subparsers.add_parser("run", parents=[planning], help="plan, then apply the plan")
+    run.add_argument(
+        "--dry-run", action="store_true", default=None,
+        help="write the plan and show what applying it would change",
+    )
+    apply = subparsers.add_parser("apply", help="apply a saved plan")
+    apply.add_argument("plan", help="plan file written by 'plan' or 'run'")
+    apply.add_argument("--dry-run", action="store_true", help="show what would change")
+    show = subparsers.add_parser("show", help="summarize a saved plan")
+    show.add_argument("plan", help="plan file written by 'plan' or 'run'")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "show":
+        print_summary(load_plan(args.plan))
+        return 0
+
+    if args.command == "apply":
+        plan = load_plan(args.plan)
+        report = apply_plan(plan, dry_run=args.dry_run)
+        failures = print_report(report)
+        print_summary(plan, report)
+        return 1 if failures else 0
+
+    options = load_options(
+        args.config,
+        playlists=args.playlists,
+        removal_policy=args.removal_policy,
+        auto_add_threshold=args.auto_add_threshold,
+        dry_run=getattr(args, "dry_run", None),
+    )
+    import update_playlist
+    from timing import profiled
+
+    timer = update_playlist.start_run(rebuild_catalog=args.rebuild_catalog)
+    profile_path, metrics_path = (
+        update_playlist.profile_paths() if args.profile else (None, None)
+    )
+    with profiled(profile_path):
+        plan, runs = sync_playlists(
+            options,
+            timer,
+            apply=args.command == "run",
+            dry_run=options["dry_run"],
+            workers=args.workers,
+            refresh_playlists=args.refresh_playlists,
+        )
+    save_plan(plan, args.output)
+    print(f"\nPlan written to {args.output}")
+
+    report = {name: run.result for name, run in runs.items() if run.result is not None}
+    failures = print_report(report)
+    print_summary(plan, report, runs)
+    update_playlist.report_run(timer, prompts=False, metrics_path=metrics_path)
+    if profile_path:
+        print(f"Profile written to {profile_path} (open with python3 -m pstats)")
+    return 1 if failures or any(run.error for run in runs.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Planning many playlists at once while applying them one at a time.
+
+Planning a playlist is mostly waiting on Spotify and on reads from the Music
+app, so up to `workers` playlists are planned side by side. Applying a plan
+sends the Apple Events that change playlists and the library; those all go
+through one writer thread fed by a queue, so no two changes ever reach the
+Music app at the same time. A playlist is applied as soon as its plan is
+ready, while the others are still being planned.
+"""
+
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from timing import run_profiled
+
+# Playlists planned at the same time; each one fetches its Spotify pages on
+# its own worker threads too
+PLAN_WORKERS = 4
+
+ScheduledRun = namedtuple(
+    "ScheduledRun", ["plan", "result", "error", "plan_seconds", "apply_seconds"]
+)
+ScheduledRun.__doc__ = """
+Outcome of one scheduled item.
+
+plan: what plan(item) returned, or None if it raised
+result: what apply(item, plan) returned, or None if it raised or didn't run
+error: the exception message of the failed step, or None
+plan_seconds, apply_seconds: wall-clock time of each step
+"""
+
+
+class _Writer:
+    """Runs apply calls one after another on a single thread"""
+
+    def __init__(self, apply):
+        self.apply = apply
+        self.queue = queue.Queue()
+        self.done = {}
+        self.thread = threading.Thread(target=self._run, name="apply-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, item, plan):
+        self.queue.put((item, plan))
+
+    def close(self):
+        """Wait for the queued items; returns {item: (result, error, seconds)}"""
+        self.queue.put(None)
+        self.thread.join()
+        return self.done
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            item, plan = job
+            start = time.perf_counter()
+            try:
+                result, error = run_profiled(lambda: self.apply(item, plan)), None
+            except Exception as e:
+                result, error = None, str(e)
+            self.done[item] = (result, error, time.perf_counter() - start)
+
+
+def schedule(items, plan, apply=None, workers=PLAN_WORKERS):
+    """
+    Plan items concurrently and apply each plan on a single writer thread.
+
+    Args:
+        items (list): Hashable items, e.g. playlist names
+        plan: Callable taking an item; runs on up to `workers` threads
+        apply: Callable taking an item and its plan, or None to only plan;
+            calls are serialized, in the order the plans finish
+        workers (int): Most items planned at the same time
+
+    Returns:
+        dict: {item: ScheduledRun}, in the order of items. An item whose
+        plan raised is not applied.
+    """
+    items = list(items)
+    writer = _Writer(apply) if apply is not None else None
+    planned = {}
+
+    def timed_plan(item):
+        start = time.perf_counter()
+        try:
+            return run_profiled(lambda: plan(item)), None, time.perf_counter() - start
+        except Exception as e:
+            return None, str(e), time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items) or 1))) as pool:
+            futures = {pool.submit(timed_plan, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                planned[item] = future.result()
+                if writer is not None and planned[item][1] is None:
+                    writer.submit(item, planned[item][0])
+    finally:
+        applied = writer.close() if writer is not None else {}
+
+    runs = {}
+    for item in items:
+        item_plan, error, plan_seconds = planned[item]
+        result, apply_error, apply_seconds = applied.get(item, (None, None, 0.0))
+        runs[item] = ScheduledRun(item_plan, result, error or apply_error, plan_seconds, apply_seconds)
+    return runs
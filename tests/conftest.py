@@ -0,0 +1,39 @@
+"""Fixtures and factories shared by the test modules."""
+
+import pytest
+
+import paths
+import update_playlist
+from benchmarks import _SYNC_STATE
+
+
+def make_track(pid, name, artist, album="Album", duration=200.0, track_number=1, disc_number=1):
+    """A library track record with every LIBRARY_PROPERTIES key"""
+    return {
+        "persistent_id": pid,
+        "name": name,
+        "artist": artist,
+        "album": album,
+        "duration": duration,
+        "track_number": track_number,
+        "disc_number": disc_number,
+    }
+
+
+@pytest.fixture
+def sync_state(tmp_path, monkeypatch):
+    """
+    Give update_playlist new stores in tmp_path, closing them and restoring
+    its module state afterwards.
+    """
+    # Keep the catalog and match cache out of the real cache directory
+    monkeypatch.setattr(paths, "CACHE_DIR", str(tmp_path))
+    for name in _SYNC_STATE:
+        # Set to itself, so teardown puts it back
+        monkeypatch.setattr(update_playlist, name, getattr(update_playlist, name))
+    for name in ("_library_catalog", "_match_cache", "_media_index"):
+        setattr(update_playlist, name, None)
+    yield
+    for store in (update_playlist._library_catalog, update_playlist._match_cache):
+        if store is not None:
+            store.close()
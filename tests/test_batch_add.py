@@ -0,0 +1,62 @@
+"""Tests for batched playlist additions with an injected process runner."""
+
+import subprocess
+
+import batch_add
+from batch_add import BATCH_ADD_SCRIPT, add_tracks_to_playlist
+
+
+class FakeRunner:
+    """Stands in for subprocess.run, answering like add_tracks_to_playlist.scpt"""
+
+    def __init__(self, failing=(), returncode=0):
+        self.launches = []
+        self.failing = set(failing)
+        self.returncode = returncode
+
+    def __call__(self, args, capture_output=False, text=False):
+        self.launches.append(args)
+        lines = [
+            f"error\t{track}\tCan't get track" if track in self.failing else f"ok\t{track}"
+            for track in args[3:]
+        ]
+        return subprocess.CompletedProcess(
+            args, self.returncode, stdout="\n".join(lines), stderr="Music got an error"
+        )
+
+
+def test_all_tracks_are_added_in_one_launch():
+    runner = FakeRunner(failing={"PID2"})
+
+    results = add_tracks_to_playlist("Mix", ["PID1", "PID2", "/Music/a.m4a"], runner=runner)
+
+    assert len(runner.launches) == 1
+    assert runner.launches[0] == [
+        "osascript", BATCH_ADD_SCRIPT, "Mix", "PID1", "PID2", "/Music/a.m4a"
+    ]
+    assert results == {
+        "PID1": (True, None),
+        "PID2": (False, "Can't get track"),
+        "/Music/a.m4a": (True, None),
+    }
+
+
+def test_large_batches_are_split(monkeypatch):
+    monkeypatch.setattr(batch_add, "BATCH_SIZE", 100)
+    runner = FakeRunner()
+
+    results = add_tracks_to_playlist("Mix", [f"PID{i}" for i in range(300)], runner=runner)
+
+    assert len(runner.launches) == 3
+    assert all(success for success, _ in results.values())
+
+
+def test_failed_launch_marks_every_track():
+    runner = FakeRunner(returncode=1)
+
+    results = add_tracks_to_playlist("Mix", ["PID1", "PID2"], runner=runner)
+
+    assert results == {
+        "PID1": (False, "Music got an error"),
+        "PID2": (False, "Music got an error"),
+    }
@@ -0,0 +1,87 @@
+"""Tests for the benchmark suite's runs and regression checks."""
+
+import pytest
+
+import benchmarks
+import paths
+import update_playlist
+from benchmarks import compare, load_results, parse_import_times, run_benchmarks, save_results
+
+
+def result(scenario, size, seconds):
+    return {f"{scenario}@{size}": {"scenario": scenario, "size": size, "seconds": seconds, "runs": [seconds]}}
+
+
+def test_every_scenario_runs_on_a_small_library():
+    cache_dir = paths.CACHE_DIR
+    backend = update_playlist._music_backend
+
+    results = run_benchmarks(sizes=[200], repeat=1)
+
+    assert {r["scenario"] for r in results.values()} == {
+        "normalize", "library snapshot", "song_exists", "library scoring",
+        "playlist diff", "parse_selection",
+    }
+    assert all(r["size"] == 200 and r["seconds"] > 0 for r in results.values())
+    # The user's cache directory and sync state are left alone
+    assert paths.CACHE_DIR == cache_dir
+    assert update_playlist._music_backend is backend
+
+
+def test_only_slowdowns_beyond_the_threshold_regress():
+    baseline = {
+        **result("song_exists", 1000, 0.100),
+        **result("normalize", 1000, 0.100),
+        **result("playlist diff", 1000, 0.100),
+        **result("parse_selection", 1000, 0.001),
+    }
+    current = {
+        **result("song_exists", 1000, 0.160),
+        **result("normalize", 1000, 0.140),
+        # Within its own, looser threshold
+        **result("playlist diff", 1000, 0.190),
+        # Three times slower, but by less than the noise floor
+        **result("parse_selection", 1000, 0.003),
+        # Not in the baseline
+        **result("song_exists", 10000, 9.0),
+    }
+
+    regressions = compare(current, baseline, threshold=1.5)
+
+    assert [r["key"] for r in regressions] == ["song_exists@1000"]
+    assert regressions[0]["ratio"] == pytest.approx(1.6)
+
+
+def test_main_writes_results_and_fails_on_regression(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        benchmarks, "run_benchmarks", lambda sizes, repeat: result("song_exists", 1000, 0.5)
+    )
+    output, baseline = tmp_path / "results.json", tmp_path / "baseline.json"
+    args = ["--output", str(output), "--baseline", str(baseline), "--imports"]
+
+    # The first run becomes the baseline
+    assert benchmarks.main(args) == 0
+    assert load_results(baseline) == result("song_exists", 1000, 0.5)
+
+    save_results(result("song_exists", 1000, 0.1), baseline)
+    assert benchmarks.main(args) == 1
+    assert load_results(output) == result("song_exists", 1000, 0.5)
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       300 |        300 | site
+import time:       150 |        150 |     _heapq
+import time:       400 |        550 |   heapq
+import time:      2000 |       2000 |   difflib
+import time:      1200 |       3750 | matching
+import time:        80 |         80 | other
+"""
+
+
+def test_import_times_cover_the_module_and_its_imports():
+    seconds, slowest = parse_import_times(IMPORTTIME, "matching")
+
+    assert seconds == pytest.approx(0.00375)
+    assert [name for name, _ in slowest] == ["difflib", "matching", "heapq", "_heapq"]
+    assert slowest[0][1] == pytest.approx(0.002)
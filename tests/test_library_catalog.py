@@ -0,0 +1,86 @@
+"""Tests for the persistent library catalog and its incremental refresh."""
+
+from datetime import datetime, timedelta
+
+from library_catalog import LibraryCatalog
+from library_index import LibraryIndex
+from music_backend import FakeMusicBackend
+
+BASE_DATE = datetime(2024, 1, 1)
+
+
+def make_track(i, **overrides):
+    track = {
+        "persistent_id": f"ID{i:05d}",
+        "name": f"Song {i}",
+        "artist": f"Artist {i % 7}",
+        "album": f"Album {i % 11}",
+        "duration": 180.0 + i,
+        "track_number": i % 12 + 1,
+        "disc_number": 1,
+        "modification_date": BASE_DATE + timedelta(minutes=i),
+    }
+    track.update(overrides)
+    return track
+
+
+def test_first_refresh_reads_every_track(tmp_path):
+    backend = FakeMusicBackend([make_track(i) for i in range(100)])
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+
+    assert catalog.refresh(backend) == {"added": 100, "updated": 0, "removed": 0}
+    assert len(catalog) == 100
+    record = next(r for r in catalog.records() if r["persistent_id"] == "ID00042")
+    assert record["norm_name"] == "song 42"
+    assert record["norm_artist"] == "artist 0"
+    assert record["norm_album"] == "album 9"
+    assert record["core_name"] == "song 42"
+
+
+def test_index_is_built_from_the_stored_forms(tmp_path, monkeypatch):
+    backend = FakeMusicBackend([make_track(1, name="Song (Remastered 2011)", album="Café")])
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+    catalog.refresh(backend)
+    # A warm start neither normalizes nor strips version annotations again
+    monkeypatch.setattr("library_index.normalize_string", None)
+    monkeypatch.setattr("library_index.core_title", None)
+
+    index = LibraryIndex(catalog.records())
+
+    record = index.get("ID00001")
+    assert (record["core_name"], record["norm_album"]) == ("song", "cafe")
+
+
+def test_unchanged_library_only_reads_ids_and_dates(tmp_path):
+    backend = FakeMusicBackend([make_track(i) for i in range(100)])
+    LibraryCatalog(tmp_path / "library.sqlite3").refresh(backend)
+
+    # A new process opens the same catalog file
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+    backend.event_count = 0
+    assert catalog.refresh(backend) == {"added": 0, "updated": 0, "removed": 0}
+    assert backend.event_count == 2
+
+
+def test_refresh_picks_up_changes(tmp_path):
+    backend = FakeMusicBackend([make_track(i) for i in range(100)])
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+    catalog.refresh(backend)
+
+    backend.tracks[10].update(name="Renamed", modification_date=BASE_DATE + timedelta(days=30))
+    backend.tracks.append(make_track(500, modification_date=BASE_DATE + timedelta(days=31)))
+    backend.delete_track("ID00003")
+
+    assert catalog.refresh(backend) == {"added": 1, "updated": 1, "removed": 1}
+    names = {r["persistent_id"]: r["name"] for r in catalog.records()}
+    assert names["ID00010"] == "Renamed"
+    assert "ID00500" in names
+    assert "ID00003" not in names
+
+
+def test_rebuild_rereads_library(tmp_path):
+    backend = FakeMusicBackend([make_track(i) for i in range(10)])
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+    catalog.refresh(backend)
+
+    assert catalog.refresh(backend, rebuild=True) == {"added": 10, "updated": 0, "removed": 0}
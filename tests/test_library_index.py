@@ -0,0 +1,187 @@
+"""Tests for the in-memory library index used by song lookups."""
+
+from conftest import make_track
+from library_index import LIBRARY_PROPERTIES, LibraryIndex, build_library_index
+from music_backend import FakeMusicBackend
+
+
+def test_lookup_matches_normalized_title_and_artist():
+    index = build_library_index(FakeMusicBackend([
+        make_track("A1", "I've Been In Love", "Jungle"),
+        make_track("A2", "Café del Mar", "Energy 52"),
+        make_track("A3", "Intro", "The xx"),
+        make_track("A4", "Intro", "M83"),
+    ]))
+
+    assert [r["persistent_id"] for r in index.lookup("ive been in love", "JUNGLE")] == ["A1"]
+    assert [r["name"] for r in index.lookup("Cafe Del Mar", "energy 52")] == ["Café del Mar"]
+    assert index.lookup("I've been in love", "Someone Else") == []
+    assert sorted(r["artist"] for r in index.lookup("intro")) == ["M83", "The xx"]
+    assert index.get("A2")["artist"] == "Energy 52"
+
+
+def test_lookup_falls_back_to_the_primary_artist():
+    index = build_library_index(FakeMusicBackend([
+        make_track("A1", "Get Lucky (feat. Pharrell Williams)", "Daft Punk"),
+        make_track("A2", "Get Lucky (feat. Pharrell Williams)", "Pharrell Williams"),
+    ]))
+
+    credit = "Daft Punk, Pharrell Williams, Nile Rodgers"
+    assert [r["persistent_id"] for r in index.lookup("Get Lucky (feat. Pharrell Williams)", credit)] == ["A1"]
+    [(score, record)] = index.search("Get Lucky (feat. Pharrell Williams)", credit, limit=1)
+    assert (score, record["persistent_id"]) == (1.0, "A1")
+
+
+def test_snapshot_costs_one_event_per_property():
+    backend = FakeMusicBackend(
+        [make_track(f"P{i}", f"Song {i}", "Artist") for i in range(500)]
+    )
+    index = build_library_index(backend)
+
+    for i in range(500):
+        assert index.lookup(f"song {i}", "artist")
+
+    assert backend.event_count == len(LIBRARY_PROPERTIES) + 1
+
+
+def test_remove_drops_record_from_all_buckets():
+    index = LibraryIndex([
+        make_track("H1", "Home", "A", album="X"),
+        make_track("H2", "Home", "B", album="Y"),
+    ])
+    record = index.lookup("home", "a")[0]
+
+    index.remove(record)
+
+    assert len(index) == 1
+    assert index.lookup("home", "a") == []
+    assert index.get("H1") is None
+    assert [r["artist"] for r in index.lookup("home")] == ["B"]
+
+
+def test_search_ranks_exact_matches_above_variants():
+    index = LibraryIndex([
+        make_track("S1", "Come Together (Remastered 2009)", "The Beatles"),
+        make_track("S2", "Come Together", "The Beatles"),
+        make_track("S3", "Something", "The Beatles"),
+    ])
+
+    results = index.search("Come Together", "The Beatles")
+
+    assert [(score, r["persistent_id"]) for score, r in results[:2]] == [
+        (1.0, "S2"),
+        (0.99, "S1"),
+    ]
+
+
+def test_search_finds_remasters_and_featured_credits():
+    index = LibraryIndex([
+        make_track("F1", "Get Lucky", "Daft Punk"),
+        make_track("F2", "Heroes", "David Bowie"),
+        make_track("F3", "Get Up", "James Brown"),
+    ])
+
+    best = index.search("Get Lucky (feat. Pharrell Williams)", "Daft Punk")[0]
+    assert best[1]["persistent_id"] == "F1" and best[0] > 0.9
+    best = index.search("Heroes - 2017 Remaster", "Bowie")[0]
+    assert best[1]["persistent_id"] == "F2" and best[0] > 0.9
+    assert index.search("Heroes", "David Bowie", min_score=0.85)[0][0] == 1.0
+    assert index.search("Completely Different", "Nobody") == []
+
+
+def test_search_keeps_numbered_pieces_apart():
+    index = LibraryIndex([
+        make_track("N1", "Nocturne No. 1", "Chopin"),
+        make_track("N2", "Symphony Part I", "Orchestra"),
+        make_track("N3", "Suite No. 3 (Live)", "Band"),
+    ])
+
+    assert index.search("Nocturne No. 2", "Chopin") == []
+    assert index.search("Symphony Part II", "Orchestra") == []
+    # The numbering is the same, only an annotation differs
+    assert index.search("Suite No. 3", "Band")[0][1]["persistent_id"] == "N3"
+
+
+def test_search_scores_only_candidates_sharing_title_words(monkeypatch):
+    import library_index
+
+    index = LibraryIndex(
+        [make_track(f"N{i}", f"Track {i}", f"Artist {i % 10}") for i in range(5000)]
+        + [make_track("R1", "Rare Groove (Remastered)", "Artist 3")]
+    )
+    calls = []
+    similarity = library_index.similarity
+
+    def counting_similarity(a, b):
+        calls.append(b)
+        return similarity(a, b)
+
+    monkeypatch.setattr(library_index, "similarity", counting_similarity)
+
+    assert index.search("Rare Groove", "Artist 3")[0][1]["persistent_id"] == "R1"
+    assert calls == ["rare groove"]
+    # A word every track shares still scores a bounded number of candidates
+    calls.clear()
+    index.search("Track", "Artist 3")
+    assert len(calls) <= library_index.MAX_CANDIDATES
+
+
+def test_remove_drops_record_from_search():
+    index = LibraryIndex([make_track("D1", "Dreams (Remastered)", "Fleetwood Mac")])
+
+    index.remove(index.get("D1"))
+
+    assert index.search("Dreams", "Fleetwood Mac") == []
+
+
+def test_lookup_duration_probes_neighbouring_seconds():
+    index = LibraryIndex([
+        make_track("I1", "Intro", "A", duration=59.6),
+        make_track("I2", "Intro", "B", duration=61.4),
+        make_track("I3", "Intro", "C", duration=90.0),
+        make_track("I4", "Outro", "A", duration=60.0),
+    ])
+
+    assert [r["persistent_id"] for r in index.lookup_duration("intro", 60.5)] == ["I1", "I2"]
+    assert [r["persistent_id"] for r in index.lookup_duration("INTRO", 89.0)] == ["I3"]
+    assert index.lookup_duration("intro", 75.0) == []
+    assert [r["persistent_id"] for r in index.lookup_album_track("album", 1, 1)] == [
+        "I1", "I2", "I3", "I4"
+    ]
+
+
+def test_resolve_duplicates_leaves_only_true_ties():
+    index = LibraryIndex([
+        make_track(
+            f"H{i}",
+            "Home",
+            f"Artist {i}",
+            album=f"Album {i % 3}",
+            duration=180.0 + i % 5,
+            track_number=i % 12 + 1,
+        )
+        for i in range(40)
+    ])
+    candidates = index.lookup("home")
+
+    # Only H7 has this duration and album position
+    track = {
+        "name": "Home",
+        "duration": 182.2,
+        "album": "Album 1",
+        "disc_number": 1,
+        "track_number": 8,
+    }
+    assert [r["persistent_id"] for r in index.resolve_duplicates(track, candidates)] == ["H7"]
+
+    # Two tracks share every indexed property, so both stay for the prompt
+    index.add(
+        make_track("H99", "Home", "Artist 7", album="Album 1", duration=182.0, track_number=8)
+    )
+    candidates = index.lookup("home")
+    tied = index.resolve_duplicates(track, candidates)
+    assert [r["persistent_id"] for r in tied] == ["H7", "H99"]
+
+    # Nothing at that position: only the duration (182 or 183 s) narrows it
+    track = dict(track, album="Unknown")
+    assert len(index.resolve_duplicates(track, candidates)) == 17
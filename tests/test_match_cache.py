@@ -0,0 +1,67 @@
+"""Tests for the persistent Spotify to Apple Music match store."""
+
+from library_index import LibraryIndex
+from match_cache import MatchCache
+
+
+def make_library(*pids):
+    return LibraryIndex([
+        {
+            "persistent_id": pid,
+            "name": f"Song {pid}",
+            "artist": "Artist",
+            "album": "Album",
+            "duration": 200.0,
+            "track_number": 1,
+            "disc_number": 1,
+        }
+        for pid in pids
+    ])
+
+
+def test_matches_survive_reopening(tmp_path):
+    path = tmp_path / "matches.sqlite3"
+    cache = MatchCache(path)
+    cache.put("spotify:track:1", "A1", confidence=0.9)
+    cache.close()
+
+    cache = MatchCache(path)
+    match = cache.get("spotify:track:1", make_library("A1"))
+
+    assert match["persistent_id"] == "A1"
+    assert match["confidence"] == 0.9
+    assert match["matched_at"] > 0
+    assert cache.get("spotify:track:2", make_library("A1")) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_matches_to_missing_tracks_are_evicted(tmp_path):
+    cache = MatchCache(tmp_path / "matches.sqlite3")
+    cache.put_many([
+        ("spotify:track:1", "A1", 1.0),
+        ("spotify:track:2", "A2", 1.0),
+        ("spotify:track:3", "A3", 1.0),
+    ])
+    library = make_library("A1", "A3")
+
+    found = cache.get_many(["spotify:track:1", "spotify:track:2"], library)
+
+    assert list(found) == ["spotify:track:1"]
+    assert len(cache) == 2
+    cache.evict_track("A3")
+    assert len(cache) == 1
+    assert cache.prune(make_library()) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 3, 0)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_steady_state_lookups_hit_in_bulk(tmp_path):
+    cache = MatchCache(tmp_path / "matches.sqlite3")
+    pids = [f"A{i}" for i in range(2000)]
+    cache.put_many((f"spotify:track:{i}", pid, 1.0) for i, pid in enumerate(pids))
+
+    found = cache.get_many([f"spotify:track:{i}" for i in range(2000)], make_library(*pids))
+
+    assert len(found) == 2000
+    assert cache.stats()["hit_rate"] == 1.0
@@ -0,0 +1,137 @@
+"""Tests and a benchmark for the media file index used instead of find."""
+
+import os
+import random
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from media_index import MediaIndex, open_media_index
+
+# Size of the synthetic tree for the benchmark, e.g. 100000; it only runs
+# when this is set
+BENCH_FILES = int(os.environ.get("MEDIA_INDEX_BENCH_FILES", 0))
+BENCH_QUERIES = 20
+
+WORDS = "love night home intro light dark fire water dream heart gold river sky blue road".split()
+
+
+def touch(root, *parts):
+    path = os.path.join(root, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+    return path
+
+
+@pytest.fixture
+def music_dir(tmp_path):
+    root = tmp_path / "Music"
+    touch(root, "Jungle", "Loving In Stereo", "01 I've Been In Love.m4a")
+    touch(root, "Jungle", "Loving In Stereo", "02 Keep Moving.m4a")
+    touch(root, "Energy 52", "Café del Mar", "1-01 Café del Mar.mp3")
+    touch(root, "Energy 52", "Café del Mar", "cover.jpg")
+    return str(root)
+
+
+def test_query_ranks_by_normalized_tokens(music_dir, tmp_path):
+    index = open_media_index(music_dir, path=tmp_path / "index.json")
+
+    assert len(index) == 3
+    results = index.query("I've been in love")
+    assert os.path.basename(results[0][0]) == "01 I've Been In Love.m4a"
+    assert results[0][1] == 1.0
+    # Artist and album folders are searchable too
+    assert os.path.basename(index.query("cafe del mar energy 52")[0][0]) == "1-01 Café del Mar.mp3"
+    assert index.query("nothing like this") == []
+
+
+def test_in_folder_of_checks_the_artist_and_album_folders(music_dir, tmp_path):
+    index = open_media_index(music_dir, path=tmp_path / "index.json")
+    path = index.query("keep moving")[0][0]
+
+    assert index.in_folder_of(path, "Jungle")
+    assert index.in_folder_of(path, "loving in stereo")
+    # Title words aren't folder words
+    assert not index.in_folder_of(path, "Keep")
+    assert not index.in_folder_of(path, "Drake")
+    # Every word of the artist has to be in one folder name
+    assert not index.in_folder_of(path, "Jungle Brothers")
+
+
+def test_in_folder_of_ignores_shared_articles(music_dir, tmp_path):
+    touch(music_dir, "The xx", "Coexist", "01 Intro.m4a")
+    index = open_media_index(music_dir, path=tmp_path / "index.json")
+    [(path, _)] = index.query("Intro - The Weeknd", limit=1)
+
+    assert os.path.basename(path) == "01 Intro.m4a"
+    assert not index.in_folder_of(path, "The Weeknd")
+    assert index.in_folder_of(path, "the XX")
+
+
+def test_refresh_only_rescans_changed_directories(music_dir, tmp_path):
+    index_path = tmp_path / "index.json"
+    open_media_index(music_dir, path=index_path)
+
+    index = MediaIndex(music_dir, path=index_path)
+    assert index.load()
+    assert index.refresh() == 0
+
+    new_file = touch(music_dir, "Jungle", "Loving In Stereo", "03 Talk About It.m4a")
+    os.utime(os.path.dirname(new_file), (time.time() + 5, time.time() + 5))
+    shutil.rmtree(os.path.join(music_dir, "Energy 52"))
+
+    # The album and root folders are rescanned; the two removed ones are dropped
+    assert index.refresh() == 4
+    assert os.path.basename(index.query("talk about it")[0][0]) == "03 Talk About It.m4a"
+    assert index.query("cafe del mar") == []
+
+
+@pytest.mark.skipif(BENCH_FILES == 0, reason="set MEDIA_INDEX_BENCH_FILES to run")
+def test_index_benchmark_against_find(tmp_path):
+    rng = random.Random(7)
+    root = tmp_path / "Music"
+    titles = []
+    for i in range(BENCH_FILES):
+        album = root / f"Artist {i // 96}" / f"Album {i // 12}"
+        if i % 12 == 0:
+            album.mkdir(parents=True)
+        title = f"{' '.join(rng.choice(WORDS) for _ in range(3))} {i}"
+        titles.append(title)
+        (album / f"{i % 12 + 1:02d} {title}.m4a").touch()
+    queries = rng.sample(titles, BENCH_QUERIES)
+
+    # What add_music.sh did: one find over the whole tree per song
+    start = time.perf_counter()
+    for title in queries:
+        subprocess.run(
+            ["find", str(root), "-type", "f", "-name", "*.m4a", "-iname", f"*{title}*"],
+            capture_output=True,
+            check=True,
+        )
+    find_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    open_media_index(str(root), path=tmp_path / "index.json")
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = open_media_index(str(root), path=tmp_path / "index.json")
+    open_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [index.query(title, limit=5) for title in queries]
+    query_time = time.perf_counter() - start
+
+    print(
+        f"\n{BENCH_FILES} files, {BENCH_QUERIES} searches: "
+        f"find {find_time * 1000:.0f}ms, "
+        f"index build {build_time * 1000:.0f}ms, "
+        f"warm open {open_time * 1000:.0f}ms, "
+        f"queries {query_time * 1000:.1f}ms"
+    )
+    for title, found in zip(queries, results):
+        assert found[0][0].endswith(f"{title}.m4a")
+    assert query_time * 100 < find_time
+    assert open_time + query_time < find_time
@@ -0,0 +1,89 @@
+"""Tests for the column-oriented Music backend interface."""
+
+import pytest
+
+import music_backend
+from music_backend import FakeMusicBackend, load_track_records
+
+
+def test_load_track_records_zips_columns():
+    records = load_track_records({
+        "persistent_id": ["A", "B"],
+        "name": ["One", "Two"],
+    })
+
+    assert records == [
+        {"persistent_id": "A", "name": "One"},
+        {"persistent_id": "B", "name": "Two"},
+    ]
+
+
+def test_load_track_records_rejects_mismatched_columns():
+    with pytest.raises(RuntimeError):
+        load_track_records({"persistent_id": ["A", "B"], "name": ["One"]})
+
+
+def test_fake_backend_counts_events_and_deletes_by_id():
+    backend = FakeMusicBackend(
+        [{"persistent_id": "A", "name": "One"}, {"persistent_id": "B", "name": "Two"}],
+        playlists={"Mix": ["A", "B"]},
+    )
+
+    columns = backend.get_playlist_track_columns("Mix", ("persistent_id", "name"))
+    assert columns["name"] == ["One", "Two"]
+    assert backend.event_count == 2
+
+    backend.delete_track("A")
+    assert backend.get_track_columns(("name",)) == {"name": ["Two"]}
+    assert backend.playlists["Mix"] == ["B"]
+    assert backend.event_count == 4
+
+
+def test_synthetic_library_is_reproducible():
+    backend = FakeMusicBackend.synthetic(500, playlist_count=2, playlist_size=20, seed=7)
+    again = FakeMusicBackend.synthetic(500, playlist_count=2, playlist_size=20, seed=7)
+
+    assert len(backend.tracks) == 500
+    assert backend.tracks == again.tracks
+    assert backend.playlists == again.playlists
+    assert sorted(backend.playlists) == ["Playlist 1", "Playlist 2"]
+    ids = {track["persistent_id"] for track in backend.tracks}
+    assert len(ids) == 500
+    assert set(backend.playlists["Playlist 1"]) <= ids
+    # Some titles recur, as in a real library
+    assert len({track["name"] for track in backend.tracks}) < 500
+
+
+def test_fake_backend_adds_library_tracks_and_imports_files():
+    backend = FakeMusicBackend([{"persistent_id": "A", "name": "One"}], playlists={"Mix": []})
+
+    results = backend.add_playlist_tracks(
+        "Mix", ["A", "MISSING", "/Music/Artist/Album/02 Two.m4a"]
+    )
+
+    assert results["A"] == (True, None)
+    assert results["MISSING"] == (False, "Can't get track")
+    assert results["/Music/Artist/Album/02 Two.m4a"] == (True, None)
+    imported = backend.imported["/Music/Artist/Album/02 Two.m4a"]
+    assert backend.playlists["Mix"] == ["A", imported]
+    assert backend.tracks[-1]["artist"] == "Artist"
+    # Importing the same file again reuses its track
+    backend.add_playlist_tracks("Mix", ["/Music/Artist/Album/02 Two.m4a"])
+    assert len(backend.tracks) == 2
+
+
+def test_fake_backend_counts_calls_and_injects_latency(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(music_backend.time, "sleep", sleeps.append)
+    backend = FakeMusicBackend(
+        [{"persistent_id": "A", "name": "One"}], playlists={"Mix": ["A"]}, latency=0.01
+    )
+
+    backend.get_track_columns(("persistent_id", "name"))
+    backend.get_playlist_names()
+    backend.get_playlist_names()
+
+    assert backend.calls == {"get_track_columns": 1, "get_playlist_names": 2}
+    assert backend.event_count == 4
+    # One delay per Apple Event
+    assert sleeps == [0.02, 0.01, 0.01]
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark for normalize_string on a synthetic 50k-string corpus.
+
+The corpus mimics library metadata: mostly ASCII titles, some accented and
+non-Latin names, punctuation, and many repeats (artists and albums recur on
+every track). Run with -s to see the timings; the speedups are only
+asserted with NORMALIZE_BENCH_STRICT set, since a loaded machine can miss
+them.
+"""
+
+import os
+import random
+import re
+import time
+import unicodedata
+
+from matching import configure_normalize_cache, normalize_cache_info, normalize_string
+
+STRICT = bool(os.environ.get("NORMALIZE_BENCH_STRICT"))
+
+CORPUS_SIZE = 50_000
+DISTINCT_STRINGS = 8_000
+
+WORDS = [
+    "love", "night", "I've", "been", "don't", "Café", "del", "Mar", "Beyoncé",
+    "Sigur", "Rós", "(Remastered", "2011)", "feat.", "Mötley", "Crüe", "Ólafur",
+    "Arnalds", "Tiësto", "Hello,", "world!", "Part", "II", "-", "Live", "&",
+    "Bonus", "Track", "東京", "Ñu", "Intro", "Home", "Röyksopp", "A$AP",
+]
+
+
+def reference_normalize(s):
+    """normalize_string as it was before memoization and the ASCII fast path"""
+    s = s.lower()
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join([c for c in s if not unicodedata.combining(c)])
+    s = re.sub(r"[^\w\s]", "", s)
+    s = " ".join(s.split())
+    return s
+
+
+def make_corpus(size=CORPUS_SIZE, distinct=DISTINCT_STRINGS, seed=4):
+    rng = random.Random(seed)
+    unique = [
+        "  ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+        if i % 9 == 0
+        else " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+        for i in range(distinct)
+    ]
+    return [rng.choice(unique) for _ in range(size)]
+
+
+def timed(func, corpus):
+    start = time.perf_counter()
+    result = [func(s) for s in corpus]
+    return time.perf_counter() - start, result
+
+
+def test_normalize_matches_reference():
+    corpus = make_corpus(size=5_000)
+    corpus += ["Ｆｕｌｌｗｉｄｔｈ", "ﬁnale", "tab\there", "under_score", "\x1cx\x1fy", ""]
+    for s in corpus:
+        assert normalize_string(s) == reference_normalize(s), s
+
+
+def test_normalize_benchmark():
+    corpus = make_corpus()
+    configure_normalize_cache()
+
+    reference_time, expected = timed(reference_normalize, corpus)
+    first_time, result = timed(normalize_string, corpus)
+    warm_time, _ = timed(normalize_string, corpus)
+    info = normalize_cache_info()
+
+    print(
+        f"\nnormalize_string on {len(corpus)} strings: "
+        f"reference {reference_time * 1000:.1f}ms, "
+        f"cold cache {first_time * 1000:.1f}ms "
+        f"({reference_time / first_time:.1f}x), "
+        f"warm cache {warm_time * 1000:.1f}ms "
+        f"({reference_time / warm_time:.1f}x), "
+        f"hits={info.hits} misses={info.misses}"
+    )
+    assert result == expected
+    assert info.misses <= DISTINCT_STRINGS
+    if STRICT:
+        assert first_time * 2 < reference_time
+        assert warm_time * 5 < reference_time
+
+
+def test_cache_bound_is_configurable():
+    configure_normalize_cache(maxsize=10)
+    try:
+        for s in make_corpus(size=1_000):
+            normalize_string(s)
+        assert normalize_cache_info().currsize == 10
+    finally:
+        configure_normalize_cache()
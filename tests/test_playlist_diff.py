@@ -0,0 +1,138 @@
+"""Tests for the identity-based diff between a Spotify and an Apple Music playlist."""
+
+import time
+
+from playlist_diff import diff_playlists
+
+
+def spotify(uri, name, artist, duration=200.0, isrc=None):
+    return {"uri": uri, "name": name, "artist": artist, "duration": duration, "isrc": isrc}
+
+
+def apple(pid, name, artist, duration=200.0):
+    return {"persistent_id": pid, "name": name, "artist": artist, "duration": duration}
+
+
+def uris(tracks):
+    return [track["uri"] for track in tracks]
+
+
+def pids(tracks):
+    return [track["persistent_id"] for track in tracks]
+
+
+def test_pairs_by_title_artist_and_duration():
+    diff = diff_playlists(
+        [
+            spotify("s:1", "Heroes - 2017 Remaster", "David Bowie", 371.2),
+            spotify(
+                "s:2", "Get Lucky (feat. Pharrell Williams)", "Daft Punk, Pharrell Williams", 369.0
+            ),
+            spotify("s:3", "Intro", "The xx", 127.5),
+        ],
+        [
+            apple("A1", "Heroes", "David Bowie", 370.6),
+            apple("A2", "Get Lucky", "Daft Punk & Pharrell Williams", 368.4),
+            apple("A3", "Intro", "M83", 322.0),
+        ],
+    )
+
+    assert [(s["uri"], a["persistent_id"]) for s, a in diff.matched] == [("s:1", "A1"), ("s:2", "A2")]
+    assert uris(diff.added) == ["s:3"]
+    assert pids(diff.removed) == ["A3"]
+    assert diff.ambiguous == []
+
+
+def test_duplicate_titles_pair_one_to_one():
+    diff = diff_playlists(
+        [
+            spotify("s:1", "Home", "Artist"),
+            spotify("s:2", "Home", "Artist"),
+            spotify("s:3", "Home", "Other"),
+        ],
+        [
+            apple("A1", "Home", "Artist"),
+            apple("A2", "Home", "Other"),
+            apple("A3", "Home", "Artist"),
+        ],
+    )
+
+    assert [(s["uri"], a["persistent_id"]) for s, a in diff.matched] == [
+        ("s:1", "A1"),
+        ("s:2", "A3"),
+        ("s:3", "A2"),
+    ]
+    assert diff.added == [] and diff.removed == []
+
+
+def test_known_pairs_and_isrc_come_before_metadata():
+    diff = diff_playlists(
+        [
+            # Renamed on the Apple side, but paired in an earlier sync
+            spotify("s:1", "Song", "Artist"),
+            spotify("s:2", "Another Song", "Artist", isrc="USABC1234567"),
+        ],
+        [
+            apple("A1", "Song (Live)", "Artist", 260.0),
+            dict(apple("A2", "Another Song [Mono]", "Someone", 150.0), isrc="USABC1234567"),
+        ],
+        known={"s:1": "A1"},
+    )
+
+    assert [(s["uri"], a["persistent_id"]) for s, a in diff.matched] == [("s:1", "A1"), ("s:2", "A2")]
+
+
+def test_tracks_with_several_candidates_are_ambiguous():
+    diff = diff_playlists(
+        [spotify("s:1", "Intro", "Artist", 100.0)],
+        [apple("A1", "Intro", "Artist", 99.4), apple("A2", "Intro", "Artist", 101.0)],
+    )
+
+    assert diff.matched == [] and diff.added == [] and diff.removed == []
+    [(track, candidates)] = diff.ambiguous
+    assert track["uri"] == "s:1" and pids(candidates) == ["A1", "A2"]
+
+
+def test_diff_time_grows_linearly():
+    def run(size):
+        spotify_tracks = [
+            spotify(f"s:{i}", f"Song {i}", f"Artist {i % 50}", 120 + i % 200)
+            for i in range(size)
+        ]
+        # Half of the Spotify tracks, plus as many that only Apple has
+        apple_tracks = [
+            apple(f"A{i}", f"Song {i}", f"Artist {i % 50}", 120 + i % 200)
+            for i in range(size // 2, size * 3 // 2)
+        ]
+        start = time.perf_counter()
+        diff = diff_playlists(spotify_tracks, apple_tracks)
+        elapsed = time.perf_counter() - start
+        assert len(diff.matched) == len(diff.added) == len(diff.removed) == size // 2
+        return elapsed
+
+    run(1000)
+    small, large = run(2000), run(20000)
+    # A quadratic diff would take about 100 times as long
+    assert large < small * 30
+
+
+def test_same_artist_tracks_of_another_length_are_not_paired():
+    diff = diff_playlists(
+        [spotify("s:1", "Intro", "Artist", 60.0)],
+        [apple("A1", "Intro", "Artist", 240.0)],
+    )
+
+    assert diff.matched == [] and diff.similar == []
+    assert uris(diff.added) == ["s:1"]
+    assert pids(diff.removed) == ["A1"]
+
+
+def test_similar_artist_pairs_are_reported():
+    diff = diff_playlists(
+        [spotify("s:1", "Help!", "The Beatles", 139.0), spotify("s:2", "Yesterday", "Beatles", 125.0)],
+        [apple("A1", "Help!", "Beatles", 138.6), apple("A2", "Yesterday", "The Beatles", 300.0)],
+    )
+
+    assert [(s["uri"], a["persistent_id"]) for s, a in diff.matched] == [("s:1", "A1")]
+    assert diff.similar == diff.matched
+    assert uris(diff.added) == ["s:2"]
@@ -0,0 +1,76 @@
+"""Tests for bulk playlist removal through one playlist snapshot."""
+
+from music_backend import REMOVE_CHUNK_SIZE, FakeMusicBackend
+from playlist_removal import remove_playlist_tracks
+
+
+def make_backend(names, playlist="Mix"):
+    tracks = [
+        {"persistent_id": f"P{i}", "name": name, "artist": "Artist"}
+        for i, name in enumerate(names)
+    ]
+    return FakeMusicBackend(tracks, {playlist: [t["persistent_id"] for t in tracks]})
+
+
+def test_duplicate_titles_remove_distinct_entries():
+    backend = make_backend(["Home", "Intro", "Home", "Café"])
+
+    results = remove_playlist_tracks(
+        backend, "Mix", ["home", "Home", "cafe", "Home", {"persistent_id": "P1"}]
+    )
+
+    assert results == [
+        (True, "removed"),
+        (True, "removed"),
+        (True, "removed"),
+        (False, "not in the playlist"),
+        (True, "removed"),
+    ]
+    assert backend.playlists["Mix"] == []
+    # One read of two columns, one bulk delete
+    assert backend.event_count == 3
+
+
+def test_records_are_removed_by_persistent_id():
+    backend = make_backend(["Home", "Home", "Home"])
+
+    results = remove_playlist_tracks(backend, "Mix", [{"persistent_id": "P2", "name": "Home"}])
+
+    assert results == [(True, "removed")]
+    assert backend.playlists["Mix"] == ["P0", "P1"]
+
+
+def test_removing_hundreds_of_tracks_costs_a_constant_number_of_calls():
+    names = [f"Song {i}" for i in range(1000)]
+    backend = make_backend(names)
+
+    results = remove_playlist_tracks(backend, "Mix", names[:500])
+
+    assert all(success for success, _ in results)
+    assert backend.playlists["Mix"] == [f"P{i}" for i in range(500, 1000)]
+    # Removing one track at a time read the playlist for every track
+    assert backend.event_count == 2 + 500 // REMOVE_CHUNK_SIZE
+
+
+def test_one_copy_of_a_duplicated_track_is_removed_by_index():
+    backend = make_backend(["Home", "Intro"])
+    backend.playlists["Mix"] = ["P0", "P1", "P0"]
+
+    results = remove_playlist_tracks(
+        backend, "Mix", [{"persistent_id": "P0"}, {"persistent_id": "P1"}]
+    )
+
+    assert results == [(True, "removed"), (True, "removed")]
+    # The second copy stays, as the diff paired it with a Spotify track
+    assert backend.playlists["Mix"] == ["P0"]
+
+
+def test_duplicate_removal_fails_if_the_playlist_changed():
+    backend = make_backend(["Home", "Intro"])
+    snapshot = [{"persistent_id": "P0", "name": "Home"}] * 2
+    backend.playlists["Mix"] = ["P1", "P0"]
+
+    results = remove_playlist_tracks(backend, "Mix", ["Home"], snapshot=snapshot)
+
+    assert results == [(False, "playlist changed since it was read")]
+    assert backend.playlists["Mix"] == ["P1", "P0"]
@@ -0,0 +1,137 @@
+"""Tests for request pacing, Retry-After handling and adaptive concurrency."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rate_limit import AdaptiveLimiter, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_paces_after_the_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(5)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2:] == pytest.approx([0.1, 0.1, 0.1])
+    assert clock.now == pytest.approx(100.3)
+
+
+def test_concurrency_grows_while_clean_and_halves_when_throttled():
+    clock = FakeClock()
+    limiter = AdaptiveLimiter(rate=1000, burst=1000, initial=4, maximum=6, clock=clock)
+
+    for _ in range(4 + 5 + 6 + 6):
+        limiter.acquire()
+        limiter.release(200)
+    assert limiter.limit == 6
+
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(429, retry_after=2.0)
+    # Requests sent before the pause started don't cut the limit again
+    limiter.release(429, retry_after=2.0)
+    limiter.release(200)
+
+    assert limiter.limit == 3
+    assert limiter.resume_at == pytest.approx(102.0)
+    assert limiter.stats()["throttled"] == 2
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert retry_after_seconds("3") == 3.0
+    assert retry_after_seconds("0.5") == 0.5
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480) == 10.0
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds(None) is None
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Answers slowly, and with 429s for a while once enough requests arrived"""
+
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    latency = 0.01
+    throttle_after = 10
+    throttle_for = 0.3
+    received = 0
+    throttled_until = 0.0
+    log = []
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        cls = type(self)
+        with cls.lock:
+            cls.received += 1
+            now = time.monotonic()
+            if cls.received == cls.throttle_after:
+                cls.throttled_until = now + cls.throttle_for
+            throttled = now < cls.throttled_until
+            cls.log.append((now, throttled))
+        if throttled:
+            body = b'{"error": {"status": 429}}'
+            self.send_response(429)
+            self.send_header("Retry-After", f"{cls.throttled_until - now:.3f}")
+        else:
+            body = b'{"ok": true}'
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    ThrottlingHandler.received = 0
+    ThrottlingHandler.throttled_until = 0.0
+    ThrottlingHandler.log = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_throttled_requests_wait_out_retry_after(server):
+    pytest.importorskip("requests")
+    pytest.importorskip("spotipy")
+    from spotify_session import ConnectionStats, build_http_session
+
+    limiter = AdaptiveLimiter(rate=200, burst=20, initial=4, maximum=8)
+    session = build_http_session(ConnectionStats(), limiter)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(lambda i: session.get(f"{server}/v1/items/{i}"), range(40)))
+
+    assert all(response.status_code == 200 for response in responses)
+    stats = limiter.stats()
+    # Only the requests already in flight when the throttling began see a
+    # 429; everything else waits for the Retry-After
+    assert 1 <= stats["throttled"] <= 8
+    assert stats["requests"] == 40 + stats["throttled"]
+    assert stats["requests_per_second"] > 0
+    first_429 = min(t for t, throttled in ThrottlingHandler.log if throttled)
+    resumed = [t for t, throttled in ThrottlingHandler.log if t > first_429 and not throttled]
+    assert min(resumed) >= first_429 + ThrottlingHandler.throttle_for - 0.05
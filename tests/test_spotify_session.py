@@ -0,0 +1,95 @@
+"""Tests for the shared Spotify session: connection reuse and token refresh."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("spotipy")
+
+from spotify_session import ConnectionStats, SpotifySession, build_http_session
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_reuses_connections(server):
+    stats = ConnectionStats()
+    session = build_http_session(stats)
+
+    for _ in range(10):
+        assert session.get(f"{server}/v1/me").json() == {"ok": True}
+
+    assert stats.reset() == {"connections": 1, "requests": 10}
+    assert stats.reset() == {"connections": 0, "requests": 0}
+
+
+class FakeCacheHandler:
+    def __init__(self, token_info):
+        self.token_info = token_info
+
+    def get_cached_token(self):
+        return self.token_info
+
+
+class FakeAuthManager:
+    def __init__(self, expires_in):
+        self.cache_handler = FakeCacheHandler({
+            "access_token": "old",
+            "refresh_token": "refresh",
+            "expires_at": int(time.time()) + expires_in,
+        })
+        self.refreshed = 0
+
+    def refresh_access_token(self, refresh_token):
+        self.refreshed += 1
+        self.cache_handler.token_info = {
+            "access_token": "new",
+            "refresh_token": refresh_token,
+            "expires_at": int(time.time()) + 3600,
+        }
+
+    def get_access_token(self, as_dict=False):
+        return self.cache_handler.token_info["access_token"]
+
+
+def test_token_is_refreshed_before_expiry():
+    auth = FakeAuthManager(expires_in=60)
+    session = SpotifySession(auth_manager=auth)
+
+    client = session.get_client()
+    session.get_client()
+
+    assert auth.refreshed == 1
+    assert client is session.client
+
+
+def test_fresh_token_is_left_alone():
+    auth = FakeAuthManager(expires_in=3600)
+    SpotifySession(auth_manager=auth).get_client()
+
+    assert auth.refreshed == 0
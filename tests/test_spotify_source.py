@@ -0,0 +1,177 @@
+"""Tests for paged Spotify playlist fetching against a stubbed client."""
+
+import threading
+import time
+
+from spotify_cache import PlaylistListingCache, PlaylistTrackCache
+from spotify_source import (
+    PAGE_SIZE,
+    TRACK_FIELDS,
+    fetch_playlist_tracks,
+    fetch_playlist_tracks_cached,
+    fetch_user_playlists_cached,
+    track_summary,
+)
+
+
+class StubSpotify:
+    """Serves playlist_items pages from an in-memory playlist"""
+
+    def __init__(self, total, latency=0.0, playlists=0):
+        self.items = [
+            {"track": {"name": f"Song {i}", "uri": f"spotify:track:{i}"}}
+            for i in range(total)
+        ]
+        self.playlists = [
+            {"name": f"Mix {i}", "uri": f"spotify:playlist:{i}", "snapshot_id": "s"}
+            for i in range(playlists)
+        ]
+        self.latency = latency
+        self.snapshot_id = "snap-1"
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def playlist(self, playlist_id, fields=None):
+        with self.lock:
+            self.calls.append({"fields": fields})
+        return {"snapshot_id": self.snapshot_id}
+
+    def current_user_playlists(self, limit=50, offset=0):
+        with self.lock:
+            self.calls.append({"limit": limit, "offset": offset})
+        return {
+            "total": len(self.playlists),
+            "items": self.playlists[offset:offset + limit],
+        }
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0):
+        with self.lock:
+            self.calls.append({"fields": fields, "limit": limit, "offset": offset})
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        return {
+            "total": len(self.items),
+            "items": self.items[offset:offset + limit],
+        }
+
+
+def test_fetch_requests_only_needed_fields():
+    sp = StubSpotify(total=30)
+
+    tracks = fetch_playlist_tracks(sp, "spotify:playlist:abc")
+
+    assert len(tracks) == 30
+    assert sp.calls == [{"fields": TRACK_FIELDS, "limit": PAGE_SIZE, "offset": 0}]
+
+
+def test_pages_are_fetched_concurrently_and_merged_in_order():
+    sp = StubSpotify(total=5_000, latency=0.02)
+
+    start = time.perf_counter()
+    tracks = fetch_playlist_tracks(sp, "spotify:playlist:abc", max_workers=8)
+    elapsed = time.perf_counter() - start
+
+    assert [t["track"]["uri"] for t in tracks] == [
+        f"spotify:track:{i}" for i in range(5_000)
+    ]
+    assert len(sp.calls) == 50
+    assert 1 < sp.max_in_flight <= 8
+    # 50 serial pages would take at least a second
+    assert elapsed < 50 * 0.02 / 2
+
+
+def test_unavailable_tracks_are_skipped():
+    sp = StubSpotify(total=3)
+    sp.items[1]["track"] = None
+
+    tracks = fetch_playlist_tracks(sp, "spotify:playlist:abc")
+
+    assert [t["track"]["name"] for t in tracks] == ["Song 0", "Song 2"]
+
+
+def test_track_summary_flattens_identity_fields():
+    track = {
+        "name": "Get Lucky",
+        "uri": "spotify:track:1",
+        "duration_ms": 369_000,
+        "artists": [{"name": "Daft Punk"}, {"name": "Pharrell Williams"}],
+        "external_ids": {"isrc": "USQX91300108"},
+    }
+
+    assert track_summary(track) == {
+        "uri": "spotify:track:1",
+        "name": "Get Lucky",
+        "artist": "Daft Punk, Pharrell Williams",
+        "duration": 369.0,
+        "isrc": "USQX91300108",
+    }
+    # Local files have no ISRC and may have no duration
+    assert track_summary({"name": "Demo", "uri": "spotify:local:x"})["isrc"] is None
+
+
+def test_unchanged_snapshot_is_served_from_cache(tmp_path):
+    sp = StubSpotify(total=250)
+    cache = PlaylistTrackCache(tmp_path)
+
+    items, cached = fetch_playlist_tracks_cached(sp, "spotify:playlist:abc", cache)
+    assert not cached and len(items) == 250
+    assert len(sp.calls) == 4
+
+    # A later run (new cache object, same directory) only asks for the snapshot_id
+    sp.calls.clear()
+    cache = PlaylistTrackCache(tmp_path)
+    items, cached = fetch_playlist_tracks_cached(sp, "spotify:playlist:abc", cache)
+    assert cached and len(items) == 250
+    assert sp.calls == [{"fields": "snapshot_id"}]
+    assert cache.stats()["hits"] == 1
+
+
+def test_changed_snapshot_or_invalidation_refetches(tmp_path):
+    sp = StubSpotify(total=10)
+    cache = PlaylistTrackCache(tmp_path)
+    fetch_playlist_tracks_cached(sp, "spotify:playlist:abc", cache)
+
+    sp.snapshot_id = "snap-2"
+    sp.items.pop()
+    items, cached = fetch_playlist_tracks_cached(sp, "spotify:playlist:abc", cache)
+    assert not cached and len(items) == 9
+
+    assert cache.invalidate() == 1
+    _, cached = fetch_playlist_tracks_cached(sp, "spotify:playlist:abc", cache)
+    assert not cached
+    assert cache.stats()["misses"] == 3
+
+
+def test_playlist_listing_reads_every_page(tmp_path):
+    sp = StubSpotify(total=0, playlists=230)
+    cache = PlaylistListingCache(tmp_path / "listing.json")
+
+    playlists, cached = fetch_user_playlists_cached(sp, cache)
+
+    assert not cached
+    assert [p["name"] for p in playlists] == [f"Mix {i}" for i in range(230)]
+    assert sorted(call["offset"] for call in sp.calls) == [0, 50, 100, 150, 200]
+
+
+def test_playlist_listing_is_cached_until_ttl(tmp_path):
+    sp = StubSpotify(total=0, playlists=3)
+    fetch_user_playlists_cached(sp, PlaylistListingCache(tmp_path / "listing.json"))
+    sp.calls.clear()
+
+    # A new process with a warm cache makes no API calls
+    cache = PlaylistListingCache(tmp_path / "listing.json")
+    playlists, cached = fetch_user_playlists_cached(sp, cache)
+    assert cached and len(playlists) == 3
+    assert sp.calls == []
+
+    _, cached = fetch_user_playlists_cached(sp, cache, refresh=True)
+    assert not cached
+
+    expired = PlaylistListingCache(tmp_path / "listing.json", ttl=-1)
+    _, cached = fetch_user_playlists_cached(sp, expired)
+    assert not cached
@@ -0,0 +1,41 @@
+"""Tests that the entry points start without loading service clients."""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only: the Music app bridge, the Spotify client and
+# its HTTP stack, NumPy, colorama and the profiler
+LAZY_MODULES = ("appscript", "spotipy", "requests", "numpy", "colorama", "cProfile")
+
+
+def loaded_after_import(module):
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return set(json.loads(output))
+
+
+def test_entry_points_import_without_service_clients():
+    for module in ("sync_plan", "update_playlist", "selection", "matching"):
+        assert not loaded_after_import(module) & set(LAZY_MODULES), module
+
+
+def test_showing_a_plan_leaves_the_sync_stack_unloaded(tmp_path):
+    plan = tmp_path / "plan.json"
+    plan.write_text(json.dumps({"version": 1, "playlists": []}))
+    code = (
+        "import json, sys, sync_plan; "
+        f"sync_plan.main(['show', {str(plan)!r}]); "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    loaded = set(json.loads(output.splitlines()[-1]))
+
+    assert not loaded & {"update_playlist", "sqlite3", "difflib", "concurrent.futures", "subprocess"}
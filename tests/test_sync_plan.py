@@ -0,0 +1,202 @@
+"""Tests for applying sync plans against an in-process Music backend."""
+
+import json
+
+import pytest
+
+import update_playlist
+from benchmarks import isolated_sync_state
+from music_backend import FakeMusicBackend
+from spotify_source import FakeSpotifyClient, spotify_track
+from sync_plan import (
+    OK_OUTCOMES,
+    apply_plan,
+    load_options,
+    load_plan,
+    main,
+    new_plan,
+    save_plan,
+    summary_rows,
+    sync_playlists,
+)
+from timing import StageTimer
+
+
+@pytest.fixture
+def backend(sync_state):
+    tracks = [
+        {"persistent_id": pid, "name": name, "artist": "Artist", "duration": 200.0}
+        for pid, name in [("P1", "Intro"), ("P2", "Home"), ("P3", "Old Song"), ("P4", "Gone")]
+    ]
+    return FakeMusicBackend(tracks, {"Mix": ["P1", "P3", "P4"]})
+
+
+def make_plan():
+    return {
+        "version": 1,
+        "created_at": "2026-01-01T00:00:00+0000",
+        "options": {"removal_policy": "library", "auto_add_threshold": 1.0},
+        "playlists": [
+            {
+                "name": "Mix",
+                "spotify_uri": "spotify:playlist:mix",
+                "add": [{
+                    "spotify_uri": "spotify:track:home", "name": "Home", "artist": "Artist",
+                    "duration": 200, "track": "P2", "score": 1.0,
+                }],
+                "skipped": [],
+                "remove": [
+                    {"persistent_id": "P3", "name": "Old Song", "artist": "Artist"},
+                    {"persistent_id": "P4", "name": "Gone", "artist": "Artist"},
+                ],
+                "delete_from_library": [
+                    {"persistent_id": "P4", "name": "Gone", "artist": "Artist", "score": 16},
+                ],
+                "needs_review": [],
+                "ambiguous": [],
+            },
+            {"name": "Missing", "error": "not in both services"},
+        ],
+    }
+
+
+def test_plan_round_trips_through_json(tmp_path):
+    path = tmp_path / "plan.json"
+    save_plan(make_plan(), path)
+
+    assert load_plan(path) == make_plan()
+
+
+def test_apply_is_replayable(backend):
+    plan = make_plan()
+
+    report = apply_plan(plan, backend=backend)
+
+    assert report == {"Mix": [
+        ("add", "Home - Artist", "done"),
+        ("remove", "Old Song - Artist", "done"),
+        ("remove", "Gone - Artist", "done"),
+        ("delete", "Gone - Artist", "done"),
+    ]}
+    assert backend.playlists["Mix"] == ["P1", "P2"]
+    assert [t["persistent_id"] for t in backend.tracks] == ["P1", "P2", "P3"]
+
+    # The second apply finds everything done and makes no changes
+    events = backend.event_count
+    report = apply_plan(plan, backend=backend)
+
+    assert {outcome for _, _, outcome in report["Mix"]} == {"already done"}
+    assert backend.calls["add_playlist_tracks"] == 1
+    assert backend.playlists["Mix"] == ["P1", "P2"]
+    # Only the library and playlist reads
+    assert backend.event_count - events == 5
+
+
+def test_dry_run_changes_nothing(backend):
+    report = apply_plan(make_plan(), dry_run=True, backend=backend)
+
+    assert {outcome for _, _, outcome in report["Mix"]} == {"would do"}
+    assert backend.calls["add_playlist_tracks"] == 0
+    assert backend.playlists["Mix"] == ["P1", "P3", "P4"]
+    assert len(backend.tracks) == 4
+
+
+def test_flags_override_the_config_file(tmp_path):
+    config = tmp_path / "sync.json"
+    config.write_text(json.dumps({"playlists": ["Mix"], "removal_policy": "playlist"}))
+
+    options = load_options(config, removal_policy="library", auto_add_threshold=None)
+
+    assert options == {
+        "playlists": ["Mix"],
+        "removal_policy": "library",
+        "auto_add_threshold": 1.0,
+        "dry_run": False,
+    }
+    with pytest.raises(ValueError):
+        load_options(None, removal_policy="everything")
+
+
+def test_summary_counts_failures_per_playlist(backend):
+    backend.tracks = [t for t in backend.tracks if t["persistent_id"] != "P2"]
+    plan = make_plan()
+
+    report = apply_plan(plan, backend=backend)
+    rows = summary_rows(plan, report)
+
+    assert ("add", "Home - Artist", "library track is gone") in report["Mix"]
+    assert rows[1] == ["Mix", "1", "2", "1", "0", "0", "1", "", ""]
+    assert rows[2][:2] == ["Missing", "error: not in both services"]
+
+
+def test_show_summarizes_a_saved_plan(tmp_path, capsys):
+    plan = new_plan(load_options())
+    plan["playlists"].append({
+        "name": "Mix", "add": [{}, {}], "remove": [], "delete_from_library": [],
+        "skipped": [], "needs_review": [{}], "ambiguous": [],
+    })
+    save_plan(plan, tmp_path / "plan.json")
+
+    assert main(["show", str(tmp_path / "plan.json")]) == 0
+    header, row = capsys.readouterr().out.split("\n")[1:3]
+    assert header.split()[:3] == ["playlist", "add", "remove"]
+    assert row.split()[:3] == ["Mix", "2", "0"]
+
+
+def test_playlists_planned_and_applied_concurrently(tmp_path, monkeypatch):
+    backend = FakeMusicBackend.synthetic(3000, playlist_count=12, playlist_size=120, seed=3)
+    by_id = {track["persistent_id"]: track for track in backend.tracks}
+    others = list(by_id)
+    playlists = {}
+    for i, (name, ids) in enumerate(backend.playlists.items()):
+        # Drop a few tracks and add as many from elsewhere in the library
+        added = others[i * 10:i * 10 + 10]
+        tracks = [spotify_track(by_id[pid]) for pid in ids[10:] + added]
+        # One song per playlist is only a file in the Music folder
+        tracks.append(spotify_track({"persistent_id": f"F{i}", "name": "Demo", "artist": "Band"}))
+        playlists[f"spotify:playlist:{i}"] = {"name": name, "tracks": tracks}
+    music_dir = tmp_path / "Music"
+    (music_dir / "Band").mkdir(parents=True)
+    (music_dir / "Band" / "Demo Tape.m4a").write_bytes(b"")
+    monkeypatch.setattr(update_playlist, "MUSIC_DIR", str(music_dir))
+    opened = []
+    open_media_index = update_playlist.open_media_index
+    monkeypatch.setattr(
+        update_playlist, "open_media_index", lambda d: opened.append(d) or open_media_index(d)
+    )
+    options = load_options(None, removal_policy="playlist")
+
+    with isolated_sync_state(backend, FakeSpotifyClient(playlists), str(tmp_path)):
+        plan, runs = sync_playlists(options, StageTimer(), apply=True, workers=8)
+
+    assert [run.error for run in runs.values()] == [None] * 12
+    # Opened before the planning threads started, not once per thread
+    assert opened == [str(music_dir)]
+    assert all(entry["add"] and entry["remove"] for entry in plan["playlists"])
+    for name, results in ((name, run.result) for name, run in runs.items()):
+        failed = [r for r in results if r[2] not in OK_OUTCOMES]
+        assert not failed, name
+
+
+def test_music_folder_files_are_never_added_without_review(tmp_path, monkeypatch):
+    intro = {"persistent_id": "P1", "name": "Intro", "artist": "Artist", "duration": 200.0}
+    backend = FakeMusicBackend([intro], {"Mix": ["P1"]})
+    tracks = [
+        spotify_track(intro),
+        spotify_track({"persistent_id": "X", "name": "Home", "artist": "Real Artist"}),
+    ]
+    music_dir = tmp_path / "Music"
+    (music_dir / "Real Artist" / "LP").mkdir(parents=True)
+    (music_dir / "Real Artist" / "LP" / "03 Home.m4a").write_bytes(b"")
+    monkeypatch.setattr(update_playlist, "MUSIC_DIR", str(music_dir))
+    spotify = FakeSpotifyClient({"spotify:playlist:mix": {"name": "Mix", "tracks": tracks}})
+
+    with isolated_sync_state(backend, spotify, str(tmp_path)):
+        plan, _ = sync_playlists(load_options(), StageTimer(), workers=1)
+
+    entry = plan["playlists"][0]
+    assert entry["add"] == []
+    [skipped] = entry["skipped"]
+    assert skipped["track"] == str(music_dir / "Real Artist" / "LP" / "03 Home.m4a")
+    assert skipped["score"] == 1.0
+    assert skipped["reason"] == "Music folder file, needs review"
@@ -0,0 +1,87 @@
+"""Tests for concurrent planning with a single apply writer."""
+
+import threading
+import time
+
+from sync_scheduler import schedule
+
+
+class Recorder:
+    """Tracks how many calls of each step overlap and which threads apply"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {"plan": 0, "apply": 0}
+        self.peak = {"plan": 0, "apply": 0}
+        self.apply_threads = set()
+        self.applied = []
+
+    def enter(self, step):
+        with self.lock:
+            self.running[step] += 1
+            self.peak[step] = max(self.peak[step], self.running[step])
+
+    def leave(self, step):
+        with self.lock:
+            self.running[step] -= 1
+
+    def plan(self, item):
+        self.enter("plan")
+        try:
+            time.sleep(0.01)
+            if item == "broken":
+                raise RuntimeError("Spotify is down")
+            return f"plan of {item}"
+        finally:
+            self.leave("plan")
+
+    def apply(self, item, plan):
+        self.enter("apply")
+        try:
+            self.apply_threads.add(threading.get_ident())
+            time.sleep(0.005)
+            self.applied.append(item)
+            if item == "locked":
+                raise PermissionError("playlist is not editable")
+            return plan.upper()
+        finally:
+            self.leave("apply")
+
+
+def test_plans_run_concurrently_and_applies_one_at_a_time():
+    recorder = Recorder()
+    items = [f"playlist {i}" for i in range(12)]
+
+    runs = schedule(items, recorder.plan, recorder.apply, workers=4)
+
+    assert list(runs) == items
+    assert all(runs[item].result == f"PLAN OF {item}".upper() for item in items)
+    assert 1 < recorder.peak["plan"] <= 4
+    assert recorder.peak["apply"] == 1
+    assert len(recorder.apply_threads) == 1
+    assert threading.get_ident() not in recorder.apply_threads
+
+
+def test_failures_are_reported_per_item():
+    recorder = Recorder()
+
+    runs = schedule(["ok", "broken", "locked"], recorder.plan, recorder.apply, workers=2)
+
+    assert runs["ok"].error is None and runs["ok"].result == "PLAN OF OK"
+    # A failed plan is never applied
+    assert runs["broken"].plan is None
+    assert runs["broken"].error == "Spotify is down"
+    assert "broken" not in recorder.applied
+    assert runs["locked"].plan == "plan of locked"
+    assert runs["locked"].result is None
+    assert runs["locked"].error == "playlist is not editable"
+
+
+def test_plan_only():
+    recorder = Recorder()
+
+    runs = schedule(["a", "b"], recorder.plan, workers=2)
+
+    assert {item: run.plan for item, run in runs.items()} == {"a": "plan of a", "b": "plan of b"}
+    assert recorder.applied == []
+    assert all(run.apply_seconds == 0.0 for run in runs.values())
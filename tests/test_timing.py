@@ -0,0 +1,80 @@
+"""Tests for stage timing and concurrent stage execution."""
+
+import json
+import pstats
+import time
+
+import pytest
+
+from timing import StageTimer, count, counters, profiled, run_concurrently, write_metrics
+
+
+def test_stages_run_in_parallel_and_are_timed():
+    timer = StageTimer()
+
+    def slow(value):
+        time.sleep(0.1)
+        return value
+
+    start = time.perf_counter()
+    results = run_concurrently(timer, {
+        "apple": lambda: slow("a"),
+        "spotify": lambda: slow("s"),
+    })
+    elapsed = time.perf_counter() - start
+
+    assert results == {"apple": "a", "spotify": "s"}
+    assert elapsed < 0.18
+    assert sorted(name for name, _ in timer.stages) == ["apple", "spotify"]
+    assert all(seconds >= 0.1 for _, seconds in timer.stages)
+    assert timer.report()[-1].startswith("total")
+
+
+def test_task_errors_are_raised():
+    def fail():
+        raise ValueError("playlist missing")
+
+    with pytest.raises(ValueError):
+        run_concurrently(StageTimer(), {"ok": lambda: 1, "broken": fail})
+
+
+def test_counters_add_up_and_reset():
+    counters(reset=True)
+    count("osascript launches")
+    count("osascript launches", 2)
+
+    assert counters(reset=True) == {"osascript launches": 3}
+    assert counters() == {}
+
+
+def busy_helper():
+    return sum(range(10_000))
+
+
+def test_profile_includes_concurrent_tasks(tmp_path):
+    path = tmp_path / "run.prof"
+
+    with profiled(str(path)):
+        run_concurrently(StageTimer(), {"a": busy_helper, "b": busy_helper})
+
+    stats = pstats.Stats(str(path)).stats
+    calls = [
+        call_count for (_, _, function), (_, call_count, *_) in stats.items()
+        if function == "busy_helper"
+    ]
+    # Both calls ran on worker threads, which the block's own profiler can't see
+    assert calls == [2]
+
+
+def test_metrics_summary_is_json(tmp_path):
+    timer = StageTimer()
+    with timer.stage("library lookups"):
+        pass
+    path = tmp_path / "run.json"
+
+    write_metrics(path, timer, apple_events=12)
+
+    data = json.loads(path.read_text())
+    assert data["apple_events"] == 12
+    assert [stage["name"] for stage in data["stages"]] == ["library lookups"]
+    assert "counters" in data and data["total_seconds"] >= 0
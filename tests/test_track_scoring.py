@@ -0,0 +1,133 @@
+"""Tests for the batch scorer that matches removed playlist tracks to library tracks."""
+
+import random
+import time
+
+import pytest
+
+from conftest import make_track
+from library_index import LibraryIndex
+from matching import normalize_string, strings_match
+from track_scoring import LibraryColumns, numpy_module, score_tracks
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(numpy_module() is None, reason="needs numpy"))]
+
+
+def reference_matches(track, index):
+    """The per-track scoring loop the batch scorer replaces"""
+    matches = []
+    for record in index.lookup(track["name"]):
+        score = 5 if strings_match(record["name"], track["name"], strict=True) else 3
+        if strings_match(record["artist"], track["artist"], strict=True):
+            score += 4
+        elif record["norm_artist"] == normalize_string(track["artist"]):
+            score += 2
+        if strings_match(record["album"], track["album"], strict=True):
+            score += 3
+        elif strings_match(record["album"], track["album"]):
+            score += 1
+        if abs(record["duration"] - track["duration"]) <= 1:
+            score += 2
+        if record["track_number"] == track["track_number"]:
+            score += 1
+        if record["disc_number"] == track["disc_number"]:
+            score += 1
+        if score >= 7:
+            matches.append((score, record))
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return matches
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_scores_use_the_same_weights_and_threshold(use_numpy):
+    index = LibraryIndex([
+        make_track("L1", "Heroes", "David Bowie", album="Heroes", duration=371.0, track_number=3),
+        make_track("L2", "heroes", "DAVID BOWIE", album="Best Of", duration=210.0, track_number=9),
+        make_track("L3", "Héroes", "Someone Else", album="Other", duration=100.0, track_number=2, disc_number=2),
+        make_track("L4", "Changes", "David Bowie", album="Hunky Dory"),
+    ])
+    library = LibraryColumns(index, use_numpy=use_numpy)
+
+    query = make_track("P1", "Heroes", "David Bowie", album="Heroes", duration=371.6, track_number=3)
+    [matches] = score_tracks([query], library)
+
+    # L1 matches everything; L2 only name, artist (case-folded) and disc;
+    # L3 only the normalized name, which is below the threshold
+    assert [(score, r["persistent_id"]) for score, r in matches] == [(16, "L1"), (10, "L2")]
+    assert score_tracks([make_track("P2", "Unknown", "Nobody")], library) == [[]]
+
+
+def test_columns_reuse_the_normalized_library_strings(monkeypatch):
+    index = LibraryIndex([make_track("L1", "Héroes", "David Bowie", album="Heroes")])
+    normalized = []
+    monkeypatch.setattr("track_scoring.normalize_string", lambda value: normalized.append(value) or value)
+
+    library = LibraryColumns(index)
+
+    # Normalized once when indexed, not again for the columns
+    assert normalized == []
+    assert len(library) == 1
+
+
+@pytest.mark.parametrize("use_numpy", BACKENDS)
+def test_batch_scores_match_per_track_loop(use_numpy):
+    rng = random.Random(3)
+    titles = ["Intro", "intro", "Home", "Café", "Cafe", "Love Song", "Outro"]
+    artists = ["The xx", "the XX", "M83", "Jungle"]
+
+    def random_track(pid):
+        return make_track(
+            pid,
+            rng.choice(titles),
+            rng.choice(artists),
+            album=rng.choice(["A", "a", "B"]),
+            duration=float(rng.randint(198, 203)),
+            track_number=rng.randint(1, 3),
+            disc_number=rng.randint(1, 2),
+        )
+
+    index = LibraryIndex([random_track(f"L{i}") for i in range(300)])
+    queries = [random_track(f"Q{i}") for i in range(50)]
+
+    batch = score_tracks(queries, LibraryColumns(index, use_numpy=use_numpy))
+
+    for query, matches in zip(queries, batch):
+        assert matches == reference_matches(query, index)
+
+
+def test_removing_hundreds_of_tracks_benchmark():
+    rng = random.Random(5)
+    words = "love night home intro light dark fire water dream heart gold river".split()
+    index = LibraryIndex([
+        make_track(
+            f"L{i}",
+            " ".join(rng.choice(words) for _ in range(2)),
+            f"Artist {i % 500}",
+            album=f"Album {i % 2000}",
+            duration=float(rng.randint(120, 400)),
+            track_number=rng.randint(1, 12),
+        )
+        for i in range(20_000)
+    ])
+    queries = rng.sample(list(index), 500)
+
+    start = time.perf_counter()
+    expected = [reference_matches(query, index) for query in queries]
+    loop_time = time.perf_counter() - start
+
+    # The columns are built once per library snapshot
+    start = time.perf_counter()
+    library = LibraryColumns(index)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = score_tracks(queries, library)
+    batch_time = time.perf_counter() - start
+
+    print(
+        f"\n500 removals against 20000 tracks: per-track loop {loop_time * 1000:.0f}ms, "
+        f"columns {build_time * 1000:.0f}ms, batch {batch_time * 1000:.0f}ms "
+        f"({'numpy' if numpy_module() is not None else 'python'})"
+    )
+    assert batch == expected
+    assert batch_time < loop_time
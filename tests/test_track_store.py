@@ -0,0 +1,66 @@
+"""Tests for the compact library track records and their memory use."""
+
+import tracemalloc
+
+from library_catalog import LibraryCatalog
+from library_index import LibraryIndex
+from music_backend import synthetic_library
+from matching import core_title, normalize_string
+from track_store import LibraryTrack
+
+# Bytes per track of the library snapshot get_library_index() keeps: the
+# LibraryIndex with its records. Measured at about 1250, of which the
+# records take about 400 (a dict per track would take about 700)
+SNAPSHOT_BUDGET = 1400
+
+
+def test_tracks_read_and_write_like_dicts():
+    track = LibraryTrack("ID1", "Song", "Artist", "Album", 180.0, 1, 1)
+
+    assert track["name"] == "Song"
+    assert track.get("norm_name") is None
+    assert "norm_name" not in track
+    track["norm_name"] = "song"
+    assert "norm_name" in track
+    assert track.as_dict() == {
+        "persistent_id": "ID1", "name": "Song", "artist": "Artist", "album": "Album",
+        "duration": 180.0, "track_number": 1, "disc_number": 1, "norm_name": "song",
+    }
+    copy = LibraryTrack.from_record(track.as_dict())
+    assert copy.as_dict() == track.as_dict()
+    assert copy != track
+
+
+def test_artist_and_album_strings_are_shared():
+    first = LibraryTrack("ID1", "One", "".join(["Art", "ist"]), "".join(["Al", "bum"]), 1.0, 1, 1)
+    second = LibraryTrack("ID2", "Two", "".join(["Art", "ist"]), "".join(["Al", "bum"]), 1.0, 2, 1)
+
+    assert first["artist"] is second["artist"]
+    assert first["album"] is second["album"]
+
+
+def test_100k_track_snapshot_fits_the_memory_budget(tmp_path):
+    tracks, _ = synthetic_library(100_000)
+    catalog = LibraryCatalog(tmp_path / "library.sqlite3")
+    # Filled directly: a refresh would normalize every title twice over
+    catalog.conn.executemany(
+        "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (t["persistent_id"], t["name"], t["artist"], t["album"], t["duration"],
+             t["track_number"], t["disc_number"], None,
+             normalize_string(t["name"]), normalize_string(t["artist"]),
+             normalize_string(t["album"]), core_title(t["name"]))
+            for t in tracks
+        ],
+    )
+    del tracks
+
+    tracemalloc.start()
+    try:
+        index = LibraryIndex(catalog.records())
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(index) == 100_000
+    assert size / len(index) < SNAPSHOT_BUDGET
@@ -0,0 +1,107 @@
+"""Tests for the interactive sync's lookups and prompts."""
+
+import pytest
+
+import update_playlist
+from music_backend import FakeMusicBackend
+from spotify_source import spotify_track, track_summary
+from timing import StageTimer
+
+
+@pytest.fixture
+def backend(sync_state):
+    tracks = [
+        {"persistent_id": "N1", "name": "Nocturne No. 1", "artist": "Chopin", "album": "Nocturnes"},
+        {"persistent_id": "H1", "name": "Home (Remastered)", "artist": "Artist", "album": "Best Of"},
+    ]
+    backend = FakeMusicBackend(tracks, {"Mix": []})
+    update_playlist.set_music_backend(backend)
+    return backend
+
+
+def test_numbered_sibling_is_not_found(backend):
+    assert update_playlist.song_exists("Nocturne No. 2", "Chopin") == []
+
+
+def test_add_prompt_names_the_track_of_a_near_match(backend, monkeypatch, capsys):
+    [(pid, _, _, _, score)] = update_playlist.song_exists("Home", "Artist")
+    questions = []
+    monkeypatch.setattr("builtins.input", lambda question: questions.append(question) or "yes")
+
+    added = update_playlist.add_songs_to_apple_playlist(
+        "Mix", {"Home - Artist": pid}, scores={"Home - Artist": score}
+    )
+
+    assert added == {"Home - Artist": True}
+    assert backend.playlists["Mix"] == ["H1"]
+    assert "would add 'Home (Remastered)' by Artist from 'Best Of'" in capsys.readouterr().out
+    assert len(questions) == 1
+
+
+def test_near_matches_are_remembered_only_once_added(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(update_playlist, "MUSIC_DIR", str(tmp_path / "Music"))
+    home, chopin = (
+        track_summary(spotify_track({"persistent_id": pid, "name": name, "artist": artist}))
+        for pid, name, artist in [("S1", "Home", "Artist"), ("S2", "Nocturne No. 1", "Chopin")]
+    )
+    cache = update_playlist.get_match_cache()
+    library = update_playlist.get_library_index()
+
+    found, _ = update_playlist.locate_tracks([home, chopin], {}, StageTimer())
+
+    # The exact match is stored right away, the near one isn't
+    assert set(cache.get_many([home["uri"], chopin["uri"]], library)) == {chopin["uri"]}
+    update_playlist.remember_added_matches(found, {"Home - Artist": False})
+    assert cache.get(home["uri"], library) is None
+
+    update_playlist.remember_added_matches(found, {"Home - Artist": True})
+    match = cache.get(home["uri"], library)
+    assert match["persistent_id"] == "H1" and match["confidence"] < 1.0
+
+
+def test_music_folder_file_needs_the_artist_folder(backend, tmp_path, monkeypatch):
+    music_dir = tmp_path / "Music"
+    (music_dir / "Someone Else" / "Album").mkdir(parents=True)
+    (music_dir / "Someone Else" / "Album" / "01 Intro.m4a").write_bytes(b"")
+    monkeypatch.setattr(update_playlist, "MUSIC_DIR", str(music_dir))
+    drake, someone = (
+        track_summary(spotify_track({"persistent_id": pid, "name": "Intro", "artist": artist}))
+        for pid, artist in [("S1", "Drake"), ("S2", "Someone Else")]
+    )
+
+    found, missing = update_playlist.locate_tracks([drake, someone], {}, StageTimer())
+
+    assert list(missing) == ["Intro - Drake"]
+    path = music_dir / "Someone Else" / "Album" / "01 Intro.m4a"
+    assert found["Intro - Someone Else"][1] == str(path)
+
+
+def test_pairs_on_a_similar_artist_are_not_remembered(backend, monkeypatch):
+    backend.tracks.append(
+        {"persistent_id": "B1", "name": "Help!", "artist": "Beatles", "album": "Help!", "duration": 139.0}
+    )
+    backend.playlists["Mix"] = ["H1", "B1"]
+    spotify_tracks = [
+        track_summary(spotify_track({"persistent_id": pid, "name": name, "artist": artist}))
+        for pid, name, artist in [("S1", "Home (Remastered)", "Artist"), ("S2", "Help!", "The Beatles")]
+    ]
+    monkeypatch.setattr(update_playlist, "get_spotify_playlist_tracks", lambda uri: spotify_tracks)
+
+    diff, _ = update_playlist.load_playlist_diff("Mix", "spotify:playlist:mix", StageTimer())
+
+    assert len(diff.matched) == 2
+    library = update_playlist.get_library_index()
+    stored = update_playlist.get_match_cache().get_many([t["uri"] for t in spotify_tracks], library)
+    assert list(stored) == [spotify_tracks[0]["uri"]]
+
+
+def test_music_folder_file_of_an_artist_sharing_only_an_article(backend, tmp_path, monkeypatch):
+    music_dir = tmp_path / "Music"
+    (music_dir / "The xx" / "Coexist").mkdir(parents=True)
+    (music_dir / "The xx" / "Coexist" / "01 Intro.m4a").write_bytes(b"")
+    monkeypatch.setattr(update_playlist, "MUSIC_DIR", str(music_dir))
+    weeknd = track_summary(spotify_track({"persistent_id": "S1", "name": "Intro", "artist": "The Weeknd"}))
+
+    found, missing = update_playlist.locate_tracks([weeknd], {}, StageTimer())
+
+    assert found == {} and list(missing) == ["Intro - The Weeknd"]
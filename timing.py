@@ -0,0 +1,162 @@
+"""
+Per-stage wall-clock timing for a sync run, plus the counters and the
+optional cProfile capture behind `--profile`.
+
+Counting is a locked increment and profiling is off unless profiled() is
+active, so instrumentation costs next to nothing in a normal run.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Process-wide counts of costly operations, e.g. "osascript launches"
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+# Profiles of the current profiled() block: the calling thread's first,
+# then one per run_concurrently task
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+class StageTimer:
+    """Collects how long each named stage of a run took"""
+
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages.append((name, elapsed))
+
+    def elapsed(self):
+        """Seconds since the timer was created"""
+        return time.perf_counter() - self._start
+
+    def report(self):
+        """Return the stage timings as printable lines"""
+        width = max([len(name) for name, _ in self.stages] + [len("total")])
+        lines = [f"{name:<{width}}  {seconds * 1000:9.1f} ms" for name, seconds in self.stages]
+        lines.append(f"{'total':<{width}}  {self.elapsed() * 1000:9.1f} ms")
+        return lines
+
+
+def count(name, amount=1):
+    """Add to a process-wide counter"""
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def counters(reset=False):
+    """Return the process-wide counters, zeroing them if reset is set"""
+    with _counters_lock:
+        values = dict(_counters)
+        if reset:
+            _counters.clear()
+    return values
+
+
+@contextmanager
+def profiled(path=None):
+    """
+    Profile the block with cProfile and write the stats to path.
+
+    Tasks run on other threads through run_profiled (run_concurrently does)
+    are profiled there and merged in. Without a path nothing is profiled.
+    """
+    global _profiles
+    if path is None:
+        yield
+        return
+    # Imported here: they take longer to load than the rest of this module
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    with _profiles_lock:
+        _profiles = [profiler]
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _profiles_lock:
+            profiles, _profiles = _profiles, None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+def run_profiled(task):
+    """
+    Call task, under its own profiler if a profiled() block is active.
+
+    cProfile only sees the thread that enabled it, so work handed to other
+    threads goes through here to show up in the profile.
+    """
+    if _profiles is None:
+        return task()
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler owns the interpreter (cProfile on Python 3.12+
+        # allows one at a time); run the task unprofiled
+        return task()
+    try:
+        return task()
+    finally:
+        profiler.disable()
+        with _profiles_lock:
+            if _profiles is not None:
+                _profiles.append(profiler)
+
+
+def write_metrics(path, timer, **metrics):
+    """Write a run's stage timings and other metrics as JSON"""
+    data = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "total_seconds": timer.elapsed(),
+        "stages": [{"name": name, "seconds": seconds} for name, seconds in timer.stages],
+        "counters": counters(),
+        **metrics,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def run_concurrently(timer, tasks):
+    """
+    Run independent stages at the same time on a thread pool.
+
+    Args:
+        timer (StageTimer): Records each task as a stage under its name
+        tasks (dict): {stage name: callable taking no arguments}
+
+    Returns:
+        dict: {stage name: return value}, once every task has finished.
+        If a task raised, its exception is re-raised here.
+    """
+
+    def run(name, task):
+        with timer.stage(name):
+            return run_profiled(task)
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = {name: pool.submit(run, name, task) for name, task in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,241 @@
+"""
+Scores library tracks against playlist tracks in bulk.
+
+Before a track removed from a playlist is deleted from the library, its
+playlist metadata (name, artist, album, duration, track and disc number) is
+compared with the library tracks of the same normalized title. The library
+is laid out once as integer-coded columns, sorted by title, so the scores of
+every (playlist track, candidate) pair are computed together with NumPy
+instead of one dict comparison at a time. Without NumPy the same columns
+are scored in a plain Python loop. NumPy is imported on first use, so
+importing this module stays cheap for runs that never score.
+"""
+
+from collections import defaultdict
+from itertools import count
+
+from matching import normalize_string
+
+# Lowest score counted as a match: a title match plus either a strict artist
+# match or several other matching properties
+MATCH_THRESHOLD = 7
+
+NAME_EXACT, NAME_NORMALIZED = 5, 3
+ARTIST_EXACT, ARTIST_NORMALIZED = 4, 2
+ALBUM_EXACT, ALBUM_NORMALIZED = 3, 1
+DURATION_MATCH = 2
+TRACK_NUMBER_MATCH = 1
+DISC_NUMBER_MATCH = 1
+
+# Durations this many seconds apart still count as the same
+DURATION_TOLERANCE = 1
+
+_STRING_COLUMNS = ("name", "artist", "album")
+_NUMBER_COLUMNS = ("duration", "track_number", "disc_number")
+
+# numpy once imported, None if it isn't installed; False until first use
+_numpy = False
+
+
+def numpy_module():
+    """Return numpy, importing it on first call, or None if it isn't installed"""
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def _number(value):
+    # appscript returns k.missing_value for unset properties
+    return float(value) if isinstance(value, (int, float)) else float("nan")
+
+
+def _strings(values):
+    return [value if isinstance(value, str) else "" for value in values]
+
+
+def _string_forms(values):
+    """Case-folded (strict) and normalized form of each value of a string column"""
+    strings = _strings(values)
+    return [value.lower() for value in strings], [normalize_string(value) for value in strings]
+
+
+class LibraryColumns:
+    """
+    Library track records as columns for batch scoring.
+
+    Strings are replaced by integer codes from one shared vocabulary, so
+    comparing two strings is comparing two integers. Rows are sorted by the
+    normalized title code, which keeps each title's candidates contiguous.
+
+    Records are those of a LibraryIndex, which normalized their title,
+    artist and album when they were indexed; only the case-folded forms
+    are computed here.
+    """
+
+    def __init__(self, records, use_numpy=None):
+        self.use_numpy = numpy_module() is not None if use_numpy is None else use_numpy
+        records = list(records)
+        # Unseen strings get the next code as they are looked up
+        vocabulary = self._vocabulary = defaultdict(count().__next__)
+        columns = {}
+        for prop in _STRING_COLUMNS:
+            columns[f"{prop}_norm"] = [vocabulary[record[f"norm_{prop}"]] for record in records]
+            columns[f"{prop}_strict"] = [
+                vocabulary[value.lower()] for value in _strings(record[prop] for record in records)
+            ]
+        for prop in _NUMBER_COLUMNS:
+            columns[prop] = [_number(record[prop]) for record in records]
+
+        # Stable, so tracks with the same title stay in library order
+        order = sorted(range(len(records)), key=columns["name_norm"].__getitem__)
+        self.records = [records[row] for row in order]
+        if self.use_numpy:
+            np = numpy_module()
+            order = np.array(order, dtype=np.int64)
+            # Number columns are float64, string codes int64
+            self.columns = {
+                key: np.array(
+                    values, dtype=np.float64 if key in _NUMBER_COLUMNS else np.int64
+                )[order]
+                for key, values in columns.items()
+            }
+        else:
+            self.columns = {key: [values[row] for row in order] for key, values in columns.items()}
+
+    def __len__(self):
+        return len(self.records)
+
+    def encode(self, tracks):
+        """
+        Code query tracks with the library's vocabulary.
+
+        Strings the library doesn't contain get -1, which matches no row.
+        """
+        columns = {}
+        for prop in _STRING_COLUMNS:
+            strict, norm = _string_forms(track[prop] for track in tracks)
+            columns[f"{prop}_norm"] = [self._vocabulary.get(value, -1) for value in norm]
+            columns[f"{prop}_strict"] = [self._vocabulary.get(value, -1) for value in strict]
+        for prop in _NUMBER_COLUMNS:
+            columns[prop] = [_number(track[prop]) for track in tracks]
+        return columns
+
+    def title_ranges(self, title_codes):
+        """Return the (start, end) row range holding each normalized title code"""
+        names = self.columns["name_norm"]
+        if self.use_numpy:
+            np = numpy_module()
+            codes = np.asarray(title_codes, dtype=np.int64)
+            return names.searchsorted(codes, "left"), names.searchsorted(codes, "right")
+        starts, ends = [], []
+        first_row = {}
+        for row, code in enumerate(names):
+            first_row.setdefault(code, row)
+        last_row = {code: row for row, code in enumerate(names)}
+        for code in title_codes:
+            starts.append(first_row.get(code, 0))
+            ends.append(last_row[code] + 1 if code in last_row else 0)
+        return starts, ends
+
+
+def score_tracks(tracks, library, threshold=MATCH_THRESHOLD):
+    """
+    Score library tracks against each query track.
+
+    Only library tracks whose normalized title equals the query's are
+    candidates; each pair scores name, artist, album, duration, track and
+    disc number with the weights above.
+
+    Args:
+        tracks (list): Query track dicts with the LIBRARY_PROPERTIES keys
+        library (LibraryColumns): The library to search
+        threshold (int): Lowest score that is returned
+
+    Returns:
+        list: For each query track, its (score, record) matches, best first
+    """
+    if not tracks or not len(library):
+        return [[] for _ in tracks]
+    queries = library.encode(tracks)
+    starts, ends = library.title_ranges(queries["name_norm"])
+    if library.use_numpy:
+        pairs = _score_numpy(library.columns, queries, starts, ends, threshold)
+    else:
+        pairs = _score_python(library.columns, queries, starts, ends, threshold)
+
+    # Pairs arrive grouped by query, best score first, ties in library order
+    matches = [[] for _ in tracks]
+    for query, row, score in pairs:
+        matches[query].append((score, library.records[row]))
+    return matches
+
+
+def _score_numpy(lib, queries, starts, ends, threshold):
+    np = numpy_module()
+    lengths = ends - starts
+    # One entry per (query, candidate row) pair: the query's index repeated
+    # once per candidate, and the candidate rows of each range back to back
+    query_idx = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.arange(lengths.sum()) - np.repeat(offsets - starts, lengths)
+    q = {key: np.asarray(values)[query_idx] for key, values in queries.items()}
+
+    def pick(key, exact, normalized):
+        return np.where(
+            lib[f"{key}_strict"][rows] == q[f"{key}_strict"],
+            exact,
+            np.where(lib[f"{key}_norm"][rows] == q[f"{key}_norm"], normalized, 0),
+        )
+
+    scores = (
+        pick("name", NAME_EXACT, NAME_NORMALIZED)
+        + pick("artist", ARTIST_EXACT, ARTIST_NORMALIZED)
+        + pick("album", ALBUM_EXACT, ALBUM_NORMALIZED)
+        + np.where(
+            np.abs(lib["duration"][rows] - q["duration"]) <= DURATION_TOLERANCE,
+            DURATION_MATCH,
+            0,
+        )
+        + np.where(lib["track_number"][rows] == q["track_number"], TRACK_NUMBER_MATCH, 0)
+        + np.where(lib["disc_number"][rows] == q["disc_number"], DISC_NUMBER_MATCH, 0)
+    )
+    keep = scores >= threshold
+    query_idx, rows, scores = query_idx[keep], rows[keep], scores[keep]
+    # Rows sort by title first, so within a query's range row order is
+    # library order
+    order = np.lexsort((rows, -scores, query_idx))
+    return zip(query_idx[order].tolist(), rows[order].tolist(), scores[order].tolist())
+
+
+def _score_python(lib, queries, starts, ends, threshold):
+    def pick(key, row, query, exact, normalized):
+        if lib[f"{key}_strict"][row] == queries[f"{key}_strict"][query]:
+            return exact
+        if lib[f"{key}_norm"][row] == queries[f"{key}_norm"][query]:
+            return normalized
+        return 0
+
+    for query, (start, end) in enumerate(zip(starts, ends)):
+        found = []
+        for row in range(start, end):
+            score = (
+                pick("name", row, query, NAME_EXACT, NAME_NORMALIZED)
+                + pick("artist", row, query, ARTIST_EXACT, ARTIST_NORMALIZED)
+                + pick("album", row, query, ALBUM_EXACT, ALBUM_NORMALIZED)
+            )
+            if abs(lib["duration"][row] - queries["duration"][query]) <= DURATION_TOLERANCE:
+                score += DURATION_MATCH
+            if lib["track_number"][row] == queries["track_number"][query]:
+                score += TRACK_NUMBER_MATCH
+            if lib["disc_number"][row] == queries["disc_number"][query]:
+                score += DISC_NUMBER_MATCH
+            if score >= threshold:
+                found.append((score, row))
+        found.sort(key=lambda match: match[0], reverse=True)
+        for score, row in found:
+            yield query, row, score
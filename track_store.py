@@ -0,0 +1,131 @@
+"""
+Compact records for library snapshots.
+
+A library snapshot holds every track of the library, so the per-track cost
+adds up: a dict of ten keys costs several hundred bytes before any of its
+values. LibraryTrack keeps the same fields in __slots__, and shares one
+string object for every repeat of an artist or album name, which on a
+typical library are repeated across many tracks. Tracks refer to the Music
+app only by persistent ID.
+"""
+
+import gc
+from contextlib import contextmanager
+from sys import intern
+
+_FIELDS = (
+    "persistent_id",
+    "name",
+    "artist",
+    "album",
+    "duration",
+    "track_number",
+    "disc_number",
+    "norm_name",
+    "norm_artist",
+    "norm_album",
+    "core_name",
+)
+
+
+@contextmanager
+def bulk_allocation():
+    """
+    Pause the cyclic garbage collector while a snapshot is built.
+
+    Building a snapshot allocates a few containers per track and frees
+    none, yet each burst of allocations sets off a collection that walks
+    everything built so far; none of it is garbage.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _shared(value):
+    return intern(value) if isinstance(value, str) else value
+
+
+class LibraryTrack:
+    """
+    One library track: its persistent ID, the LIBRARY_PROPERTIES, and the
+    normalized title, artist and album and the core title (set by the
+    catalog, or else once the track is indexed).
+
+    Fields are read and written like dict keys (track["name"],
+    track.get("album")), so a LibraryTrack goes wherever a record dict does.
+    Tracks compare by identity; compare as_dict() for their values.
+    """
+
+    __slots__ = _FIELDS
+
+    def __init__(
+        self,
+        persistent_id,
+        name,
+        artist,
+        album,
+        duration,
+        track_number,
+        disc_number,
+        norm_name=None,
+        norm_artist=None,
+        norm_album=None,
+        core_name=None,
+    ):
+        self.persistent_id = persistent_id
+        self.name = name
+        self.artist = _shared(artist)
+        self.album = _shared(album)
+        self.duration = duration
+        self.track_number = track_number
+        self.disc_number = disc_number
+        # Unset fields stay unset, so `"norm_name" in track` works as for dicts
+        if norm_name is not None:
+            self.norm_name = norm_name
+        if norm_artist is not None:
+            self.norm_artist = _shared(norm_artist)
+        if norm_album is not None:
+            self.norm_album = _shared(norm_album)
+        if core_name is not None:
+            # Usually the same text as the normalized title; keep one copy
+            self.core_name = norm_name if core_name == norm_name else core_name
+
+    @classmethod
+    def from_record(cls, record):
+        """Make a LibraryTrack from a record dict"""
+        return cls(*(record.get(field) for field in _FIELDS))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.keys()}
+
+    def __repr__(self):
+        return f"LibraryTrack({self.as_dict()!r})"
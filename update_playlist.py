@@ -1,58 +1,138 @@
-from appscript import app
-import subprocess
-import appscript
-import spotipy
-import colorama
-import unicodedata
-import re
-from colorama import Fore
-from spotipy.oauth2 import SpotifyOAuth
+import argparse
+import os
+import console
+from console import Fore
 import sys
+import time
+
+from library_catalog import LibraryCatalog
+from library_index import LIBRARY_PROPERTIES, LibraryIndex
+from match_cache import MatchCache
+from matching import normalize_string, primary_artist, split_search_term, strings_match
+from media_index import MUSIC_DIR, open_media_index
+from playlist_diff import diff_playlists
+from playlist_removal import read_playlist, remove_playlist_tracks
+from selection import parse_selection
+from music_backend import AppscriptMusicBackend, load_track_records
+from spotify_cache import PlaylistListingCache, PlaylistTrackCache
+from spotify_source import (
+    fetch_playlist_tracks_cached,
+    fetch_user_playlists_cached,
+    track_summary,
+)
+from paths import cache_path
+from timing import StageTimer, counters, profiled, run_concurrently, write_metrics
+from track_scoring import LibraryColumns, score_tracks
+
+# Lowest media_index score at which a file is offered for a song that the
+# library lookup didn't find. A one-word title alone scores 0.75 for
+# "Title - Artist", so the file must also be in a folder named after the
+# primary artist
+MEDIA_MATCH_THRESHOLD = 0.75
+
+# Lowest LibraryIndex.search score at which a library track counts as the
+# song when no track matches exactly
+LIBRARY_MATCH_THRESHOLD = 0.85
+
+# Music app connection, on-disk catalog and library snapshot shared by every
+# lookup during a sync run
+_music_backend = None
+_library_catalog = None
+_library_index = None
+_rebuild_catalog = False
+# Columnar copy of the library snapshot for batch scoring, and the snapshot
+# it was built from
+_library_columns = None
+_library_columns_source = None
+# Spotify playlist items, reused while a playlist's snapshot_id is unchanged,
+# and the user's playlist listing, reused until its TTL runs out
+_spotify_track_cache = None
+_spotify_listing_cache = None
+# Spotify tracks already matched to library tracks, kept across runs
+_match_cache = None
+# Index of the media files in the Music folder, refreshed once per run
+_media_index = None
+
+
+def get_spotify_track_cache():
+    """Return the on-disk cache of Spotify playlist items"""
+    global _spotify_track_cache
+    if _spotify_track_cache is None:
+        _spotify_track_cache = PlaylistTrackCache()
+    return _spotify_track_cache
+
+
+def get_spotify_session():
+    """
+    Return the process-wide Spotify session.
+
+    spotipy and requests are imported on the first call rather than with
+    this module, so commands that never reach Spotify start without them.
+    """
+    from spotify_session import get_spotify_session as shared_session
 
+    return shared_session()
 
-def get_spotify_playlist_track_data(playlist_uri):
-    sp = spotipy.Spotify(
-        auth_manager=SpotifyOAuth(
-            scope="playlist-modify-public playlist-modify-private playlist-read-private"
-        )
+
+def get_spotify_playlist_tracks(playlist_uri):
+    """Return the playlist's tracks as spotify_source.track_summary dicts"""
+    sp = get_spotify_session().get_client()
+    tracks, cached = fetch_playlist_tracks_cached(
+        sp, playlist_uri, get_spotify_track_cache()
     )
-    playlist_id = playlist_uri
-    tracks = []
-    results = sp.playlist_tracks(playlist_id)
-    tracks.extend(results["items"])
+    if cached:
+        print(f"Spotify playlist unchanged, using {len(tracks)} cached tracks")
+    else:
+        print(f"Fetched {len(tracks)} tracks from Spotify")
+
+    return [track_summary(item["track"]) for item in tracks]
 
-    while results["next"]:
-        print("more tracks exist...")
-        results = sp.next(results)
-        tracks.extend(results["items"])
 
-    track_data = {item["track"]["name"]: item["track"]["uri"] for item in tracks}
-    return track_data
+def get_match_cache():
+    """Return the on-disk store of Spotify to Apple Music matches"""
+    global _match_cache
+    if _match_cache is None:
+        _match_cache = MatchCache()
+    return _match_cache
+
+
+def get_music_backend():
+    """Return the Music backend, connecting to the Music app on first use"""
+    global _music_backend
+    if _music_backend is None:
+        _music_backend = AppscriptMusicBackend()
+    return _music_backend
+
+
+def set_music_backend(backend):
+    """
+    Use another Music backend from now on, e.g. a FakeMusicBackend.
+
+    The library snapshot is discarded, since it came from the old backend.
+    """
+    global _music_backend
+    _music_backend = backend
+    invalidate_library_index()
 
 
-def get_apple_playlist_track_name(apple_playlist):
+def get_apple_playlist_tracks(apple_playlist):
+    """Return the playlist's tracks as records with persistent ID, name, artist and duration"""
     try:
         print(f"\nTrying to access Music app...")
-        music = appscript.app("Music")
+        backend = get_music_backend()
         print(f"Successfully connected to Music app")
 
         print(f"Trying to access playlist: {apple_playlist}")
-        playlist = music.playlists[apple_playlist]
-
-        # Verify playlist exists
-        try:
-            name = playlist.name.get()
-            print(f"Found playlist: {name}")
-        except Exception as e:
-            print(f"Error accessing playlist name: {e}")
-            raise
-
         print("Attempting to access tracks...")
         try:
-            tracks = playlist.tracks.get()
-            track_names = [track.name.get() for track in tracks]
-            print(f"Successfully retrieved {len(track_names)} tracks")
-            return track_names
+            # One Apple Event per property column
+            columns = backend.get_playlist_track_columns(
+                apple_playlist, ("persistent_id", "name", "artist", "duration")
+            )
+            tracks = load_track_records(columns)
+            print(f"Found playlist: {apple_playlist}")
+            print(f"Successfully retrieved {len(tracks)} tracks")
+            return tracks
         except Exception as e:
             print(f"Error accessing tracks: {e}")
             raise
@@ -61,44 +141,80 @@ def get_apple_playlist_track_name(apple_playlist):
         raise
 
 
-# Helper functions for improved string matching
-def normalize_string(s):
+def get_media_index():
+    """Return the Music folder's media index, refreshing it on first use in a run"""
+    global _media_index
+    if _media_index is None:
+        _media_index = open_media_index(MUSIC_DIR)
+    return _media_index
+
+
+def get_library_catalog():
+    """Return the on-disk library catalog, opening it on first use"""
+    global _library_catalog
+    if _library_catalog is None:
+        _library_catalog = LibraryCatalog()
+    return _library_catalog
+
+
+def get_library_index(refresh=False):
     """
-    Normalize a string by:
-    1. Converting to lowercase
-    2. Removing diacritics (accents)
-    3. Removing special characters except alphanumeric and spaces
+    Return the library snapshot, building it on first use or when refresh is set.
+
+    The snapshot is loaded from the library catalog after the catalog has
+    picked up any tracks added, changed or deleted since the last run.
+    """
+    global _library_index, _rebuild_catalog
+    if _library_index is None or refresh:
+        catalog = get_library_catalog()
+        if _rebuild_catalog:
+            print("Rebuilding Apple Music library catalog...")
+        else:
+            print("Refreshing Apple Music library catalog...")
+        changes = catalog.refresh(get_music_backend(), rebuild=_rebuild_catalog)
+        _rebuild_catalog = False
+        print(
+            f"Catalog updated: {changes['added']} added, {changes['updated']} changed, "
+            f"{changes['removed']} removed"
+        )
+        _library_index = LibraryIndex(catalog.records())
+        print(f"Indexed {len(_library_index)} library tracks")
+    return _library_index
+
+
+def get_library_columns():
     """
-    # Convert to lowercase
-    s = s.lower()
-    # Normalize Unicode characters (NFKD decomposition)
-    s = unicodedata.normalize("NFKD", s)
-    # Remove diacritics (accents)
-    s = "".join([c for c in s if not unicodedata.combining(c)])
-    # Remove special characters, keep only alphanumeric and spaces
-    s = re.sub(r"[^\w\s]", "", s)
-    # Remove extra whitespace
-    s = " ".join(s.split())
-    return s
-
-
-def strings_match(str1, str2, strict=False):
+    Return the library snapshot laid out for track_scoring, built once per snapshot.
+
+    Tracks deleted since it was built are still in it; callers check
+    matches against the snapshot.
     """
-    Compare two strings with improved matching for special characters.
+    global _library_columns, _library_columns_source
+    library = get_library_index()
+    if _library_columns_source is not library:
+        _library_columns = LibraryColumns(library)
+        _library_columns_source = library
+    return _library_columns
 
-    Parameters:
-        str1, str2: The strings to compare
-        strict: If True, only normalize case, otherwise do full normalization
 
-    Returns:
-        True if strings match according to the comparison method
+def invalidate_library_index(rebuild_catalog=False):
     """
-    if strict:
-        # Case-insensitive comparison only
-        return str1.lower() == str2.lower()
-    else:
-        # Full normalization for more lenient comparison
-        return normalize_string(str1) == normalize_string(str2)
+    Discard the library snapshot so the next lookup reads the library again.
+
+    With rebuild_catalog set, the next lookup also re-reads every track
+    instead of refreshing the catalog incrementally.
+    """
+    global _library_index, _rebuild_catalog
+    _library_index = None
+    _rebuild_catalog = rebuild_catalog
+
+
+def delete_library_track(record):
+    """Delete a track from the library and drop it from the snapshot and catalog"""
+    get_music_backend().delete_track(record["persistent_id"])
+    get_library_index().remove(record)
+    get_library_catalog().delete(record["persistent_id"])
+    get_match_cache().evict_track(record["persistent_id"])
 
 
 # def song_exists(song_name):
@@ -118,139 +234,93 @@ def strings_match(str1, str2, strict=False):
 #         normalized_track_name = normalize_string(track_name)
 
 
-def song_exists(search_term):
+def song_exists(search_term, artist=None):
     """Search for tracks in the Apple Music library that match the search term.
     
     Args:
-        search_term (str): Format should be 'track_name - artist_name'
+        search_term (str): Format should be 'track_name - artist_name'; a
+            plain track name is matched on title alone
+        artist (str, optional): Artist name; if given, search_term is
+            taken as the track name as it is
     
     Returns:
-        list: List of matching tracks with exact artist and title match
+        list: (persistent ID, name, artist, album, score) of each track with
+        exact artist and title match (score 1.0), or else of the closest
+        tracks scoring at least LIBRARY_MATCH_THRESHOLD, best first
     """
     try:
-        # Split search term into track and artist
-        if ' - ' not in search_term:
-            print(Fore.YELLOW + f"Warning: Search term '{search_term}' should be in format 'track_name - artist_name'")
-            return []
-            
-        track_title, artist_name = search_term.split(' - ', 1)
-        
-        music = app("Music")
-        library_tracks = music.tracks()
-        matching_tracks = []
-
-        # Normalize the search terms
-        normalized_title = normalize_string(track_title)
-        normalized_artist = normalize_string(artist_name)
+        if artist is not None:
+            track_title, artist_name = search_term, artist
+        else:
+            track_title, artist_name = split_search_term(search_term)
 
-        for track in library_tracks:
-            try:
-                # Get track metadata
-                track_name = track.name.get() if hasattr(track, "name") else "Unknown Track"
-                track_artist = track.artist.get() if hasattr(track, "artist") else "Unknown Artist"
-                track_album = track.album.get() if hasattr(track, "album") else "Unknown Album"
-
-                # Check for exact matches first
-                title_matches = strings_match(track_name, track_title, strict=True)
-                artist_matches = strings_match(track_artist, artist_name, strict=True)
-                
-                # If no exact match, try normalized matching
-                if not (title_matches and artist_matches):
-                    title_matches = strings_match(track_name, track_title)
-                    artist_matches = strings_match(track_artist, artist_name)
-
-                # Only include if both title and artist match
-                if title_matches and artist_matches:
-                    matching_tracks.append((track, track_name, track_artist, track_album))
-                    
-            except Exception as e:
-                # Skip tracks that cause errors when accessing their properties
-                continue
+        # Exact matches score 1.0; near matches only count when there are none
+        results = get_library_index().search(
+            track_title, artist_name, min_score=LIBRARY_MATCH_THRESHOLD
+        )
+        if results and results[0][0] == 1.0:
+            results = [(score, record) for score, record in results if score == 1.0]
+        matching_tracks = [
+            (record["persistent_id"], record["name"], record["artist"], record["album"], score)
+            for score, record in results
+        ]
 
         if not matching_tracks:
-            print(Fore.YELLOW + f"No exact matches found for '{track_title}' by '{artist_name}'")
-            
+            by_artist = f" by '{artist_name}'" if artist_name else ""
+            print(Fore.YELLOW + f"No matches found for '{track_title}'{by_artist}")
+        elif results[0][0] < 1.0:
+            _, record = results[0]
+            print(
+                Fore.YELLOW
+                + f"Closest match for '{search_term}': '{record['name']}' by "
+                f"{record['artist']} ({results[0][0]:.0%})"
+                + Fore.RESET
+            )
+
         return matching_tracks
     except Exception as e:
         print(Fore.RED + f"Error searching tracks in library: {e}" + Fore.RESET)
         return []
 
 
-def parse_selection(selection_str, max_value):
+def get_spotify_playlists(refresh=False):
     """
-    Parse user selection string with support for ranges and comma-separated values.
-    Returns a sorted list of unique selected indices.
+    Return {name: uri} for every playlist of the Spotify user.
 
-    Examples:
-    - "1,3,5" returns [1, 3, 5]
-    - "1-3,5" returns [1, 2, 3, 5]
+    The listing is served from the local cache while it is fresh; refresh
+    forces a new fetch of all pages.
     """
-    selected = set()
-
-    # Split by comma
-    parts = selection_str.split(",")
-
-    for part in parts:
-        part = part.strip()
-
-        # Handle range (e.g., "1-3")
-        if "-" in part:
-            try:
-                start, end = map(int, part.split("-"))
-                if 1 <= start <= end <= max_value:
-                    selected.update(range(start, end + 1))
-                else:
-                    print(
-                        Fore.RED
-                        + f"Range {start}-{end} is out of bounds. Please use numbers between 1 and {max_value}."
-                    )
-            except ValueError:
-                print(
-                    Fore.RED + f"Invalid range format: {part}. Use 'start-end' format."
-                )
-
-            # Handle individual number
-        else:
-            try:
-                num = int(part)
-                if 1 <= num <= max_value:
-                    selected.add(num)
-                else:
-                    print(
-                        Fore.RED
-                        + f"Number {num} is out of bounds. Please use numbers between 1 and {max_value}."
-                    )
-            except ValueError:
-                print(Fore.RED + f"Invalid number: {part}")
-
-    return sorted(list(selected))
-
-
-def get_spotify_playlists():
-    sp = spotipy.Spotify(
-        auth_manager=SpotifyOAuth(
-            scope="playlist-modify-public playlist-modify-private playlist-read-private"
-        )
+    global _spotify_listing_cache
+    if _spotify_listing_cache is None:
+        _spotify_listing_cache = PlaylistListingCache()
+    playlists, cached = fetch_user_playlists_cached(
+        get_spotify_session().get_client(), _spotify_listing_cache, refresh=refresh
     )
-    playlists = sp.current_user_playlists()
+    if not cached:
+        print(f"Fetched {len(playlists)} Spotify playlists")
     spotify_playlists = {
-        playlist["name"]: playlist["uri"] for playlist in playlists["items"]
+        playlist["name"]: playlist["uri"] for playlist in playlists
     }
     return spotify_playlists
 
 
 def get_apple_playlists():
-    music = app("Music")
-    playlists = music.user_playlists.get()
     apple_playlists = {
-        playlist.name(): None for playlist in playlists if hasattr(playlist, "name")
+        name: None for name in get_music_backend().get_playlist_names()
     }
     return apple_playlists
 
 
-def select_spotify_playlist():
-    spotify_playlists = get_spotify_playlists()
-    apple_playlists = get_apple_playlists()
+def get_matching_playlists(refresh=False, timer=None):
+    """Return {name: Spotify URI} of the playlists that exist in both services"""
+    # The Spotify listing is network I/O and the Apple one local IPC, so load
+    # them side by side
+    listings = run_concurrently(timer or StageTimer(), {
+        "spotify playlist listing": lambda: get_spotify_playlists(refresh=refresh),
+        "apple playlist listing": get_apple_playlists,
+    })
+    spotify_playlists = listings["spotify playlist listing"]
+    apple_playlists = listings["apple playlist listing"]
 
     # Find playlists that exist in both services
     matching_playlists = {
@@ -264,6 +334,11 @@ def select_spotify_playlist():
             + Fore.RESET
         )
         raise ValueError("No matching playlists available for sync")
+    return matching_playlists
+
+
+def select_spotify_playlist(refresh=False, timer=None):
+    matching_playlists = get_matching_playlists(refresh=refresh, timer=timer)
 
     print(
         Fore.CYAN
@@ -292,43 +367,83 @@ def select_spotify_playlist():
             print(Fore.RED + "Please enter a valid number" + Fore.RESET)
 
 
-def add_songs_to_apple_playlist(playlist_name, songs):
-    for song in songs:
-        add_choice = (
-            input(
-                f"Do you want to add '{song}' to playlist '{playlist_name}'? (yes/no): "
+def describe_track_ref(track_ref):
+    """Name the library track with this persistent ID, or the media file at this path"""
+    if os.path.isabs(track_ref):
+        return f"the file '{track_ref}'"
+    record = get_library_index().get(track_ref)
+    if record is None:
+        return f"library track {track_ref}"
+    return f"'{record['name']}' by {record['artist']} from '{record['album']}'"
+
+
+def add_songs_to_apple_playlist(playlist_name, songs, confirm=True, scores=None):
+    """Add library songs to an Apple Music playlist in one scripting call.
+
+    Args:
+        playlist_name (str): Playlist to add the songs to
+        songs (dict): {song: persistent ID of the library track, or media file path}
+        confirm (bool): If True, ask about each song before anything is added
+        scores (dict): {song: match score}; the question about a song that
+            scored below 1.0 names the track that would be added
+
+    Returns:
+        dict: {song: True if it was added} for every selected song
+    """
+    selected = {}
+    for song, track_ref in songs.items():
+        if confirm:
+            score = (scores or {}).get(song, 1.0)
+            if score < 1.0:
+                print(
+                    Fore.YELLOW
+                    + f"'{song}' is not an exact match: it would add "
+                    f"{describe_track_ref(track_ref)} ({score:.0%})"
+                    + Fore.RESET
+                )
+            add_choice = (
+                input(
+                    f"Do you want to add '{song}' to playlist '{playlist_name}'? (yes/no): "
+                )
+                .strip()
+                .lower()
             )
-            .strip()
-            .lower()
-        )
-        if add_choice == "yes":
-            try:
-                print(f"Adding song '{song}' to playlist '{playlist_name}'")
-                subprocess.run(["./add_music.sh", song, playlist_name], check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"Error adding song '{song}' to playlist '{playlist_name}': {e}")
+            if add_choice != "yes":
+                continue
+        selected[song] = track_ref
+
+    if not selected:
+        return {}
+
+    print(f"Adding {len(selected)} songs to playlist '{playlist_name}'")
+    results = get_music_backend().add_playlist_tracks(playlist_name, selected.values())
+
+    added = {}
+    for song, track_ref in selected.items():
+        success, error = results[track_ref]
+        if success:
+            print(Fore.GREEN + f"Added '{song}' to playlist '{playlist_name}'" + Fore.RESET)
+        else:
+            print(f"Error adding song '{song}' to playlist '{playlist_name}': {error}")
+        added[song] = success
+    return added
 
 
 def remove_from_apple_playlist(playlist_name, song_name):
-    music = app("Music")
-    playlist = music.playlists[playlist_name]
-    for track in playlist.tracks():
-        # Try both matching methods: strict (case-insensitive) first, then normalized if needed
-        if strings_match(track.name(), song_name, strict=True) or strings_match(
-            track.name(), song_name
-        ):
-            # Using the actual track.name() to ensure we're deleting the right track
-            playlist.tracks[track.name()].delete()
-            print(
-                Fore.YELLOW
-                + f"Removed '{song_name}' from playlist '{playlist_name}'"
-                + Fore.RESET
-            )
-            return True
+    [(success, message)] = remove_playlist_tracks(
+        get_music_backend(), playlist_name, [song_name]
+    )
+    if success:
+        print(
+            Fore.YELLOW
+            + f"Removed '{song_name}' from playlist '{playlist_name}'"
+            + Fore.RESET
+        )
+        return True
             
     print(
         Fore.YELLOW
-        + f"Could not find '{song_name}' in the playlist '{playlist_name}'"
+        + f"Could not remove '{song_name}' from the playlist '{playlist_name}' ({message})"
         + Fore.RESET
     )
     return False
@@ -346,26 +461,13 @@ def remove_from_apple_music(song_name, artist_name=None, dry_run=False, batch_mo
     Returns:
         bool: True if operation was successful, False otherwise
     """
-    music = app("Music")
-    tracks = music.tracks()
-    matching_tracks = []
-
-    # Find all matching tracks
-    for track in tracks:
-        track_name = track.name()
-        track_artist = track.artist()
-        
-        # Check if track name matches
-        name_matches = strings_match(track_name, song_name, strict=True) or strings_match(track_name, song_name)
-        
-        # If artist is provided, verify artist match
-        artist_matches = True if not artist_name else (
-            strings_match(track_artist, artist_name, strict=True) or 
-            strings_match(track_artist, artist_name)
-        )
-        
-        if name_matches and artist_matches:
-            matching_tracks.append((track, track_name, track_artist))
+    library = get_library_index()
+
+    # Find all matching tracks; the artist is only checked when provided
+    matching_tracks = [
+        (record, record["name"], record["artist"])
+        for record in library.lookup(song_name, artist_name or None)
+    ]
 
     if not matching_tracks:
         print(Fore.RED + f"\nCould not find '{song_name}'{' by ' + artist_name if artist_name else ''} in your Apple Music library" + Fore.RESET)
@@ -399,11 +501,11 @@ def remove_from_apple_music(song_name, artist_name=None, dry_run=False, batch_mo
 
     # Perform deletion
     success_count = 0
-    for track, name, artist in matching_tracks:
+    for record, name, artist in matching_tracks:
         try:
             if not batch_mode:
                 print(f"\nDeleting '{name}' by {artist}...")
-            track.delete()
+            delete_library_track(record)
             success_count += 1
         except Exception as e:
             print(Fore.RED + f"Failed to delete '{name}': {str(e)}" + Fore.RESET)
@@ -448,18 +550,18 @@ def batch_remove_from_playlist(playlist_name, tracks_to_remove):
     success_count = 0
     error_count = 0
 
-    # Process each track in the batch
-    for track in tracks_to_remove:
-        try:
-            if remove_from_apple_playlist(playlist_name, track):
-                success_count += 1
-                print(Fore.GREEN + f"Removed: {track}")
-            else:
-                error_count += 1
-                print(Fore.RED + f"Error removing '{track}'")
-        except Exception as e:
+    # One playlist read and one bulk delete for the whole batch
+    try:
+        results = remove_playlist_tracks(get_music_backend(), playlist_name, tracks_to_remove)
+    except Exception as e:
+        results = [(False, str(e))] * len(tracks_to_remove)
+    for track, (success, message) in zip(tracks_to_remove, results):
+        if success:
+            success_count += 1
+            print(Fore.GREEN + f"Removed: {track}")
+        else:
             error_count += 1
-            print(Fore.RED + f"Error removing '{track}': {e}")
+            print(Fore.RED + f"Error removing '{track}': {message}")
 
     print(
         Fore.GREEN
@@ -486,7 +588,9 @@ def batch_remove_from_playlist(playlist_name, tracks_to_remove):
             )
 
             # Get list of successfully removed tracks
-            successful_tracks = tracks_to_remove  # Using the original list as we already tracked success separately
+            successful_tracks = [
+                track for track, (success, _) in zip(tracks_to_remove, results) if success
+            ]
 
             for i, track_name in enumerate(successful_tracks, 1):
                 print(f"{i}. {track_name}")
@@ -509,10 +613,59 @@ def batch_remove_from_playlist(playlist_name, tracks_to_remove):
                         remove_from_apple_music(track_name)
 
 
+def find_library_matches(playlist_tracks):
+    """Find matching tracks in the library using detailed metadata
+    
+    All tracks are scored in one batch against the library, see
+    track_scoring. Returns the matches of each track, best first.
+    """
+    scored = score_tracks(playlist_tracks, get_library_columns())
+    return [
+        [
+            {
+                'record': record,
+                'persistent_id': record['persistent_id'],
+                'name': record['name'],
+                'artist': record['artist'],
+                'album': record['album'],
+                'score': score
+            }
+            for score, record in matches
+        ]
+        for matches in scored
+    ]
+
+
+def narrow_library_matches(playlist_track, matching_tracks):
+    """
+    Settle duplicate library matches of a playlist track.
+
+    The library track with the playlist track's own persistent ID wins;
+    otherwise duration and album position narrow the matches down, see
+    LibraryIndex.resolve_duplicates. Returns the matches still tied.
+    """
+    if len(matching_tracks) < 2:
+        return matching_tracks
+    same_track = [
+        t for t in matching_tracks
+        if t['persistent_id'] == playlist_track['persistent_id']
+    ]
+    if same_track:
+        return same_track
+    tied = get_library_index().resolve_duplicates(
+        playlist_track, [t['record'] for t in matching_tracks]
+    )
+    tied_ids = {id(record) for record in tied}
+    return [t for t in matching_tracks if id(t['record']) in tied_ids]
+
+
 def handle_removed_tracks(apple_playlist_name, removed_tracks):
     """
     Interactive handling of tracks removed from Spotify but present in Apple Music playlist
     with comprehensive removal options for both playlist and library management.
+
+    removed_tracks are Apple playlist records with 'persistent_id', 'name'
+    and 'artist', so duplicate titles are removed by their own ID.
     """
     if not removed_tracks:
         print(Fore.GREEN + "\nNo tracks to remove - playlist is in sync!")
@@ -525,7 +678,7 @@ def handle_removed_tracks(apple_playlist_name, removed_tracks):
 
     # Display the tracks with numbers for selection
     for i, track in enumerate(removed_tracks, 1):
-        print(f"{i}. {track}")
+        print(f"{i}. {track['name']} - {track['artist']}")
 
     # Present comprehensive options
     print("\nRemoval options:")
@@ -546,148 +699,79 @@ def handle_removed_tracks(apple_playlist_name, removed_tracks):
         return
 
     # Function to handle actual removal
-    def find_playlist_track(playlist_name, track_name):
-        """Find the exact track in the playlist to get its metadata"""
-        music = app("Music")
-        playlist = music.playlists[playlist_name].get()
-        playlist_tracks = playlist.tracks.get()
-        
-        for track in playlist_tracks:
-            if strings_match(track.name.get(), track_name, strict=True):
-                return {
-                    'track': track,
-                    'name': track.name.get(),
-                    'artist': track.artist.get(),
-                    'album': track.album.get(),
-                    'duration': track.duration.get(),
-                    'track_number': track.track_number.get(),
-                    'disc_number': track.disc_number.get()
-                }
-        return None
-
-    def find_matching_tracks(playlist_track_info):
-        """Find matching tracks in the library using detailed metadata"""
-        music = app("Music")
-        tracks = music.tracks()
-        matching_tracks = []
-        
-        # Extract metadata from playlist track
-        name = playlist_track_info['name']
-        artist = playlist_track_info['artist']
-        album = playlist_track_info['album']
-        duration = playlist_track_info['duration']
-        track_number = playlist_track_info['track_number']
-        disc_number = playlist_track_info['disc_number']
+    def remove_tracks(tracks_to_remove, remove_from_lib=False):
+        print(f"\nRemoving {len(tracks_to_remove)} tracks...")
+        # One playlist read serves the removal and, before any track has
+        # left the playlist, the metadata for matching library tracks
+        snapshot = read_playlist(
+            get_music_backend(), apple_playlist_name, ("persistent_id",) + LIBRARY_PROPERTIES
+        )
+        try:
+            results = remove_playlist_tracks(
+                get_music_backend(), apple_playlist_name, tracks_to_remove, snapshot=snapshot
+            )
+        except Exception as e:
+            results = [(False, str(e))] * len(tracks_to_remove)
 
-        for track in tracks:
-            # Basic metadata
-            track_name = track.name.get()
-            track_artist = track.artist.get()
-            track_album = track.album.get()
-            track_duration = track.duration.get()
-            track_track_number = track.track_number.get()
-            track_disc_number = track.disc_number.get()
-            
-            # Score-based matching
-            score = 0
-            
-            # Name match (most important)
-            if strings_match(track_name, name, strict=True):
-                score += 5
-            elif strings_match(track_name, name):
-                score += 3
+        removed = []
+        for track, (success, message) in zip(tracks_to_remove, results):
+            if success:
+                print(f"Removed '{track['name']}' from playlist")
+                removed.append(track)
             else:
-                continue  # If name doesn't match at all, skip this track
-            
-            # Artist match
-            if strings_match(track_artist, artist, strict=True):
-                score += 4
-            elif strings_match(track_artist, artist):
-                score += 2
-            
-            # Album match
-            if strings_match(track_album, album, strict=True):
-                score += 3
-            elif strings_match(track_album, album):
-                score += 1
-            
-            # Duration match (within 1 second)
-            if abs(track_duration - duration) <= 1:
-                score += 2
-            
-            # Track/disc number match
-            if track_track_number == track_number:
-                score += 1
-            if track_disc_number == disc_number:
-                score += 1
-            
-            # Only include if it's a reasonably good match
-            if score >= 7:  # Requires at least name match and either strict artist match or multiple other matches
-                matching_tracks.append({
-                    'track': track,
-                    'name': track_name,
-                    'artist': track_artist,
-                    'album': track_album,
-                    'score': score
-                })
-        
-        # Sort by match score
-        matching_tracks.sort(key=lambda x: x['score'], reverse=True)
-        return matching_tracks
+                print(Fore.RED + f"Error removing '{track['name']}': {message}")
 
-    def remove_tracks(tracks_to_remove, remove_from_lib=False):
-        print(f"\nRemoving {len(tracks_to_remove)} tracks...")
-        for track in tracks_to_remove:
+        if not remove_from_lib:
+            return
+
+        by_id = {track['persistent_id']: track for track in snapshot}
+        playlist_tracks = [by_id[track['persistent_id']] for track in removed]
+        library_matches = find_library_matches(playlist_tracks)
+        library = get_library_index()
+        for playlist_track, matches in zip(playlist_tracks, library_matches):
+            track = playlist_track['name']
             try:
-                # Always remove from playlist first
-                remove_from_apple_playlist(apple_playlist_name, track)
-                print(f"Removed '{track}' from playlist")
+                # Skip matches deleted while handling an earlier track
+                matching_tracks = [
+                    match for match in matches
+                    if library.get(match['persistent_id']) is match['record']
+                ]
+
+                if not matching_tracks:
+                    print(Fore.YELLOW + f"No matching tracks found in library for '{track}'")
+                    continue
+
+                # Only true ties go to the prompt
+                matching_tracks = narrow_library_matches(playlist_track, matching_tracks)
                 
-                # Optionally remove from library
-                if remove_from_lib:
-                    # First find the exact track in the playlist to get its metadata
-                    playlist_track = find_playlist_track(apple_playlist_name, track)
-                    if not playlist_track:
-                        print(Fore.YELLOW + f"Could not find '{track}' in playlist to get metadata")
-                        continue
-
-                    # Find matching tracks using detailed metadata
-                    matching_tracks = find_matching_tracks(playlist_track)
-                    
-                    if not matching_tracks:
-                        print(Fore.YELLOW + f"No matching tracks found in library for '{track}'")
-                        continue
-                    
-                    if len(matching_tracks) == 1:
-                        # If only one match, delete it directly
-                        track_obj = matching_tracks[0]['track']
-                        track_obj.delete()
-                        print(f"Removed '{track}' from library")
-                    else:
-                        # If multiple matches, let user choose
-                        print(f"\nFound {len(matching_tracks)} matching tracks for '{track}':")
-                        for i, t in enumerate(matching_tracks, 1):
-                            print(f"{i}. {t['name']} - {t['artist']} (Album: {t['album']})")
-                        print("0. Skip this track")
-                        
-                        while True:
-                            try:
-                                choice = input(f"Select which track to remove (0-{len(matching_tracks)}): ").strip()
-                                if choice == '0':
-                                    print(Fore.YELLOW + "Skipping track")
-                                    break
-                                
-                                idx = int(choice) - 1
-                                if 0 <= idx < len(matching_tracks):
-                                    track_obj = matching_tracks[idx]['track']
-                                    track_obj.delete()
-                                    print(f"Removed '{matching_tracks[idx]['name']} - {matching_tracks[idx]['artist']}'")
-                                    break
-                                else:
-                                    print(Fore.RED + "Invalid selection, try again")
-                            except ValueError:
-                                print(Fore.RED + "Invalid input, please enter a number")
+                if len(matching_tracks) == 1:
+                    # If only one match, delete it directly
+                    delete_library_track(matching_tracks[0]['record'])
+                    print(f"Removed '{track}' from library")
+                else:
+                    # If multiple matches, let user choose
+                    print(f"\nFound {len(matching_tracks)} matching tracks for '{track}':")
+                    for i, t in enumerate(matching_tracks, 1):
+                        print(f"{i}. {t['name']} - {t['artist']} (Album: {t['album']})")
+                    print("0. Skip this track")
                     
+                    while True:
+                        try:
+                            choice = input(f"Select which track to remove (0-{len(matching_tracks)}): ").strip()
+                            if choice == '0':
+                                print(Fore.YELLOW + "Skipping track")
+                                break
+                            
+                            idx = int(choice) - 1
+                            if 0 <= idx < len(matching_tracks):
+                                delete_library_track(matching_tracks[idx]['record'])
+                                print(f"Removed '{matching_tracks[idx]['name']} - {matching_tracks[idx]['artist']}'")
+                                break
+                            else:
+                                print(Fore.RED + "Invalid selection, try again")
+                        except ValueError:
+                            print(Fore.RED + "Invalid input, please enter a number")
+                
             except Exception as e:
                 print(Fore.RED + f"Error removing '{track}': {e}")
 
@@ -716,42 +800,246 @@ def handle_removed_tracks(apple_playlist_name, removed_tracks):
     print(Fore.GREEN + "\nTrack removal completed")
 
 
-def main():
-    colorama.init()
-    selected_playlist_name, spotify_playlist_uri = select_spotify_playlist()
-    apple_playlist_name = selected_playlist_name
+def spotify_track_url(track):
+    return f"https://open.spotify.com/track/{track['uri'].split(':')[-1]}"
 
-    apple_tracks = get_apple_playlist_track_name(apple_playlist_name)
-    spotify_track_data = get_spotify_playlist_track_data(spotify_playlist_uri)
 
-    # Find tracks to add to Apple Music
-    tracks_to_add = {
-        track: f"https://open.spotify.com/track/{uri.split(':')[-1]}"
-        for track, uri in spotify_track_data.items()
-        if track not in apple_tracks
-    }
+def load_playlist_diff(apple_playlist_name, spotify_playlist_uri, timer):
+    """
+    Load both playlists and the library snapshot, then pair their tracks.
 
-    # Find tracks that were removed from Spotify but exist in Apple Music
-    removed_tracks = [
-        track for track in apple_tracks if track not in spotify_track_data
-    ]
+    Returns:
+        tuple: (PlaylistDiff, {Spotify URI: stored match} for the Spotify
+        tracks matched in earlier runs)
+    """
+    # Both playlists (and the library snapshot the lookups need) load in
+    # parallel; the diff starts once all of them are in
+    data = run_concurrently(timer, {
+        "apple playlist tracks": lambda: get_apple_playlist_tracks(apple_playlist_name),
+        "spotify playlist tracks": lambda: get_spotify_playlist_tracks(spotify_playlist_uri),
+        "library snapshot": get_library_index,
+    })
+    apple_tracks = data["apple playlist tracks"]
+    spotify_tracks = data["spotify playlist tracks"]
+    library = data["library snapshot"]
+    match_cache = get_match_cache()
+
+    with timer.stage("playlist diff"):
+        # Matches from earlier runs whose library track still exists
+        known_matches = match_cache.get_many(
+            [track["uri"] for track in spotify_tracks], library
+        )
+        # Pair tracks by identity; known matches are reused as they are
+        diff = diff_playlists(
+            spotify_tracks,
+            apple_tracks,
+            known={uri: match["persistent_id"] for uri, match in known_matches.items()},
+        )
+        # Tracks paired with the user's own playlist count as confirmed,
+        # unless only a similar artist credit paired them
+        similar = {spotify_track["uri"] for spotify_track, _ in diff.similar}
+        match_cache.put_many(
+            (spotify_track["uri"], apple_track["persistent_id"], 1.0)
+            for spotify_track, apple_track in diff.matched
+            if spotify_track["uri"] not in known_matches
+            and spotify_track["uri"] not in similar
+        )
+
+    for spotify_track, candidates in diff.ambiguous:
+        print(
+            Fore.YELLOW
+            + f"'{spotify_track['name']}' by {spotify_track['artist']} matches "
+            f"{len(candidates)} Apple Music tracks; leaving them as they are"
+            + Fore.RESET
+        )
+    return diff, known_matches
 
-    if removed_tracks:
-        handle_removed_tracks(apple_playlist_name, removed_tracks)
 
-    diff_uri = tracks_to_add
+def locate_tracks(tracks, known_matches, timer):
+    """
+    Find Spotify tracks in the library, or else as files in the Music folder.
 
-    in_apple = {}
-    not_in_apple = {}
+    Args:
+        tracks (list): Spotify tracks missing from the Apple playlist
+        known_matches (dict): {Spotify URI: stored match}, see load_playlist_diff
+        timer (StageTimer): Receives the lookup stages
+
+    Returns:
+        tuple: ({song: (track, library persistent ID or media file path,
+        match score)}, {song: track} for the songs not found), where song
+        is "name - artist"
+    """
+    match_cache = get_match_cache()
+    found = {}
+    missing = {}
 
     # Check each song once and categorize
-    for track, uri in diff_uri.items():
-        if song_exists(track):
-            in_apple[track] = uri
-            print(f"✅ SUCCESS: Song '{track}' was found in Apple Music playlist")
-        else:
-            not_in_apple[track] = uri
-            # print(f"❌ FAILURE: Song '{track}' was NOT found in Apple Music playlist")
+    with timer.stage("library lookups"):
+        for track in tracks:
+            song = f"{track['name']} - {track['artist']}"
+            known = known_matches.get(track["uri"])
+            if known:
+                # Matched in an earlier run, no library search needed
+                found[song] = (track, known["persistent_id"], known["confidence"])
+                print(f"✅ SUCCESS: Song '{song}' was matched before")
+                continue
+            matches = song_exists(track["name"], track["artist"])
+            if matches:
+                pid, score = matches[0][0], matches[0][4]
+                found[song] = (track, pid, score)
+                # A near match is only remembered once it has been added
+                # (see remember_added_matches), so a declined one is
+                # searched for again next time
+                if score == 1.0:
+                    match_cache.put(track["uri"], pid, confidence=score)
+                print(f"✅ SUCCESS: Song '{song}' was found in Apple Music playlist")
+            else:
+                missing[song] = track
+                # print(f"❌ FAILURE: Song '{song}' was NOT found in Apple Music playlist")
+
+    # Songs the library lookup missed may still be files in the Music folder,
+    # which is what add_music.sh used to search for
+    if missing and os.path.isdir(MUSIC_DIR):
+        with timer.stage("media file lookups"):
+            media_index = get_media_index()
+            for song in list(missing):
+                candidates = media_index.query(song, limit=1)
+                if (
+                    candidates
+                    and candidates[0][1] >= MEDIA_MATCH_THRESHOLD
+                    and media_index.in_folder_of(
+                        candidates[0][0], primary_artist(missing[song]["artist"])
+                    )
+                ):
+                    path, score = candidates[0]
+                    found[song] = (missing.pop(song), path, score)
+                    print(f"✅ SUCCESS: Song '{song}' was found in the Music folder")
+    return found, missing
+
+
+def remember_added_matches(found, added):
+    """
+    Store the near library matches of the songs that were added.
+
+    Args:
+        found (dict): {song: (track, persistent ID or media file path,
+            score)}, see locate_tracks
+        added (dict): {song: True if it was added}
+    """
+    get_match_cache().put_many(
+        (track["uri"], track_ref, score)
+        for song, (track, track_ref, score) in found.items()
+        if added.get(song) and score < 1.0 and not os.path.isabs(track_ref)
+    )
+
+
+def start_run(rebuild_catalog=False):
+    """Reset per-run state and return the run's StageTimer"""
+    global _media_index
+    console.init()
+    # Take a fresh library snapshot on each run; it is built on first lookup
+    invalidate_library_index(rebuild_catalog=rebuild_catalog)
+    # Pick up media files added to the Music folder since the last run
+    _media_index = None
+    # The Spotify session, match cache and Music connection outlive this
+    # run; only their counters start over
+    get_spotify_session().stats.reset()
+    get_spotify_session().limiter.reset_stats()
+    get_match_cache().reset_stats()
+    if _music_backend is not None:
+        _music_backend.reset_counts()
+    counters(reset=True)
+    return StageTimer()
+
+
+def run_metrics():
+    """Return the run's Apple Event, HTTP, subprocess and cache counts"""
+    backend = get_music_backend()
+    return {
+        "apple_events": backend.event_count,
+        "apple_event_calls": dict(backend.calls),
+        "http": get_spotify_session().stats.snapshot(),
+        "spotify_rate_limit": get_spotify_session().limiter.stats(),
+        "spotify_cache": get_spotify_track_cache().stats(),
+        "match_cache": get_match_cache().stats(),
+    }
+
+
+def profile_paths():
+    """Return the (cProfile dump, JSON metrics) paths for a profiled run"""
+    stem = cache_path(f"profile-{time.strftime('%Y%m%d-%H%M%S')}")
+    return f"{stem}.prof", f"{stem}.json"
+
+
+def report_run(timer, prompts=True, metrics_path=None):
+    """
+    Print the cache, HTTP and stage timing statistics of a run.
+
+    With metrics_path, the stage timings and run_metrics() are also
+    written there as JSON.
+    """
+    if metrics_path:
+        write_metrics(metrics_path, timer, **run_metrics())
+    stats = get_spotify_track_cache().stats()
+    print(
+        f"\nSpotify cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} playlists cached"
+    )
+    match_cache = get_match_cache()
+    # Matches whose library track was deleted since they were made
+    match_cache.prune(get_library_index())
+    match_stats = match_cache.stats()
+    print(
+        f"Match cache: {match_stats['hits']} hits, {match_stats['misses']} misses "
+        f"({match_stats['hit_rate']:.0%} hit rate), {match_stats['evictions']} evicted, "
+        f"{match_stats['entries']} matches stored"
+    )
+    http_stats = get_spotify_session().stats.reset()
+    print(
+        f"Spotify HTTP: {http_stats['requests']} requests over "
+        f"{http_stats['connections']} new connections"
+    )
+    limits = get_spotify_session().limiter.stats()
+    print(
+        f"Spotify throughput: {limits['requests_per_second']:.1f} requests/s, "
+        f"{limits['throttled']} throttled, {limits['wait_seconds']:.1f}s waiting, "
+        f"{limits['concurrency']} requests in flight allowed"
+    )
+    launches = counters().get("osascript launches", 0)
+    print(f"Apple Events: {get_music_backend().event_count}, osascript launches: {launches}")
+
+    if prompts:
+        print("\nStage timings (total includes time spent at prompts):")
+    else:
+        print("\nStage timings:")
+    for line in timer.report():
+        print(f"  {line}")
+    if metrics_path:
+        print(f"\nMetrics written to {metrics_path}")
+
+
+def sync_playlist(timer, refresh_playlists=False):
+    """Interactively sync one playlist the user picks"""
+    selected_playlist_name, spotify_playlist_uri = select_spotify_playlist(
+        refresh=refresh_playlists, timer=timer
+    )
+    apple_playlist_name = selected_playlist_name
+
+    diff, known_matches = load_playlist_diff(
+        apple_playlist_name, spotify_playlist_uri, timer
+    )
+
+    if diff.removed:
+        with timer.stage("removed tracks"):
+            handle_removed_tracks(apple_playlist_name, diff.removed)
+
+    found, missing = locate_tracks(diff.added, known_matches, timer)
+    in_apple = {song: spotify_track_url(track) for song, (track, _, _) in found.items()}
+    not_in_apple = {song: spotify_track_url(track) for song, track in missing.items()}
+    # Persistent ID of the library track (or path of the media file) found
+    # for each song in in_apple
+    library_ids = {song: track_ref for song, (_, track_ref, _) in found.items()}
+    scores = {song: score for song, (_, _, score) in found.items()}
 
     print("\n")
     print(
@@ -759,7 +1047,9 @@ def main():
     )
 
     if in_apple:
-        add_songs_to_apple_playlist(apple_playlist_name, in_apple.keys())
+        with timer.stage("playlist additions"):
+            added = add_songs_to_apple_playlist(apple_playlist_name, library_ids, scores=scores)
+            remember_added_matches(found, added)
 
     print("Songs that will be added to Apple Music playlist:")
     for song, uri in in_apple.items():
@@ -770,10 +1060,50 @@ def main():
         print(f"- {song}: {uri}")
 
 
+def main(rebuild_catalog=False, refresh_playlists=False, profile=False):
+    timer = start_run(rebuild_catalog=rebuild_catalog)
+    profile_path, metrics_path = profile_paths() if profile else (None, None)
+    with profiled(profile_path):
+        sync_playlist(timer, refresh_playlists=refresh_playlists)
+    report_run(timer, metrics_path=metrics_path)
+    if profile_path:
+        print(f"Profile written to {profile_path} (open with python3 -m pstats)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sync Spotify playlists to matching Apple Music playlists"
+    )
+    parser.add_argument(
+        "--rebuild-catalog",
+        action="store_true",
+        help="re-read the whole Apple Music library instead of refreshing the local catalog",
+    )
+    parser.add_argument(
+        "--refresh-playlists",
+        action="store_true",
+        help="fetch the Spotify playlist listing even if the cached copy is fresh",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write a cProfile dump and a JSON metrics summary of each run to the cache directory",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    rebuild_catalog = args.rebuild_catalog
+    refresh_playlists = args.refresh_playlists
     try:
         while True:
-            main()
+            main(
+                rebuild_catalog=rebuild_catalog,
+                refresh_playlists=refresh_playlists,
+                profile=args.profile,
+            )
+            rebuild_catalog = refresh_playlists = False
             input("\nPress Enter to run again or Ctrl+C to exit...")
     except KeyboardInterrupt:
         print("\nExiting program.")